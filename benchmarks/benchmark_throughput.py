@@ -0,0 +1,174 @@
+"""
+Benchmarks the throughput of the data path: decoding raw ADC bytes, extracting spectral components, and
+end-to-end Configure()/Measure() against the Teensy emulator over a simulated serial link.
+
+Reports samples/s, MB/s (of raw 3-byte data), peak memory allocated per call, and per-call latency percentiles.
+Use --record to save the results as the new baseline, and --compare to fail if any benchmark has become slower
+than its baseline by more than the tolerance.
+
+Absolute times depend on the machine, so each run also times a fixed reference workload, and --compare checks each
+benchmark's latency relative to the reference rather than its absolute latency. This cancels out most of the
+difference between machines, but not all of it (cache sizes, SIMD support, the numpy build), so after moving to a
+new machine or upgrading numpy, re-record the baseline with --record before relying on --compare.
+
+Run from the main directory:
+
+    python benchmarks/benchmark_throughput.py --compare
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+from DataAquisition import MCP3561, TeensyEmulator, twosToInteger, twosToVoltage, fourierAmplitude, lockIn
+
+baselineFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+sampleCounts = [1000, 10000, 125000, 500000]
+
+def randomData(numberSamples, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, numberSamples * 3, dtype=np.uint8)
+
+def timeFunction(function, numberSamples, minimumTime=0.5, minimumRepeats=5):
+    """
+    Calls a function repeatedly and measures its latency, throughput and peak memory use.
+
+    :param function: Function taking no arguments to benchmark
+    :param numberSamples: The number of ADC samples processed by each call, used to compute throughput
+    :param minimumTime: Keep repeating the call until at least this much time (in seconds) has passed
+    :param minimumRepeats: The minimum number of times to call the function
+    :returns: Dictionary of results
+    """
+    function() # Warm up caches and any lazily-allocated buffers
+
+    tracemalloc.start()
+    function()
+    peakMemory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    latencies = []
+    startTime = time.perf_counter()
+    while len(latencies) < minimumRepeats or time.perf_counter() - startTime < minimumTime:
+        callStart = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - callStart)
+
+    latencies = np.array(latencies)
+    medianLatency = np.median(latencies)
+    return {
+        'samples_per_second': numberSamples / medianLatency,
+        'megabytes_per_second': numberSamples * 3 / medianLatency / 1e6,
+        'peak_memory_bytes': int(peakMemory),
+        'latency_p50_ms': 1e3 * medianLatency,
+        'latency_p90_ms': 1e3 * np.percentile(latencies, 90),
+        'latency_p99_ms': 1e3 * np.percentile(latencies, 99),
+        'calls': len(latencies),
+    }
+
+def referenceBenchmark():
+    """
+    Times a fixed numpy workload that the code under test never changes, to normalize the other benchmarks by.
+    """
+    data = np.random.default_rng(0).standard_normal(125000)
+    return {'reference': timeFunction(lambda: np.sort(np.abs(np.fft.rfft(data))), len(data))}
+
+def decodeBenchmarks():
+    results = {}
+    for numberSamples in sampleCounts:
+        data = randomData(numberSamples)
+        integers = np.empty(numberSamples, dtype=np.int32)
+        voltages32 = np.empty(numberSamples, dtype=np.float32)
+        results[f'twosToInteger/{numberSamples}'] = timeFunction(lambda: twosToInteger(data), numberSamples)
+        results[f'twosToInteger_out/{numberSamples}'] = timeFunction(
+                lambda: twosToInteger(data, out=integers), numberSamples)
+        results[f'twosToVoltage/{numberSamples}'] = timeFunction(lambda: twosToVoltage(data), numberSamples)
+        results[f'twosToVoltage_float32_out/{numberSamples}'] = timeFunction(
+                lambda: twosToVoltage(data, out=voltages32), numberSamples)
+    return results
+
+def spectralBenchmarks():
+    results = {}
+    for numberSamples in sampleCounts:
+        data = randomData(numberSamples)
+        signalBin = numberSamples // 125
+        voltages = twosToVoltage(data)
+        results[f'fourierAmplitude/{numberSamples}'] = timeFunction(
+                lambda: fourierAmplitude(data, signalBin), numberSamples)
+        results[f'lockIn_3_harmonics/{numberSamples}'] = timeFunction(
+                lambda: lockIn(voltages, 1, 125, harmonics=3), numberSamples)
+    return results
+
+def acquisitionBenchmarks():
+    """
+    Times Measure() against the emulator with its link unthrottled, so that this measures the driver and the
+    emulator rather than a simulated baud rate.
+    """
+    results = {}
+    emulator = TeensyEmulator(seed=0)
+    device = MCP3561(device=emulator)
+    for numberSamples in sampleCounts[:3]:
+        device.Configure(numberSamples)
+        results[f'Measure_unthrottled/{numberSamples}'] = timeFunction(device.Measure, numberSamples,
+                minimumRepeats=3)
+    device.device.close()
+    return results
+
+def compareResults(results, baselines, tolerance):
+    """
+    Prints the change in median latency of each benchmark from its baseline, with both latencies taken relative
+    to the reference benchmark of their own run.
+
+    :returns: List of the names of benchmarks that got slower by more than the tolerance
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baselines or name == 'reference':
+            continue
+        relativeLatency = result['latency_p50_ms'] / results['reference']['latency_p50_ms']
+        baselineLatency = baselines[name]['latency_p50_ms'] / baselines['reference']['latency_p50_ms']
+        change = relativeLatency / baselineLatency - 1
+        flag = ''
+        if change > tolerance:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f'{name:40s} {100*change:+7.1f}%{flag}')
+    return regressions
+
+def printResults(results):
+    print(f'{"benchmark":40s} {"MS/s":>9s} {"MB/s":>9s} {"peak MB":>9s} {"p50 ms":>9s} {"p90 ms":>9s} {"p99 ms":>9s}')
+    for name, result in results.items():
+        print(f'{name:40s} {result["samples_per_second"]/1e6:9.2f} {result["megabytes_per_second"]:9.1f} ' + \
+                f'{result["peak_memory_bytes"]/1e6:9.2f} {result["latency_p50_ms"]:9.3f} ' + \
+                f'{result["latency_p90_ms"]:9.3f} {result["latency_p99_ms"]:9.3f}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--record', action='store_true', help='Save these results as the new baseline')
+    parser.add_argument('--compare', action='store_true', help='Exit with an error if slower than the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+            help='Allowed fractional increase in median latency (relative to the reference benchmark) before a ' + \
+            'benchmark counts as a regression')
+    parser.add_argument('--skip-acquisition', action='store_true', help='Skip the end-to-end emulator benchmarks')
+    arguments = parser.parse_args()
+
+    results = referenceBenchmark()
+    results.update(decodeBenchmarks())
+    results.update(spectralBenchmarks())
+    if not arguments.skip_acquisition:
+        results.update(acquisitionBenchmarks())
+    printResults(results)
+
+    if arguments.compare and os.path.isfile(baselineFile):
+        with open(baselineFile, 'r') as baseline:
+            baselines = json.load(baseline)
+        if 'reference' not in baselines:
+            sys.exit('The baseline has no reference benchmark to compare against. Re-record it with --record.')
+        regressions = compareResults(results, baselines, arguments.tolerance)
+        if regressions:
+            print(f'{len(regressions)} benchmarks regressed: {", ".join(regressions)}')
+            sys.exit(1)
+
+    if arguments.record:
+        with open(baselineFile, 'w') as baseline:
+            json.dump(results, baseline, indent=4)
@@ -4,6 +4,7 @@ from DataAquisition import twosToVoltage
 import time
 import numpy as np
 from matplotlib import pyplot as plt
+import scipy.signal.windows
 
 desiredMeasurements = 100000
 halfDesiredMeasurements = int(desiredMeasurements/2)
@@ -3,22 +3,14 @@ Uses a Hann window and plots the PSD and recorded time-domain voltage to screen.
 """
 import numpy as np
 import pandas as pd
-from DataAquisition import MCP3561, twosToVoltage
+from DataAquisition import MCP3561, twosToVoltage, NoiseDensityEstimator
 from Plotting import prettifyPlot, plt
-import scipy.signal.windows as windows
-import time
 
 desiredMeasurements = 4800 # This ensures each frequency bin is 1Hz wide.
-halfMeasurements = int(desiredMeasurements/2)
 samplingFrequency = 9.76 # kHz
-frequencies = np.arange(0, samplingFrequency/2, samplingFrequency/desiredMeasurements)
 
-signalFrequency = 0.1 # kHz
 startNoiseFrequency = 0.2 # kHz, this is after the roll-off of the 60Hz noise.
-signalAmplitude = 1.5
 stopNoiseFrequency = samplingFrequency/2
-noiseBandwidth = (stopNoiseFrequency - startNoiseFrequency)
-startNoiseBin = int(startNoiseFrequency / samplingFrequency * desiredMeasurements)
 
 device = MCP3561()
 device.Configure(desiredMeasurements)
@@ -29,24 +21,17 @@ voltages = twosToVoltage(data)
 dcOffset = np.mean(voltages)
 print(f'Offset: {dcOffset:.3f} V')
 voltagesOffset = voltages - dcOffset
-voltagesTheoretical = signalAmplitude * np.cos(2*np.pi*signalFrequency * times)
 
-#fig, ax = plt.subplots()
-#ax.plot(voltagesTheoretical)
-#ax.plot(voltages)
-#plt.show()
-
-hannWindow = windows.hann(desiredMeasurements) / np.sqrt(np.mean(np.square(windows.hann(desiredMeasurements))))
-voltagesTheoretical *= hannWindow
-
-# The single-sided voltage spectral power (rms, by definition)
-voltageSpectralPower = np.square(np.abs(np.fft.fft(voltagesOffset*hannWindow/len(voltagesOffset))))[0:halfMeasurements]*2
-voltageTheoreticalSpectralPower = np.square(np.abs(np.fft.fft(voltagesTheoretical/len(voltagesTheoretical))))[0:halfMeasurements]*2
-
-voltageNoiseRMS = np.sqrt(np.sum(voltageSpectralPower[startNoiseBin:]) )
-voltageNoisePSD = 1e9 * voltageNoiseRMS / np.sqrt(noiseBandwidth * 1e3) # in nV / rtHz
+noiseEstimator = NoiseDensityEstimator(samplingFrequency*1e3, segmentSize=desiredMeasurements)
+noiseEstimator.update(voltages)
+voltageNoiseRMS = noiseEstimator.bandRMS(startNoiseFrequency*1e3, stopNoiseFrequency*1e3)
+voltageNoisePSD = 1e9 * noiseEstimator.bandDensity(startNoiseFrequency*1e3, stopNoiseFrequency*1e3) # in nV / rtHz
 print(f'Voltage Noise ---\nRMS: {voltageNoiseRMS*1e6:.1f}uV, PSD: {voltageNoisePSD:.1f}nV/rtHz')
 
+# The single-sided voltage spectral power in each bin (rms, by definition)
+binWidth = samplingFrequency*1e3 / desiredMeasurements
+voltageSpectralPower = noiseEstimator.psd * binWidth
+
 pdData = pd.DataFrame(data={'Time (ms)': times, 'Voltage (mV)': voltages})
 pdData.to_csv('adc_data.csv', index=False)
 
@@ -59,8 +44,7 @@ prettifyPlot(ax, fig)
 #plt.show()
 
 fig, ax = plt.subplots()
-ax.plot(frequencies, 10*np.log10(voltageSpectralPower))
-#ax.plot(frequencies, 10*np.log10(voltageTheoreticalSpectralPower + np.square(260*1e-9)))
+ax.plot(noiseEstimator.frequencies/1e3, 10*np.log10(voltageSpectralPower))
 ax.legend(['Measured'])
 ax.set_xlabel('f (kHz)')
 ax.set_ylabel('dBVrms')
@@ -68,4 +52,3 @@ ax.set_title('Signal Spectral Power')
 ax.set_ylim(-200, 0)
 prettifyPlot(ax, fig)
 plt.show()
-
@@ -9,11 +9,11 @@ Considerations:
 """
 import numpy as np
 import pandas as pd
-from DataAquisition import SCPIDevice, twosToVoltage, twosToInteger
+from DataAquisition import MCP3561, twosToVoltage, twosToInteger, CaptureRecorder
 from Plotting import prettifyPlot, plt
 import time
 
-device = SCPIDevice()
+device = MCP3561()
 
 startWavelength = 1050
 stopWavelength = 1055
@@ -30,7 +30,8 @@ device.Configure(samplesPerMeasurement)
 
 TIAResistance = 1 # MOhms
 totalTransimpedance = 2 * TIAResistance
-currents = np.array([])
+numberCaptures = 5000
+currents = np.empty(numberCaptures)
 
 # Set the current wavelength to 800nm, wait for the motor to stop rotating, and then turn it off to tamp down the noise.
 
@@ -40,9 +41,15 @@ device.waitForMotor()
 
 device.motorEnable = False
 
-for x in range(5000):
-    data = device.Measure()
-    voltages = correctionFactor * twosToVoltage(data)
+# Keep the raw captures too, so they can be reanalyzed later with CaptureReader
+recorder = CaptureRecorder('lamp_fluctuations')
+voltages = np.empty(samplesPerMeasurement)
+for x in range(numberCaptures):
+    # Every capture is the same size, so read each one into a reused buffer rather than allocating a new one
+    with device.measurePooled() as data:
+        recorder.append(data, wavelength=startWavelength, samplingFrequency=fSampling * 1e3)
+        twosToVoltage(data, out=voltages)
+    voltages *= correctionFactor
     voltagePowerSpectrum = np.square(np.abs(np.fft.fft(voltages/len(voltages))))
     # Multiply by 2 to convert to single-sided spectrum
     voltageSignalPower = voltagePowerSpectrum[signalBin] * 2
@@ -52,9 +59,10 @@ for x in range(5000):
     currentSignalAmplitudeuApp = voltageSignalAmplitude / totalTransimpedance * 2
     currentSignalAmplitudenApp = currentSignalAmplitudeuApp * 1e3
 
-    currents = np.append(currents, currentSignalAmplitudenApp)
+    currents[x] = currentSignalAmplitudenApp
     print(f'{startWavelength} nm: {currentSignalAmplitudenApp:.2f}')
 
+recorder.close()
 device.closeDevice()
 
 data = pd.DataFrame(data={'Photocurrent (nApp)': currents})
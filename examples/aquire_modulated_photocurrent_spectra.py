@@ -8,11 +8,12 @@ Considerations:
 """
 import numpy as np
 import pandas as pd
-from DataAquisition import SCPIDevice, twosToVoltage, twosToInteger
+from DataAquisition import MCP3561, twosToVoltage, twosToInteger
 from Plotting import prettifyPlot, plt
 import time
 
-device = SCPIDevice()
+fSampling = 125 # kHz
+device = MCP3561(sampling_frequency=fSampling * 1e3)
 
 startWavelength = 1050
 stopWavelength = 1055
@@ -20,18 +21,19 @@ stepWavelength = 5
 wavelengthsToMeasure = np.arange(startWavelength, stopWavelength, stepWavelength)
 
 fModulation = 1 # kHz
-fSampling = 125 # kHz
+# Integrate at each wavelength until the photocurrent is known to within 1%, but for no less than Tmin and no more
+# than Tmax. Bright parts of the spectrum finish quickly, and only the dim parts take the full Tmax.
+Tmin = 100 # ms
 Tmax = 1000 # ms
-samplesPerMeasurement = int(Tmax * fSampling)
-signalBin = int(fModulation * Tmax)
-device.Configure(samplesPerMeasurement)
+Tblock = 50 # ms
+targetSNR = 100
 
 TIAResistance = 1 # MOhms
 totalTransimpedance = 2 * TIAResistance
 deltaRMax = 3e-4 # maximum expected change in reflectance
 photocurrentMax = 150 *1e3 # peak photocurrent with R=1 (pA)
 expectedPhotocurrentAmplitude = photocurrentMax * deltaRMax
-currents = np.array([])
+currents = np.empty(len(wavelengthsToMeasure))
 
 # Set the current wavelength to 800nm, wait for the motor to stop rotating, and then turn it off to tamp down the noise.
 
@@ -39,32 +41,21 @@ device.motorEnable = True
 device.wavelength = startWavelength
 device.waitForMotor()
 
-for wavelength in wavelengthsToMeasure:
+for i, wavelength in enumerate(wavelengthsToMeasure):
     device.motorEnable = True # Enable the motor for movement
     device.wavelength = wavelength
     device.waitForMotor()
     device.motorEnable = False
-    time.sleep(1) # The motor is generating hella noise (I think)
-    data = device.Measure()
-    voltages = twosToVoltage(data)
-    syncPulseLocations = twosToInteger(device.getSyncData())
-    voltagePowerSpectrum = np.square(np.abs(np.fft.fft(voltages/len(voltages))))
-    # Multiply by 2 to convert to single-sided spectrum
-    voltageSignalPower = voltagePowerSpectrum[signalBin] * 2
-    # Multiply by 2 to convert from RMS power into amplitude
-    voltageSignalAmplitude = np.sqrt(voltageSignalPower * 2)
+    # No fixed settling delay: any extra noise from the motor just makes the integration run longer
+    voltageSignalAmplitude, voltageUncertainty, integrationTime = device.measureUntil(fModulation * 1e3,
+            targetSNR=targetSNR, blockTime=Tblock / 1e3, minTime=Tmin / 1e3, maxTime=Tmax / 1e3)
     # Multiply by 2 to convert to uApp instead of uA amplitude
     currentSignalAmplitudeuApp = voltageSignalAmplitude / totalTransimpedance * 2
     currentSignalAmplitudepApp = currentSignalAmplitudeuApp * 1e6
 
-    currents = np.append(currents, currentSignalAmplitudepApp)
-    print(f'{wavelength} nm: {currentSignalAmplitudepApp:.2f} / {expectedPhotocurrentAmplitude:.2f} pApp')
-
-    #syncPulseTimes = syncPulseLocations / fSampling
-    #fig, ax = plt.subplots()
-    #ax.plot(times, voltages - np.mean(voltages))
-    #ax.plot(syncPulseTimes, 0.0*np.ones(len(syncPulseTimes)), marker='o') # show the synchronization markers
-    #plt.show()
+    currents[i] = currentSignalAmplitudepApp
+    print(f'{wavelength} nm: {currentSignalAmplitudepApp:.2f} / {expectedPhotocurrentAmplitude:.2f} pApp ' + \
+            f'in {integrationTime * 1e3:.0f} ms')
 
 device.motorEnable = True
 device.wavelength = startWavelength # set our device back to the original wavelength
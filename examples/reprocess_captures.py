@@ -0,0 +1,34 @@
+"""
+Reanalyzes archived raw captures (recordings made by CaptureRecorder, or .npy files of raw capture stacks) on all
+CPU cores, and writes one row per capture to a CSV file.
+
+For example, to redo the lock-in and noise analysis of every recording in a day's directory:
+
+    python examples/reprocess_captures.py data/2024-05-01 --frequency 1000 --noise-band 200 5000 -o reprocessed.csv
+"""
+import argparse
+import pandas as pd
+from DataAquisition import reprocessRecordings
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='Recordings, .npy files, or directories containing them')
+    parser.add_argument('-o', '--output', default='reprocessed.csv', help='The CSV file to write the results to')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes (default: all CPUs)')
+    parser.add_argument('--chunk-size', type=int, default=64, help='Number of captures in each work unit')
+    parser.add_argument('--sampling-frequency', type=float, default=None,
+            help='Sampling frequency in Hz, for captures that do not record their own')
+    parser.add_argument('--frequency', type=float, default=None, help='Lock-in frequency in Hz')
+    parser.add_argument('--window', default='boxcar', choices=['boxcar', 'hann'], help='Lock-in window')
+    parser.add_argument('--bins', type=int, nargs='*', default=[], help='FFT bins to extract the amplitudes of')
+    parser.add_argument('--noise-band', type=float, nargs=2, default=None, metavar=('LOW', 'HIGH'),
+            help='Band to integrate the noise over, in Hz')
+    parser.add_argument('--gain', type=float, default=1.0, help='Calibration gain applied to the voltages')
+    parser.add_argument('--offset', type=float, default=0.0, help='Calibration offset in V added to the voltages')
+    arguments = parser.parse_args()
+
+    results = reprocessRecordings(arguments.paths, numberWorkers=arguments.workers, chunkSize=arguments.chunk_size,
+            samplingFrequency=arguments.sampling_frequency, frequency=arguments.frequency, window=arguments.window,
+            signalBins=arguments.bins, noiseBand=arguments.noise_band, gain=arguments.gain, offset=arguments.offset)
+    pd.DataFrame(results).to_csv(arguments.output, index=False)
+    print(f"Wrote {len(results['capture'])} captures to {arguments.output}")
@@ -1,30 +1,59 @@
 import numpy as np
+import sys
+
+# Number of samples decoded at a time by twosToVoltage. Small enough to keep the intermediate counts in cache.
+decodeBlockSize = 65536
 
 """
-Convert a twos-complement set of bytes (1, 2, 3, etc.) into a floating-point value.
+Convert a twos-complement set of bytes (1, 2, 3, or 4 bytes per integer) into signed integers.
+
+The raw bytes are copied straight into the upper bytes of each 32-bit output word, and a single arithmetic
+right shift then discards the padding and sign-extends every sample at once. No floating-point temporaries
+are created, and if an output array is supplied no allocations are made at all.
+
+:param twosBytes: Array (or bytes-like object) of raw 8-bit values, with bytesPerInteger bytes per sample
+:param firstByte: 'msb' if the most significant byte of each sample comes first, 'lsb' otherwise
+:param bytesPerInteger: The number of bytes in each twos complement integer (at most 4)
+:param out: Optional preallocated int32 array with one entry per sample to write into
+:returns: int32 array of signed integers, one per sample
 """
-def twosToInteger(twosBytes, firstByte='msb', bytesPerInteger=3):
-    number = 0.0
+def twosToInteger(twosBytes, firstByte='msb', bytesPerInteger=3, out=None):
+    if firstByte not in ('msb', 'lsb'):
+        raise ValueError(f"firstByte must be 'msb' or 'lsb', not {firstByte}")
+    if bytesPerInteger < 1 or bytesPerInteger > 4:
+        raise ValueError(f"bytesPerInteger must be between 1 and 4, not {bytesPerInteger}")
+
+    if isinstance(twosBytes, (bytes, bytearray, memoryview)):
+        twosBytes = np.frombuffer(twosBytes, dtype=np.uint8)
+    else:
+        twosBytes = np.asarray(twosBytes).astype(np.uint8, copy=False)
+
     numberBytes = len(twosBytes)
-    numberIntegers = int(numberBytes / bytesPerInteger)
+    if numberBytes % bytesPerInteger != 0:
+        raise ValueError(f"Got {numberBytes} bytes, which is not a multiple of {bytesPerInteger} bytes per integer")
+    numberIntegers = numberBytes // bytesPerInteger
     twosBytes = twosBytes.reshape(numberIntegers, bytesPerInteger)
 
-    if(firstByte == 'msb'):
-        for i in range(bytesPerInteger):
-            number += np.power(256, bytesPerInteger - 1 - i) * twosBytes[:, i]
+    if out is None:
+        out = np.empty(numberIntegers, dtype=np.int32)
+    elif out.dtype != np.int32 or out.shape != (numberIntegers,):
+        raise ValueError(f"out must be an int32 array of shape ({numberIntegers},)")
 
-        isNegative = (twosBytes[:, 0] & 0b10000000) != 0 # checks the MSB of the twos complement number
-        number -= np.power(2, 8*bytesPerInteger)*isNegative
-    elif(firstByte == 'lsb'):
-        for i in range(bytesPerInteger):
-            number += np.power(256, i) * twosBytes[i]
+    # View each 32-bit output word as its 4 constituent bytes, in memory order
+    outBytes = out.view(np.uint8).reshape(numberIntegers, 4)
+    reverseOrder = (firstByte == 'msb') == (sys.byteorder == 'little')
+    if sys.byteorder == 'little':
+        upperBytes = outBytes[:, 4 - bytesPerInteger:]
+    else:
+        upperBytes = outBytes[:, :bytesPerInteger]
 
-        isNegative = bool(twosBytes[-1] & 0b10000000)
-        number -= np.power(2, 8*bytesPerInteger)*isNegative
+    if reverseOrder:
+        upperBytes[:] = twosBytes[:, ::-1]
+    else:
+        upperBytes[:] = twosBytes
 
-    if isinstance(number, np.ndarray):
-        number = number.astype(int)
-    return number
+    np.right_shift(out, 8 * (4 - bytesPerInteger), out=out)
+    return out
 
 
 """
@@ -35,11 +64,62 @@ Converts the AD7766 count to a differential voltage
 """
 def countToVoltage(data, numberBits=24, maxVoltage=3.3, differential=False):
     # The maximum representable unsigned number is 2^24, but the maximum representable twos complement
-    # number is half that, or 2^24 / 2
+    # number is half that, or 2^24 / 2. This is the same whether or not the input is differential.
     conversionFactor = maxVoltage / (pow(2.0, numberBits-1))
     return np.multiply(data, conversionFactor)
 
-def twosToVoltage(data, bytesPerInteger=3, maxVoltage=3.3, firstByte='msb', differential=False):
-    intermediateData = twosToInteger(data, firstByte=firstByte, bytesPerInteger=bytesPerInteger)
-    voltages = countToVoltage(intermediateData, maxVoltage=maxVoltage, differential=differential)
-    return voltages
+"""
+Converts raw twos complement bytes directly into voltages in a single fused pass, without creating a full-size
+intermediate integer array. The data is decoded in cache-sized blocks, and each block is scaled, calibrated, and
+written straight into the output array.
+
+The calibrated voltage is gain * (count * maxVoltage / 2^(numberBits - 1)) + offset.
+
+A 2-D array is treated as a stack of captures of the same size, one per row, and is decoded in the same single pass
+into a (captures x samples) array of voltages.
+
+:param data: Array (or bytes-like object) of raw 8-bit values, as returned by Measure()
+:param maxVoltage: The full-scale voltage of the ADC
+:param differential: Unused, the full-scale conversion is the same for differential and single-ended inputs
+:param dtype: Output data type, either np.float32 or np.float64
+:param out: Optional preallocated, C-contiguous floating-point array with one entry per sample to write into
+:param offset: Calibration offset (in volts) added after the gain is applied
+:param gain: Calibration gain applied to the uncalibrated voltage
+:returns: Array of voltages, one per sample (one row per capture for 2-D input)
+"""
+def twosToVoltage(data, bytesPerInteger=3, maxVoltage=3.3, firstByte='msb', differential=False,
+        dtype=np.float64, out=None, offset=0.0, gain=1.0):
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = np.frombuffer(data, dtype=np.uint8)
+    else:
+        data = np.asarray(data).astype(np.uint8, copy=False)
+
+    numberBytes = data.shape[-1] if data.ndim > 0 else 0
+    if numberBytes % bytesPerInteger != 0:
+        raise ValueError(f"Got {numberBytes} bytes, which is not a multiple of {bytesPerInteger} bytes per integer")
+    shape = data.shape[:-1] + (numberBytes // bytesPerInteger,)
+
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    elif out.dtype.kind != 'f' or out.shape != shape or not out.flags.c_contiguous:
+        raise ValueError(f"out must be a C-contiguous floating-point array of shape {shape}")
+
+    # Rows of a stack are decoded back to back, as if they were one long capture
+    data = data.reshape(-1)
+    numberIntegers = out.size
+    flatOut = out.reshape(-1)
+
+    conversionFactor = gain * maxVoltage / (pow(2.0, 8*bytesPerInteger - 1))
+    blockSize = max(1, min(numberIntegers, decodeBlockSize))
+    countBuffer = np.empty(blockSize, dtype=np.int32)
+
+    for startIndex in range(0, numberIntegers, blockSize):
+        stopIndex = min(startIndex + blockSize, numberIntegers)
+        counts = twosToInteger(data[startIndex*bytesPerInteger:stopIndex*bytesPerInteger], firstByte=firstByte,
+                bytesPerInteger=bytesPerInteger, out=countBuffer[:stopIndex - startIndex])
+        voltages = flatOut[startIndex:stopIndex]
+        np.multiply(counts, conversionFactor, out=voltages, dtype=out.dtype)
+        if offset != 0:
+            np.add(voltages, offset, out=voltages)
+
+    return out
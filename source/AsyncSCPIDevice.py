@@ -0,0 +1,192 @@
+from .SCPIDevice import SCPIDevice
+from .MCP3561 import MCP3561
+from .Keithley import Keithley
+from .TEController import TEController
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import asyncio
+import time
+
+class AsyncSCPIDevice:
+    """
+    asyncio counterpart of SCPIDevice, so that one event loop can drive several instruments at once. Each instrument
+    gets its own single worker thread that does its blocking serial I/O, so calls to one instrument stay in order
+    while calls to different instruments overlap. Waiting for a capture or a motor move is done with asyncio.sleep()
+    rather than by blocking a thread. Every call that talks to the instrument holds the lock, so an exchange of several
+    lines is never interleaved with another call.
+
+    Create one with the create() coroutine, or wrap an already-open driver:
+
+        adc, keithley = await asyncio.gather(AsyncMCP3561.create(), AsyncKeithley.create())
+        voltages, currents, data = await asyncio.gather(keithley.applyVoltageMeasureCurrent(biases), adc.Measure())
+
+    :param device: The synchronous driver (SCPIDevice or subclass) to wrap
+    """
+    syncClass = SCPIDevice
+
+    def __init__(self, device):
+        self.device = device
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.lock = asyncio.Lock() # Held for exchanges that must not be interleaved with other calls
+
+    @classmethod
+    async def create(cls, *args, **kwargs):
+        """
+        Opens and identifies the instrument without blocking the event loop. Takes the same arguments as the
+        synchronous driver.
+        """
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            device = await loop.run_in_executor(executor, partial(cls.syncClass, *args, **kwargs))
+        return cls(device)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.closeDevice()
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Runs a blocking function on this instrument's worker thread.
+
+        :returns: The function's return value
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(function, *args, **kwargs))
+
+    async def writeLine(self, stringToWrite):
+        return await self.run(self.device.writeLine, stringToWrite)
+
+    async def readLine(self):
+        return await self.run(self.device.readLine)
+
+    async def query(self, command):
+        """
+        Writes a command and reads the line sent in reply.
+
+        :param command: The command to send, such as '\\*IDN?'
+        :returns: The newline-stripped reply
+        """
+        async with self.lock:
+            await self.writeLine(command)
+            return await self.readLine()
+
+    async def Reset(self):
+        async with self.lock:
+            await self.run(self.device.Reset)
+
+    async def Identify(self):
+        async with self.lock:
+            return await self.run(self.device.Identify)
+
+    async def waitForMove(self, motorMove, timeout=None):
+        """
+        Waits for a motor move to finish, sleeping until just before its predicted end and only then checking on it.
+
+        :param motorMove: MotorMove handle from rotateMotorAsync()
+        :param timeout: Maximum time in seconds to wait, or None to wait as long as it takes
+        """
+        endTime = None if timeout is None else time.perf_counter() + timeout
+        sleepTime = motorMove._pollStart() - time.perf_counter()
+        if endTime is not None:
+            sleepTime = min(sleepTime, endTime - time.perf_counter())
+        if sleepTime > 0:
+            await asyncio.sleep(sleepTime)
+        pollIntervals = motorMove._pollIntervals()
+        while not await self.run(motorMove.done):
+            if endTime is not None and time.perf_counter() >= endTime:
+                raise TimeoutError(f"Motor still rotating {timeout} s after starting a move of {motorMove.steps} steps")
+            await asyncio.sleep(next(pollIntervals))
+
+    async def rotateMotor(self, rotationSteps, timeout=None):
+        """
+        Rotates the stepper motor by some integer number of steps, returning once it has stopped.
+
+        :param rotationSteps: The number of stepper motor steps to take. Positive = clockwise, negative = counterclockwise.
+        :param timeout: Maximum time in seconds to wait for the move, or None to wait as long as it takes
+        """
+        async with self.lock:
+            motorMove = await self.run(self.device.rotateMotorAsync, rotationSteps)
+            await self.waitForMove(motorMove, timeout=timeout)
+
+    async def closeDevice(self):
+        async with self.lock:
+            await self.run(self.device.closeDevice)
+        self.executor.shutdown()
+
+class AsyncMCP3561(AsyncSCPIDevice):
+    """
+    asyncio counterpart of MCP3561. See AsyncSCPIDevice.
+    """
+    syncClass = MCP3561
+
+    async def Configure(self, numberMeasurements):
+        async with self.lock:
+            await self.run(self.device.Configure, numberMeasurements)
+
+    async def Measure(self):
+        """
+        Measures data from the ADC, sleeping on the event loop while the ADC captures.
+
+        :returns: Array of 8-bit integers starting with the most significant byte of the first measurement.
+        """
+        async with self.lock:
+            bytesWritten = await self.writeLine('MEASURE?')
+            await asyncio.sleep(self.device.numberMeasurements / self.device.measurementRate)
+            return await self.run(self.device.readMeasurement, bytesWritten)
+
+    async def setWavelength(self, wavelength, timeout=None):
+        """
+        Moves the monochromator to a wavelength, returning once the motor has stopped.
+
+        :param wavelength: The wavelength to move to, in nm
+        :param timeout: Maximum time in seconds to wait for the move, or None to wait as long as it takes
+        """
+        async with self.lock:
+            motorMove = await self.run(self.device.setWavelengthAsync, wavelength)
+            await self.waitForMove(motorMove, timeout=timeout)
+
+class AsyncKeithley(AsyncSCPIDevice):
+    """
+    asyncio counterpart of Keithley. See AsyncSCPIDevice.
+    """
+    syncClass = Keithley
+
+    async def setVoltage(self, voltage):
+        async with self.lock:
+            await self.run(self.device.setVoltage, voltage)
+
+    async def applyVoltageMeasureCurrent(self, voltages, delay=0.5):
+        """
+        Applies each voltage in turn and measures the current. See Keithley.applyVoltageMeasureCurrent(). The delays
+        between voltages are spent on the Keithley's own worker thread, so other instruments carry on meanwhile.
+
+        :returns: Tuple of (measured voltages, measured currents)
+        """
+        async with self.lock:
+            return await self.run(self.device.applyVoltageMeasureCurrent, voltages, delay=delay)
+
+    async def sweepVoltageMeasureCurrent(self, voltages, delay=0.0, measuredVoltages=None, measuredCurrents=None):
+        """
+        Runs a voltage sweep on the Keithley itself. See Keithley.sweepVoltageMeasureCurrent().
+
+        :returns: Tuple of (measured voltages, measured currents)
+        """
+        async with self.lock:
+            return await self.run(self.device.sweepVoltageMeasureCurrent, voltages, delay=delay,
+                    measuredVoltages=measuredVoltages, measuredCurrents=measuredCurrents)
+
+class AsyncTEController(AsyncSCPIDevice):
+    """
+    asyncio counterpart of TEController. See AsyncSCPIDevice.
+    """
+    syncClass = TEController
+
+    async def Fetch(self):
+        async with self.lock:
+            return await self.run(self.device.Fetch)
+
+    async def setTemperature(self, temp):
+        async with self.lock:
+            await self.run(self.device.setTemperature, temp)
@@ -0,0 +1,56 @@
+import numpy as np
+import threading
+
+class BufferPool:
+    """
+    A small pool of reusable byte buffers of one size, so that repeated captures of the same size read into memory
+    that is already allocated instead of allocating (and later freeing) a new buffer every time.
+
+    Buffers are handed out by acquire() and returned with release(). If every buffer is in use, acquire() allocates
+    another one, so the pool grows to however many buffers are in use at once and then stops allocating.
+
+    :param bufferSize: The size of each buffer in bytes
+    :param numberBuffers: The number of buffers to allocate up front
+    """
+    def __init__(self, bufferSize, numberBuffers=2):
+        self.bufferSize = int(bufferSize)
+        self.numberAllocated = 0
+        self._free = []
+        self._lock = threading.Lock()
+        for i in range(numberBuffers):
+            self._free.append(self._allocate())
+
+    def _allocate(self):
+        self.numberAllocated += 1
+        return np.empty(self.bufferSize, dtype=np.uint8)
+
+    @property
+    def numberFree(self):
+        return len(self._free)
+
+    def acquire(self):
+        """
+        Takes a buffer from the pool.
+
+        :returns: uint8 array of bufferSize bytes, with undefined contents
+        """
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+            return self._allocate()
+
+    def release(self, buffer):
+        """
+        Returns a buffer to the pool. Views of a buffer (such as a capture's payload) can be passed instead of the
+        buffer itself. The buffer must not be used after it has been released.
+
+        :param buffer: A buffer from acquire(), or a view of one
+        """
+        while buffer.base is not None and isinstance(buffer.base, np.ndarray):
+            buffer = buffer.base
+        if buffer.shape != (self.bufferSize,):
+            raise ValueError(f"Buffer of shape {buffer.shape} does not belong to a pool of {self.bufferSize}-byte buffers")
+        with self._lock:
+            if any(buffer is freeBuffer for freeBuffer in self._free):
+                raise ValueError("Buffer was released twice")
+            self._free.append(buffer)
@@ -0,0 +1,165 @@
+from .AD7766_postprocessing import twosToVoltage
+import numpy as np
+import json
+import os
+import time
+
+"""
+Binary storage for raw captures. A recording is two files next to each other:
+
+    <name>.raw      the raw bytes returned by Measure(), one capture after another (3 bytes per sample)
+    <name>.index    one line of JSON per capture, with where it starts in the .raw file, its number of samples,
+                    and its metadata (timestamp, wavelength, sampling frequency, sync indices, ...)
+
+Both files are only ever appended to, so a recording interrupted part-way keeps every capture indexed so far.
+The raw file is read through a memory map, so any capture (or part of one) can be decoded without loading the
+rest of the recording.
+"""
+
+class CaptureRecorder:
+    """
+    Appends raw captures and their metadata to a recording, creating it if it does not exist.
+
+        with CaptureRecorder('lamp_fluctuations') as recorder:
+            for i in range(5000):
+                recorder.append(device.Measure(), samplingFrequency=device.measurementRate)
+
+    :param path: The recording's file name, without extension
+    """
+    def __init__(self, path):
+        self.path = path
+        self.numberCaptures = 0
+        if os.path.isfile(path + '.index'):
+            with open(path + '.index', 'r') as indexFile:
+                self.numberCaptures = sum(1 for line in indexFile if line.strip())
+        self._rawFile = open(path + '.raw', 'ab')
+        self._indexFile = open(path + '.index', 'a')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def append(self, measuredData, timestamp=None, wavelength=None, samplingFrequency=None, syncIndices=None,
+            **metadata):
+        """
+        Adds a capture to the end of the recording.
+
+        :param measuredData: Array of 8-bit integers returned by Measure()
+        :param timestamp: time.time() at which the capture was taken. Defaults to now.
+        :param wavelength: The wavelength the capture was taken at, in nm
+        :param samplingFrequency: The sampling frequency of the capture, in Hz
+        :param syncIndices: Sample indices of the synchronization pulses, from MCP3561.getSyncIndices()
+        :param metadata: Any other values to store with the capture. They must be JSON-serializable.
+        :returns: The index of the capture in the recording
+        """
+        measuredData = np.asarray(measuredData, dtype=np.uint8)
+        if len(measuredData) % 3 != 0:
+            raise ValueError(f"Capture length {len(measuredData)} is not a whole number of 3-byte samples")
+
+        entry = {'offset': self._rawFile.tell(), 'numberSamples': len(measuredData) // 3,
+                'timestamp': time.time() if timestamp is None else float(timestamp)}
+        if wavelength is not None:
+            entry['wavelength'] = float(wavelength)
+        if samplingFrequency is not None:
+            entry['samplingFrequency'] = float(samplingFrequency)
+        if syncIndices is not None:
+            entry['syncIndices'] = [int(index) for index in syncIndices]
+        entry.update(metadata)
+
+        self._rawFile.write(measuredData.tobytes())
+        self._rawFile.flush() # The data must be on disk before the index line that points to it
+        self._indexFile.write(json.dumps(entry) + '\n')
+        self._indexFile.flush()
+        self.numberCaptures += 1
+        return self.numberCaptures - 1
+
+    def close(self):
+        self._rawFile.close()
+        self._indexFile.close()
+
+class CaptureReader:
+    """
+    Reads captures from a recording made by CaptureRecorder. Captures are decoded only when asked for.
+
+        recording = CaptureReader('lamp_fluctuations')
+        voltages = recording[10]                                # the whole of capture 10
+        voltages = recording.voltages(10, start=1000, stop=2000) # just 1000 samples of it
+        wavelengths = [entry['wavelength'] for entry in recording.metadata]
+
+    :param path: The recording's file name, without extension
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path + '.index', 'r') as indexFile:
+            self.metadata = [json.loads(line) for line in indexFile if line.strip()]
+        if os.path.getsize(path + '.raw') > 0:
+            self._raw = np.memmap(path + '.raw', dtype=np.uint8, mode='r')
+        else:
+            self._raw = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.metadata)
+
+    def __getitem__(self, captureIndex):
+        return self.voltages(captureIndex)
+
+    def __iter__(self):
+        for captureIndex in range(len(self)):
+            yield self.voltages(captureIndex)
+
+    def raw(self, captureIndex, start=0, stop=None):
+        """
+        Gets the raw bytes of a capture, or of a range of its samples, without copying them out of the file.
+
+        :param captureIndex: The index of the capture in the recording
+        :param start: The first sample to include
+        :param stop: One past the last sample to include. Defaults to the end of the capture.
+        :returns: Read-only array of 8-bit integers, like that returned by Measure()
+        """
+        entry = self.metadata[captureIndex]
+        start, stop, step = slice(start, stop).indices(entry['numberSamples'])
+        return self._raw[entry['offset'] + 3 * start:entry['offset'] + 3 * max(start, stop)]
+
+    def stack(self, start=0, stop=None):
+        """
+        Gets the raw bytes of a run of consecutive captures as a 2-D array, one capture per row, without copying them
+        out of the file. This can be decoded in one pass by twosToVoltage() or analyzed by analyzeCaptures().
+
+        :param start: The index of the first capture to include
+        :param stop: One past the index of the last capture to include. Defaults to the end of the recording.
+        :returns: Read-only array of 8-bit integers of shape (captures, bytes per capture)
+        """
+        start, stop, step = slice(start, stop).indices(len(self))
+        entries = self.metadata[start:stop]
+        if len(entries) == 0:
+            return np.zeros((0, 0), dtype=np.uint8)
+        numberSamples = entries[0]['numberSamples']
+        if any(entry['numberSamples'] != numberSamples for entry in entries):
+            raise ValueError(f"Captures {start} to {stop} are not all the same size, so cannot be stacked")
+        # An append interrupted before its index line was written leaves unindexed bytes between captures
+        offset = entries[0]['offset']
+        for i, entry in enumerate(entries):
+            if entry['offset'] != offset + 3 * numberSamples * i:
+                raise ValueError(f"Capture {start + i} does not directly follow capture {start + i - 1} in the raw " + \
+                        "file, so captures across it cannot be stacked")
+        return self._raw[offset:offset + 3 * numberSamples * len(entries)].reshape(len(entries), 3 * numberSamples)
+
+    def voltages(self, captureIndex, start=0, stop=None, **kwargs):
+        """
+        Decodes a capture, or a range of its samples, into voltages.
+
+        :param captureIndex: The index of the capture in the recording
+        :param start: The first sample to decode
+        :param stop: One past the last sample to decode. Defaults to the end of the capture.
+        :param kwargs: Other arguments to twosToVoltage(), such as maxVoltage, gain, offset or dtype
+        :returns: Array of voltages
+        """
+        return twosToVoltage(self.raw(captureIndex, start, stop), **kwargs)
+
+    def close(self):
+        """
+        Releases the memory map of the raw data.
+        """
+        self._raw = np.zeros(0, dtype=np.uint8)
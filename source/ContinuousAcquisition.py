@@ -0,0 +1,123 @@
+from .RingBuffer import RingBuffer
+import numpy as np
+import bisect
+import threading
+import time
+
+class ContinuousAcquisition:
+    """
+    Acquires data continuously from an MCP3561 by issuing captures back-to-back from a background thread. The next
+    capture is requested as soon as the previous one has been read, and the previous capture is decoded while the
+    ADC is sampling, so the only dead time is the device round trip.
+
+    The ADC cannot sample while it is transferring data, so the stream is not truly gap-free. The number of samples
+    missed before each capture is estimated from the host clock and reported alongside the data.
+
+    :param device: The MCP3561 to acquire from
+    :param captureSize: The number of samples in each capture (at most 500,000)
+    :param bufferSize: The number of samples the ring buffer holds before the oldest are overwritten
+    :param dtype: Data type of the stored voltages, either np.float32 or np.float64
+    """
+    def __init__(self, device, captureSize=125000, bufferSize=5000000, dtype=np.float64):
+        self.device = device
+        self.captureSize = int(captureSize)
+        self.buffer = RingBuffer(bufferSize, dtype=dtype)
+        self.dtype = dtype
+        self.gaps = [] # (stream index, number of samples missed before the capture starting there)
+        self.numberCaptures = 0
+        self.error = None
+        self._stopEvent = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def droppedSamples(self):
+        """
+        The number of samples overwritten in the ring buffer before they were read
+        """
+        return self.buffer.droppedEntries
+
+    def start(self):
+        """
+        Configures the device and starts the background acquisition thread.
+        """
+        if self.running:
+            return
+        self.device.Configure(self.captureSize)
+        self._stopEvent.clear()
+        self.buffer.open()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops acquiring once the capture in progress has finished. Data already in the buffer can still be read.
+        """
+        self._stopEvent.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        captureTime = self.captureSize / self.device.measurementRate
+        previousStartTime = None
+        try:
+            bytesWritten = self.device.writeLine('MEASURE?')
+            startTime = time.perf_counter()
+            while True:
+                measuredData = self.device.readMeasurement(bytesWritten)
+                if len(measuredData) != self.captureSize * 3:
+                    raise Exception(f"Capture {self.numberCaptures} was truncated. Got {len(measuredData)} of " + \
+                            f"{self.captureSize * 3} bytes.")
+
+                # Start the next capture before decoding this one, so decoding overlaps with sampling.
+                stopping = self._stopEvent.is_set()
+                if not stopping:
+                    bytesWritten = self.device.writeLine('MEASURE?')
+                    nextStartTime = time.perf_counter()
+
+                if previousStartTime is None:
+                    gapSamples = 0
+                else:
+                    gapTime = startTime - previousStartTime - captureTime
+                    gapSamples = max(0, int(round(gapTime * self.device.measurementRate)))
+                if self.numberCaptures > 0:
+                    self.gaps.append((self.buffer.totalWritten, gapSamples))
+                self.buffer.write(self.device.toVoltage(measuredData, dtype=self.dtype))
+                self.numberCaptures += 1
+
+                if stopping:
+                    break
+                previousStartTime, startTime = startTime, nextStartTime
+        except Exception as error:
+            self.error = error
+        finally:
+            self.buffer.close()
+
+    def read(self, numberSamples, timeout=None):
+        """
+        Reads the oldest unread samples from the stream, waiting for them to be acquired if necessary.
+
+        :param numberSamples: The number of samples to read
+        :param timeout: Maximum time to wait in seconds. If it expires, fewer samples are returned.
+        :returns: Tuple of the voltage array and a list of (index, gapSamples) pairs, one for each capture boundary
+            in the returned data, giving the index in the returned array and the estimated number of samples missed
+            there.
+        """
+        startIndex, voltages = self.buffer.read(numberSamples, timeout=timeout)
+        if len(voltages) < numberSamples and self.error is not None:
+            raise self.error
+        stopIndex = startIndex + len(voltages)
+        firstGap = bisect.bisect_left(self.gaps, (startIndex, 0))
+        lastGap = bisect.bisect_left(self.gaps, (stopIndex, 0))
+        gaps = [(index - startIndex, gapSamples) for index, gapSamples in self.gaps[firstGap:lastGap]]
+        return voltages, gaps
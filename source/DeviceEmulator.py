@@ -0,0 +1,498 @@
+import numpy as np
+import threading
+import time
+try:
+    from .framing import encodeFrame
+except ImportError: # Imported as a top-level module from the source directory, as the tests do
+    from framing import encodeFrame
+
+class TeensyEmulator:
+    """
+    In-process emulator of the Teensy ADC and stepper motor board, with the same interface as serial.Serial. Pass
+    it to SCPIDevice, MCP3561, Keithley or TEController as the device argument to run them without hardware.
+
+    Besides the Teensy commands (\\*IDN?, \\*RST, CONFIGURE, MEASURE?, SYNC:NUMPOINTS?, SYNC:DATA? and MOTOR:\\*), it
+    answers the TE controller's FETCH? and CONFIGURE:TEMPERATURE, and the Keithley's source, measure, sweep and trace
+    buffer commands, so every driver in this package can attach to it.
+
+    :param deviceID: The string returned by \\*IDN?
+    :param baudrate: The simulated link speed in bits per second. Only used when realTime is True.
+    :param measurementRate: The simulated ADC sampling rate in Hz
+    :param signal: Function of time (in seconds) returning the voltage at the ADC input. Defaults to a 0.1V, 1kHz sine.
+    :param noise: Standard deviation of the white noise (in volts) added to the signal
+    :param maxVoltage: The full-scale voltage of the simulated ADC
+    :param syncFrequency: Frequency in Hz of the simulated synchronization pulses, or None for no pulses
+    :param motorStepTime: Time taken by each motor step in seconds. If None, the MOTOR:PERIOD setting in ms is used.
+    :param temperatureTimeConstant: Time constant in seconds with which the temperature approaches its setpoint
+    :param realTime: If True, captures take as long as the ADC would take to sample them, and replies arrive at
+        the speed of the simulated link. If False, replies are available immediately.
+    :param latency: Time in seconds between a command being written and its reply starting, when realTime is True
+    :param dropRate: Probability that a data transfer has one byte dropped
+    :param corruptRate: Probability that a data transfer has one byte corrupted
+    :param stallTime: Time in seconds that each data transfer pauses half-way through
+    :param seed: Seed for the random number generator used for noise and faults
+    :param lineTerminator: The end of each line the emulator replies with. The Teensy sends '\\r\\n', and the
+        Keithley just '\\r'.
+    """
+    def __init__(self, deviceID='Teensy Emulator', baudrate=115200, measurementRate=9.76*1e3, signal=None,
+            noise=0.0, maxVoltage=3.3, syncFrequency=1000, motorStepTime=None, temperatureTimeConstant=0.0,
+            realTime=False, latency=0.0, dropRate=0.0, corruptRate=0.0, stallTime=0.0, seed=None,
+            lineTerminator='\r\n'):
+        self.deviceID = deviceID
+        self.baudrate = baudrate
+        self.measurementRate = measurementRate
+        self.signal = signal if signal is not None else lambda t: 0.1 * np.sin(2 * np.pi * 1000 * t)
+        self.noise = noise
+        self.maxVoltage = maxVoltage
+        self.syncFrequency = syncFrequency
+        self.motorStepTime = motorStepTime
+        self.temperatureTimeConstant = temperatureTimeConstant
+        self.realTime = realTime
+        self.latency = latency
+        self.dropRate = dropRate
+        self.corruptRate = corruptRate
+        self.stallTime = stallTime
+        self.random = np.random.default_rng(seed)
+        self.lineTerminator = lineTerminator
+
+        self.port = 'emulator'
+        self.timeout = None
+        self.is_open = True
+        self.startTime = time.perf_counter()
+        self._inputBuffer = b''
+        self._outputChunks = [] # [start time, bytes per second (None for instant), data, bytes already read]
+        self._lock = threading.RLock()
+
+        self.commands = {
+            '*IDN?': self._identify,
+            '*RST': self._reset,
+            'CONFIGURE': self._configure,
+            'MEASURE?': self._measure,
+            'MEASURE:FRAMED?': self._measureFramed,
+            'FETCH:FRAME?': self._fetchFrame,
+            'SYNC:NUMPOINTS?': self._syncPoints,
+            'SYNC:DATA?': self._syncData,
+            'MOTOR:POSITION': self._setMotorPosition,
+            'MOTOR:POSITION?': self._getMotorPosition,
+            'MOTOR:DIRECTION': self._setMotorDirection,
+            'MOTOR:DIRECTION?': self._getMotorDirection,
+            'MOTOR:ROTATE': self._rotateMotor,
+            'MOTOR:ROTATE?': self._getMotorRotating,
+            'MOTOR:ENABLE': self._enableMotor,
+            'MOTOR:DISABLE': self._disableMotor,
+            'MOTOR:ENABLED?': self._getMotorEnabled,
+            'MOTOR:PERIOD': self._setMotorPeriod,
+            'MOTOR:PERIOD?': self._getMotorPeriod,
+            'FETCH?': self._fetchTemperature,
+            'CONFIGURE:TEMPERATURE': self._setTemperature,
+            'CONFIGURE:REMOTE': lambda argument: None,
+            'SOURCE:VOLTAGE:LEVEL': self._setSourceVoltage,
+            'MEASURE:CURRENT?': self._measureCurrent,
+            'READ?': self._measureCurrent,
+            'SOURCE:VOLTAGE:MODE': self._setSourceMode,
+            'SOURCE:LIST:VOLTAGE': self._setSourceList,
+            'SOURCE:VOLTAGE:START': self._setSweepStart,
+            'SOURCE:VOLTAGE:STOP': self._setSweepStop,
+            'SOURCE:SWEEP:POINTS': self._setSweepPoints,
+            'SOURCE:DELAY': self._setSourceDelay,
+            'TRIGGER:COUNT': self._setTriggerCount,
+            'TRACE:CLEAR': self._clearTrace,
+            'TRACE:POINTS': lambda argument: None,
+            'TRACE:FEED': lambda argument: None,
+            'TRACE:FEED:CONTROL': self._setTraceControl,
+            'INITIATE': self._initiate,
+            '*OPC?': self._operationComplete,
+            'TRACE:DATA?': self._traceData,
+            'FORMAT:ELEMENTS': self._setFormatElements,
+            'FORMAT:DATA': self._setFormatData,
+            'FORMAT:BORDER': self._setFormatByteOrder,
+            'SYSTEM:COMMUNICATE:SERIAL:BAUD': self._setSerialBaudrate,
+        }
+        self._reset()
+        self.temperature = 25.0
+        self.temperatureSetpoint = 25.0
+        self._temperatureTime = self.startTime
+        self.sourceVoltage = 0.0
+        self.resistance = 1e6
+        self.sourceMode = 'FIXED'
+        self.sourceList = []
+        self.sweepStart = 0.0
+        self.sweepStop = 0.0
+        self.sweepPoints = 1
+        self.sourceDelay = 0.0
+        self.triggerCount = 1
+        self.readingTime = 1e-3 # Time the Keithley takes for each reading of a triggered sweep
+        self.trace = []
+        self.traceEnabled = False
+        self._sweepEndTime = 0.0
+        self.serialBaudrate = 9600 # The rate the Keithley's RS-232 port is set to
+
+    def _reset(self, argument=None):
+        self.numberMeasurements = 1
+        self.syncIndices = np.array([], dtype=np.int32)
+        self.motorPosition = 0
+        self.motorDirection = 0
+        self.motorEnabled = False
+        self.motorPeriod = 2
+        self._motorMove = None # (start time, start position, signed steps, time per step)
+        self._lastCapture = b''
+        self._samplesPerFrame = 4096
+        self.formatElements = ['VOL', 'CUR', 'RES', 'TIM', 'STA']
+        self.formatBinary = False
+        self.formatByteOrder = '>'
+        with self._lock:
+            self._outputChunks = []
+
+    # Serial interface
+    def _availableBytes(self, chunk, now):
+        startTime, bytesPerSecond, data, bytesRead = chunk
+        if now < startTime:
+            return 0
+        if bytesPerSecond is None:
+            return len(data) - bytesRead
+        return min(len(data), int((now - startTime) * bytesPerSecond)) - bytesRead
+
+    @property
+    def in_waiting(self):
+        now = time.perf_counter()
+        with self._lock:
+            total = 0
+            for chunk in self._outputChunks:
+                available = self._availableBytes(chunk, now)
+                total += available
+                if chunk[3] + available < len(chunk[2]):
+                    break
+            return total
+
+    def _take(self, size, terminator=None):
+        """
+        Removes up to size available bytes from the output, stopping after the terminator if one is given.
+        """
+        now = time.perf_counter()
+        taken = bytearray()
+        with self._lock:
+            while self._outputChunks and len(taken) < size:
+                chunk = self._outputChunks[0]
+                available = min(self._availableBytes(chunk, now), size - len(taken))
+                data = chunk[2][chunk[3]:chunk[3] + available]
+                if terminator is not None and terminator in data:
+                    data = data[:data.index(terminator) + len(terminator)]
+                taken += data
+                chunk[3] += len(data)
+                if chunk[3] == len(chunk[2]):
+                    self._outputChunks.pop(0)
+                if terminator is not None and taken.endswith(terminator):
+                    break
+                if chunk[3] < len(chunk[2]):
+                    break
+        return bytes(taken)
+
+    def read(self, size=1):
+        deadline = None if self.timeout is None else time.perf_counter() + self.timeout
+        data = self._take(size)
+        while len(data) < size:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            time.sleep(0.0005)
+            data += self._take(size - len(data))
+        return data
+
+    def readinto(self, buffer):
+        # The same as pyserial, so that callers passing buffers pyserial cannot fill fail here too
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def readline(self, size=-1):
+        return self.read_until(b'\n', size=None if size < 0 else size)
+
+    def read_until(self, expected=b'\n', size=None):
+        size = size if size is not None else float('inf')
+        deadline = None if self.timeout is None else time.perf_counter() + self.timeout
+        data = self._take(size, terminator=expected)
+        while not data.endswith(expected) and len(data) < size:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            time.sleep(0.0005)
+            data += self._take(size - len(data), terminator=expected)
+        return data
+
+    def write(self, data):
+        self._inputBuffer += bytes(data)
+        while b'\n' in self._inputBuffer:
+            line, self._inputBuffer = self._inputBuffer.split(b'\n', 1)
+            for command in line.decode('ascii').strip().split(';'):
+                self._handleCommand(command.strip())
+        return len(data)
+
+    def reset_input_buffer(self):
+        with self._lock:
+            self._outputChunks = []
+
+    def reset_output_buffer(self):
+        self._inputBuffer = b''
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+    # Command handling
+    def _handleCommand(self, command):
+        if len(command) == 0:
+            return
+        header, _, argument = command.partition(' ')
+        handler = self.commands.get(header.upper().lstrip(':'))
+        if handler is not None:
+            handler(argument.strip())
+
+    def _queueResponse(self, data, delay=0.0, faults=False):
+        """
+        Adds a reply to the output, starting after any reply already being sent.
+        """
+        if faults and len(data) > 1:
+            data = bytearray(data)
+            if self.random.random() < self.corruptRate:
+                index = self.random.integers(1, len(data))
+                data[index] ^= 0xFF
+            if self.random.random() < self.dropRate:
+                del data[self.random.integers(1, len(data))]
+        now = time.perf_counter()
+        bytesPerSecond = self.baudrate / 10 if self.realTime else None
+        with self._lock:
+            startTime = now + (delay + self.latency if self.realTime else 0)
+            if self._outputChunks and bytesPerSecond is not None:
+                lastStart, _, lastData, _ = self._outputChunks[-1]
+                startTime = max(startTime, lastStart + len(lastData) / bytesPerSecond)
+            if faults and self.stallTime > 0 and len(data) > 1:
+                half = len(data) // 2
+                self._outputChunks.append([startTime, bytesPerSecond, bytearray(data[:half]), 0])
+                if bytesPerSecond is not None:
+                    startTime += half / bytesPerSecond
+                self._outputChunks.append([startTime + self.stallTime, bytesPerSecond, bytearray(data[half:]), 0])
+            else:
+                self._outputChunks.append([startTime, bytesPerSecond, bytearray(data), 0])
+
+    def _queueLine(self, text):
+        self._queueResponse(bytes(text + self.lineTerminator, 'ascii'))
+
+    def _identify(self, argument):
+        self._queueLine(self.deviceID)
+
+    def _configure(self, argument):
+        self.numberMeasurements = int(argument)
+
+    def encodeCounts(self, counts):
+        """
+        Converts integers into the 3-byte, most-significant-byte-first twos complement data sent by the device.
+        """
+        return np.asarray(counts).astype('>i4').view(np.uint8).reshape(-1, 4)[:, 1:].tobytes()
+
+    def encodeSamples(self, voltages):
+        """
+        Converts voltages into the raw data the ADC would send for them, clipping at full scale.
+        """
+        counts = np.clip(np.round(np.asarray(voltages) / self.maxVoltage * pow(2, 23)), -pow(2, 23), pow(2, 23) - 1)
+        return self.encodeCounts(counts)
+
+    def _capture(self):
+        """
+        Samples the signal for the configured number of measurements and records the synchronization pulses.
+
+        :returns: The raw data bytes of the capture
+        """
+        captureStart = time.perf_counter() - self.startTime
+        times = captureStart + np.arange(self.numberMeasurements) / self.measurementRate
+        voltages = np.broadcast_to(self.signal(times), times.shape)
+        if self.noise > 0:
+            voltages = voltages + self.random.normal(scale=self.noise, size=self.numberMeasurements)
+
+        if self.syncFrequency is None:
+            self.syncIndices = np.array([], dtype=np.int32)
+        else:
+            periods = np.floor(times * self.syncFrequency)
+            self.syncIndices = np.flatnonzero(np.diff(periods) > 0).astype(np.int32) + 1
+
+        self._lastCapture = self.encodeSamples(voltages)
+        return self._lastCapture
+
+    def _measure(self, argument):
+        captureTime = self.numberMeasurements / self.measurementRate
+        self._queueResponse(b'#' + self._capture(), delay=captureTime, faults=True)
+
+    def _encodeFrame(self, frameIndex):
+        """
+        Builds one frame of the last capture, in the format described in framing.py.
+        """
+        frameBytes = self._samplesPerFrame * 3
+        return encodeFrame(frameIndex, self._lastCapture[frameIndex * frameBytes:(frameIndex + 1) * frameBytes])
+
+    def _measureFramed(self, argument):
+        self._samplesPerFrame = int(argument)
+        captureTime = self.numberMeasurements / self.measurementRate
+        self._capture()
+        numberFrames = -(-self.numberMeasurements // self._samplesPerFrame)
+        frames = b''.join(self._encodeFrame(i) for i in range(numberFrames))
+        self._queueResponse(frames, delay=captureTime, faults=True)
+
+    def _fetchFrame(self, argument):
+        self._queueResponse(self._encodeFrame(int(argument)), faults=True)
+
+    def _syncPoints(self, argument):
+        self._queueLine(str(len(self.syncIndices)))
+
+    def _syncData(self, argument):
+        self._queueResponse(b'#' + self.encodeCounts(self.syncIndices))
+
+    def _updateMotor(self):
+        if self._motorMove is None:
+            return
+        startTime, startPosition, steps, stepTime = self._motorMove
+        stepsTaken = min(abs(steps), int((time.perf_counter() - startTime) / stepTime)) if stepTime > 0 else abs(steps)
+        self.motorPosition = startPosition + int(np.sign(steps)) * stepsTaken
+        if stepsTaken == abs(steps):
+            self._motorMove = None
+
+    def _setMotorPosition(self, argument):
+        self._updateMotor()
+        self.motorPosition = int(argument)
+
+    def _getMotorPosition(self, argument):
+        self._updateMotor()
+        self._queueLine(str(self.motorPosition))
+
+    def _setMotorDirection(self, argument):
+        self.motorDirection = int(argument)
+
+    def _getMotorDirection(self, argument):
+        self._queueLine(str(self.motorDirection))
+
+    def _rotateMotor(self, argument):
+        self._updateMotor()
+        if not self.motorEnabled:
+            return
+        stepTime = self.motorStepTime if self.motorStepTime is not None else self.motorPeriod * 1e-3
+        self._motorMove = (time.perf_counter(), self.motorPosition, int(argument), stepTime)
+
+    def _getMotorRotating(self, argument):
+        self._updateMotor()
+        self._queueLine(str(int(self._motorMove is not None)))
+
+    def _enableMotor(self, argument):
+        self.motorEnabled = True
+
+    def _disableMotor(self, argument):
+        self._updateMotor()
+        self._motorMove = None
+        self.motorEnabled = False
+
+    def _getMotorEnabled(self, argument):
+        self._queueLine(str(int(self.motorEnabled)))
+
+    def _setMotorPeriod(self, argument):
+        self.motorPeriod = int(argument)
+
+    def _getMotorPeriod(self, argument):
+        self._queueLine(str(self.motorPeriod))
+
+    def _updateTemperature(self):
+        now = time.perf_counter()
+        if self.temperatureTimeConstant > 0:
+            decay = np.exp(-(now - self._temperatureTime) / self.temperatureTimeConstant)
+            self.temperature = self.temperatureSetpoint + (self.temperature - self.temperatureSetpoint) * decay
+        else:
+            self.temperature = self.temperatureSetpoint
+        self._temperatureTime = now
+
+    def _fetchTemperature(self, argument):
+        self._updateTemperature()
+        self._queueLine(f'#{self.temperature:.3f}$')
+
+    def _setTemperature(self, argument):
+        self._updateTemperature()
+        self.temperatureSetpoint = float(argument)
+
+    def _setSourceVoltage(self, argument):
+        self.sourceVoltage = float(argument)
+
+    def _keithleyReading(self, voltage, timestamp):
+        """
+        Gets the selected elements of a reading, out of voltage, current, resistance, timestamp and status.
+        """
+        values = {'VOL': voltage, 'CUR': voltage / self.resistance, 'RES': 9.91e37, 'TIM': timestamp, 'STA': 1.0}
+        return [values[element] for element in self.formatElements]
+
+    def _formatReadings(self, readings):
+        """
+        Encodes readings in the selected data format. The Keithley terminates its replies with a carriage return.
+        """
+        if self.formatBinary:
+            return b'#0' + np.array(readings, dtype=self.formatByteOrder + 'f4').tobytes() + b'\r'
+        return bytes(','.join(f'{value:+.6E}' for reading in readings for value in reading) + '\r', 'ascii')
+
+    def _measureCurrent(self, argument):
+        reading = self._keithleyReading(self.sourceVoltage, time.perf_counter() - self.startTime)
+        self._queueResponse(self._formatReadings([reading]))
+
+    def _setFormatElements(self, argument):
+        elements = [element.strip().upper()[:3] for element in argument.split(',')]
+        self.formatElements = [element for element in ['VOL', 'CUR', 'RES', 'TIM', 'STA'] if element in elements]
+
+    def _setFormatData(self, argument):
+        self.formatBinary = argument.upper().startswith('SREAL')
+
+    def _setFormatByteOrder(self, argument):
+        self.formatByteOrder = '<' if argument.upper().startswith('SWAP') else '>'
+
+    def _setSerialBaudrate(self, argument):
+        self.serialBaudrate = int(argument)
+
+    def _setSourceMode(self, argument):
+        self.sourceMode = argument.upper()
+
+    def _setSourceList(self, argument):
+        self.sourceList = [float(value) for value in argument.split(',')]
+
+    def _setSweepStart(self, argument):
+        self.sweepStart = float(argument)
+
+    def _setSweepStop(self, argument):
+        self.sweepStop = float(argument)
+
+    def _setSweepPoints(self, argument):
+        self.sweepPoints = int(argument)
+
+    def _setSourceDelay(self, argument):
+        self.sourceDelay = float(argument)
+
+    def _setTriggerCount(self, argument):
+        self.triggerCount = int(argument)
+
+    def _clearTrace(self, argument):
+        self.trace = []
+
+    def _setTraceControl(self, argument):
+        self.traceEnabled = argument.upper().startswith('NEXT')
+
+    def _initiate(self, argument):
+        if self.sourceMode.startswith('LIST'):
+            voltages = [self.sourceList[i % len(self.sourceList)] for i in range(self.triggerCount)]
+        elif self.sourceMode.startswith('SWE'):
+            sweep = np.linspace(self.sweepStart, self.sweepStop, self.sweepPoints)
+            voltages = [sweep[i % len(sweep)] for i in range(self.triggerCount)]
+        else:
+            voltages = [self.sourceVoltage] * self.triggerCount
+
+        startTime = time.perf_counter()
+        pointTime = self.sourceDelay + self.readingTime
+        if self.traceEnabled:
+            self.trace += [(voltage, startTime - self.startTime + (i + 1) * pointTime)
+                    for i, voltage in enumerate(voltages)]
+        self._sweepEndTime = startTime + len(voltages) * pointTime
+
+    def _operationComplete(self, argument):
+        self._queueResponse(b'1\r', delay=max(0.0, self._sweepEndTime - time.perf_counter()))
+
+    def _traceData(self, argument):
+        self._queueResponse(self._formatReadings([self._keithleyReading(*point) for point in self.trace]))
@@ -0,0 +1,220 @@
+from .SCPIDevice import DeviceNotFoundError
+import serial
+import serial.tools.list_ports as list_ports
+import json
+import os
+import time
+
+class DeviceRegistry:
+    """
+    Finds instruments on the serial ports and hands out open, identified connections to them, so that creating a
+    device does not have to search the ports, reset and identify it every time.
+
+    Each instrument is registered under a name with rules for recognizing it: the USB vendor ID, product ID and
+    serial number of its port, a substring of the port name, and/or a substring of its ``*IDN?`` response. Ports
+    are listed once. The port found for each name is saved to a cache file, so later scripts go straight to the
+    right port and only check that it is still there.
+
+    Connections and device objects are pooled, so asking for the same instrument twice returns the same one.
+
+        registry = DeviceRegistry()
+        registry.register('adc', portName='usbmodem', idn='MCP3561')
+        registry.register('keithley', vid=0x067b, pid=0x2303, baudRate=9600)
+        adc = registry.getDevice('adc', MCP3561)
+        keithley = registry.getDevice('keithley', Keithley)
+
+    :param cacheFile: JSON file the port found for each instrument is saved to. None disables the cache.
+    :param opener: Function taking a port name and baud rate and returning an open serial connection
+    :param startupTime: Time in seconds to wait after opening a port, for devices (like the Teensy) that restart
+        when the port is opened
+    """
+    def __init__(self, cacheFile='device_registry.txt', opener=None, startupTime=1.0):
+        self.cacheFile = cacheFile
+        self.opener = opener if opener is not None else lambda port, baudRate: serial.Serial(port, baudRate, timeout=3)
+        self.startupTime = startupTime
+        self.rules = {}
+        self.connections = {} # name: (open connection, device ID)
+        self.devices = {}
+        self._ports = None
+        self._cache = {}
+
+        if self.cacheFile is not None and os.path.isfile(self.cacheFile):
+            with open(self.cacheFile, 'r') as cacheFile:
+                self._cache = json.load(cacheFile)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.closeAll()
+
+    def register(self, name, vid=None, pid=None, serialNumber=None, portName=None, idn=None, baudRate=9600):
+        """
+        Adds an instrument and the rules for recognizing it. All of the given rules must match.
+
+        :param name: The name to look the instrument up with
+        :param vid: USB vendor ID of the port
+        :param pid: USB product ID of the port
+        :param serialNumber: USB serial number of the port. This is the only way to tell apart identical boards
+            without opening them.
+        :param portName: Substring of the port name, such as 'usbmodem' or 'usbserial'
+        :param idn: Substring of the instrument's response to ``*IDN?``. Checking this means opening the port.
+        :param baudRate: Baud rate to open the port at
+        """
+        self.rules[name] = {'vid': vid, 'pid': pid, 'serialNumber': serialNumber, 'portName': portName,
+                'idn': idn, 'baudRate': baudRate}
+
+    def add(self, name, device, deviceID=None):
+        """
+        Puts an already-open connection (such as a TeensyEmulator) in the pool under a name.
+
+        :param name: The name to look the instrument up with
+        :param device: The open connection
+        :param deviceID: The instrument's ``*IDN?`` response, if known
+        """
+        self.connections[name] = (device, deviceID)
+
+    @property
+    def ports(self):
+        """
+        The serial ports on this computer, listed on first use
+        """
+        if self._ports is None:
+            self._ports = list(list_ports.comports())
+        return self._ports
+
+    def refresh(self):
+        """
+        Lists the serial ports again, after a device has been plugged in or removed.
+        """
+        self._ports = None
+
+    def _matches(self, port, rule):
+        """
+        Checks a port against the USB and port name rules of an instrument.
+        """
+        return (rule['vid'] is None or port.vid == rule['vid']) and \
+                (rule['pid'] is None or port.pid == rule['pid']) and \
+                (rule['serialNumber'] is None or port.serial_number == rule['serialNumber']) and \
+                (rule['portName'] is None or rule['portName'] in port.device)
+
+    def _claimedPorts(self):
+        return set(getattr(connection, 'port', None) for connection, deviceID in self.connections.values())
+
+    def _open(self, port, rule):
+        """
+        Opens a port and asks the instrument on it to identify itself.
+
+        :returns: Tuple of (open connection, device ID)
+        """
+        connection = self.opener(port, rule['baudRate'])
+        time.sleep(self.startupTime)
+        connection.reset_input_buffer()
+        connection.write(b'*IDN?\n')
+        deviceID = connection.readline().decode('ascii', errors='replace').strip()
+        return connection, deviceID
+
+    def _cachedPort(self, name):
+        """
+        Gets the port saved for an instrument by a previous run, if it is still present and has the same serial
+        number.
+        """
+        if name not in self._cache:
+            return None
+        cached = self._cache[name]
+        for port in self.ports:
+            if port.device == cached['port'] and port.serial_number == cached.get('serialNumber') and \
+                    self._matches(port, self.rules[name]):
+                return port
+        return None
+
+    def _saveCache(self):
+        if self.cacheFile is not None:
+            with open(self.cacheFile, 'w') as cacheFile:
+                json.dump(self._cache, cacheFile)
+
+    def connect(self, name):
+        """
+        Gets an open connection to an instrument, finding and opening its port if it is not already in the pool.
+
+        :param name: The name the instrument was registered or added under
+        :returns: Tuple of (open connection, device ID)
+        """
+        if name in self.connections:
+            connection, deviceID = self.connections[name]
+            if getattr(connection, 'is_open', True):
+                return connection, deviceID
+            del self.connections[name]
+            self.devices.pop(name, None)
+        if name not in self.rules:
+            raise DeviceNotFoundError(f"No instrument registered under the name {name}")
+
+        rule = self.rules[name]
+        claimedPorts = self._claimedPorts()
+        cachedPort = self._cachedPort(name)
+        if cachedPort is not None and cachedPort.device not in claimedPorts:
+            found = self._tryPort(name, cachedPort, rule)
+            if found is not None:
+                return found
+            # Something else is on the cached port now (such as after swapping boards), so search the rest
+            claimedPorts.add(cachedPort.device)
+
+        candidates = [port for port in self.ports if self._matches(port, rule) and port.device not in claimedPorts]
+        if rule['idn'] is None and len(candidates) > 1:
+            raise DeviceNotFoundError(f"Ports {[port.device for port in candidates]} all match {name}. " + \
+                    "Register it with a serial number or IDN to choose between them.")
+
+        for port in candidates:
+            found = self._tryPort(name, port, rule)
+            if found is not None:
+                return found
+
+        raise DeviceNotFoundError(f"No port found for {name}. Check the device is plugged in and try again.")
+
+    def _tryPort(self, name, port, rule):
+        """
+        Opens a port and, if the instrument on it matches the IDN rule, adds the connection to the pool and saves
+        the port to the cache.
+
+        :returns: Tuple of (open connection, device ID), or None if the instrument did not match
+        """
+        connection, deviceID = self._open(port.device, rule)
+        if rule['idn'] is not None and rule['idn'] not in deviceID:
+            connection.close()
+            return None
+        self.connections[name] = (connection, deviceID)
+        self._cache[name] = {'port': port.device, 'serialNumber': port.serial_number, 'deviceID': deviceID}
+        self._saveCache()
+        return connection, deviceID
+
+    def getDevice(self, name, deviceClass, **kwargs):
+        """
+        Gets a device object for an instrument, creating it on an open connection from the pool if needed.
+
+        :param name: The name the instrument was registered or added under
+        :param deviceClass: The driver class, such as MCP3561, Keithley or TEController
+        :param kwargs: Other arguments passed to the driver class when it is created
+        :returns: The device object
+        """
+        connection, deviceID = self.connect(name)
+        if name in self.rules:
+            # The driver sets the baud rate of the port it is given, so keep it at the one the port was opened at
+            kwargs.setdefault('baudRate', self.rules[name]['baudRate'])
+        if name not in self.devices or self.devices[name].device is not connection:
+            self.devices[name] = deviceClass(device=connection, deviceID=deviceID, **kwargs)
+        return self.devices[name]
+
+    def close(self, name):
+        """
+        Closes the connection to one instrument and removes it from the pool.
+        """
+        connection, deviceID = self.connections.pop(name)
+        self.devices.pop(name, None)
+        connection.close()
+
+    def closeAll(self):
+        """
+        Closes every connection in the pool.
+        """
+        for name in list(self.connections):
+            self.close(name)
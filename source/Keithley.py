@@ -1,19 +1,123 @@
-from .SCPIDevice import SCPIDevice
+from .SCPIDevice import SCPIDevice, DataError
 import serial
 import json
 import numpy as np
 import time
-import re
 from math import ceil
 
 class Keithley(SCPIDevice):
-	def __init__(self):
-		SCPIDevice.__init__(self, baudRate=9600)
+	maxListPoints = 100 # Longest source list the Keithley accepts
+	maxBufferPoints = 2500 # Size of the trace buffer
+	allElements = ['voltage', 'current', 'resistance', 'time', 'status'] # What each reading contains by default
+	baudRates = [57600, 38400, 19200, 9600, 4800, 2400, 1200, 600, 300]
+
+	def __init__(self, device=None, deviceID=None, baudRate=9600):
+		"""
+		:param device: An already-open serial port (or emulator) to use instead of searching for one
+		:param deviceID: The device's identifier string, if already known
+		:param baudRate: The baud rate the Keithley's RS-232 port is currently set to
+		"""
+		SCPIDevice.__init__(self, baudRate=baudRate, device=device, deviceID=deviceID)
 		self._set_voltage = 0
 		self._set_current = 0
 		self._output = False
 		self._mode = 'voltage'
 
+	def Reset(self):
+		"""
+		Resets the Keithley, and puts the reading format back to ASCII readings with every element.
+		"""
+		SCPIDevice.Reset(self)
+		self.writeLine(':format:elements ' + ','.join(self.allElements) + ';:format:data ascii')
+		self._elements = list(self.allElements)
+		self._binary = False
+
+	def setElements(self, elements=('voltage', 'current')):
+		"""
+		Chooses which elements each reading returns. Leaving out the ones that are not needed shortens every
+		reading sent over the serial link.
+
+		:param elements: Sequence of element names, from 'voltage', 'current', 'resistance', 'time' and 'status'.
+			Readings always come back in that order, whatever the order given here.
+		"""
+		unknownElements = set(elements) - set(self.allElements)
+		if unknownElements:
+			raise ValueError(f"Unknown elements {unknownElements}. Choose from {self.allElements}")
+		self._elements = [element for element in self.allElements if element in elements]
+		self.writeLine(':format:elements ' + ','.join(self._elements))
+
+	def setBinary(self, binary=True):
+		"""
+		Chooses between ASCII readings and binary single-precision floats (SREAL, sent little-endian). Binary
+		readings take 4 bytes per element instead of about 13.
+
+		:param binary: True for binary, False for ASCII
+		"""
+		if binary:
+			self.writeLine(':format:data sreal;:format:border swapped')
+		else:
+			self.writeLine(':format:data ascii')
+		self._binary = binary
+
+	def setBaudRate(self, baudRate):
+		"""
+		Changes the baud rate of the Keithley's RS-232 port and switches this end of the link to match. The Keithley
+		remembers the new rate, so open it at this rate next time.
+
+		:param baudRate: The new baud rate, one of Keithley.baudRates
+		"""
+		if baudRate not in self.baudRates:
+			raise ValueError(f"The Keithley does not support {baudRate} baud. Choose from {self.baudRates}")
+		oldBaudRate = self.device.baudrate
+		self.writeLine(f':system:communicate:serial:baud {baudRate}')
+		self.device.flush()
+		time.sleep(0.1)
+		self.device.baudrate = baudRate
+		self.device.reset_input_buffer()
+		if len(self.Identify()) == 0: # Returns as soon as the reply is complete, so a good link costs no timeout
+			self.device.baudrate = oldBaudRate
+			raise DataError(f"No reply from the Keithley after switching to {baudRate} baud")
+
+	def Identify(self):
+		"""
+		Requests the Keithley's identifier string. Like every Keithley reply, it ends in a carriage return only.
+
+		:return: The identifier string with the terminator stripped
+		"""
+		self.writeLine('*IDN?')
+		return self.readResponse()
+
+	def readReadings(self, numberPoints, numberReplies=1):
+		"""
+		Reads readings sent in one or more replies (one per query) and parses them all at once.
+
+		:param numberPoints: The total number of readings to read
+		:param numberReplies: The number of replies they arrive in
+		:returns: Array of shape (numberPoints, number of elements), with columns in the order of the selected
+			elements
+		"""
+		numberElements = len(self._elements)
+		if self._binary:
+			# Each reply is '#0', then 4 bytes per value, then the carriage return
+			replySize = 3 + 4 * numberElements * numberPoints // numberReplies
+			data = self.device.read(replySize * numberReplies)
+			if len(data) != replySize * numberReplies:
+				raise DataError(f"Expected {replySize * numberReplies} bytes of readings, got {len(data)}")
+			replies = np.frombuffer(data, dtype=np.uint8).reshape(numberReplies, replySize)
+			values = np.ascontiguousarray(replies[:,2:-1]).view('<f4')
+		else:
+			data = ','.join(self.readResponse() for i in range(numberReplies))
+			values = np.array(data.split(','), dtype=np.float64)
+		return values.reshape(numberPoints, numberElements)
+
+	def _column(self, readings, element):
+		"""
+		Gets one element of each reading from an array returned by readReadings().
+		"""
+		if element not in self._elements:
+			raise ValueError(f"Readings do not include {element}. Select it with setElements().")
+		return readings[:,self._elements.index(element)]
+
 	def setVoltageMode(self):
 		if self._mode != 'voltage':
 			self.writeLine('source:function voltage')
@@ -57,39 +161,115 @@ class Keithley(SCPIDevice):
 	def setVoltageCompliance(self, voltage):
 		self.writeLine('sense:voltage:protection:level ' + str(voltage))
 
+	def readResponse(self):
+		"""
+		Reads one reply. The Keithley ends its replies with a carriage return rather than a newline, so this returns
+		as soon as the reply is complete instead of waiting for the timeout.
+
+		:returns: The reply with the terminator stripped
+		"""
+		return self.device.read_until(b'\r').decode('ascii').rstrip('\r\n')
+
+	def sweepVoltageMeasureCurrent(self, voltages, delay=0.0, measuredVoltages=None, measuredCurrents=None):
+		"""
+		Runs a voltage sweep on the Keithley itself: the voltages are programmed in as a linear sweep (if evenly
+		spaced) or a source list, triggered once, stored in the trace buffer and read back in one transfer. Sweeps
+		longer than the source list or trace buffer are run in several parts.
+
+		:param voltages: The voltages to apply, in order
+		:param delay: Source delay in seconds between applying each voltage and measuring
+		:param measuredVoltages: Optional preallocated array to store the measured voltages in
+		:param measuredCurrents: Optional preallocated array to store the measured currents in
+		:returns: Tuple of (measured voltages, measured currents)
+		"""
+		voltages = np.asarray(voltages, dtype=np.float64)
+		if measuredVoltages is None:
+			measuredVoltages = np.empty(len(voltages))
+		if measuredCurrents is None:
+			measuredCurrents = np.empty(len(voltages))
+
+		if self._output == False:
+			self.setVoltage(0)
+			self.outputOn()
+		self.setVoltageMode()
+
+		linear = len(voltages) > 2 and np.allclose(np.diff(voltages), voltages[1] - voltages[0])
+		partSize = self.maxBufferPoints if linear else self.maxListPoints
+		for start in range(0, len(voltages), partSize):
+			stop = min(start + partSize, len(voltages))
+			self._runSweep(voltages[start:stop], linear, delay, measuredVoltages[start:stop],
+					measuredCurrents[start:stop])
+
+		self.writeLine('source:voltage:mode fixed')
+		self._set_voltage = None # The source level after a sweep is not the one we last set
+		self.setVoltage(0)
+		self.outputOff()
+		return (measuredVoltages, measuredCurrents)
+
+	def sweepLinear(self, startVoltage, stopVoltage, numberPoints, delay=0.0):
+		"""
+		Runs a linear voltage sweep on the Keithley itself. See sweepVoltageMeasureCurrent().
+
+		:returns: Tuple of (measured voltages, measured currents)
+		"""
+		return self.sweepVoltageMeasureCurrent(np.linspace(startVoltage, stopVoltage, numberPoints), delay=delay)
+
+	def _runSweep(self, voltages, linear, delay, measuredVoltages, measuredCurrents):
+		"""
+		Programs, triggers and reads back one sweep of at most maxBufferPoints points.
+		"""
+		numberPoints = len(voltages)
+		if linear:
+			commands = ['source:voltage:mode sweep', f'source:voltage:start {voltages[0]:g}',
+					f'source:voltage:stop {voltages[-1]:g}', f'source:sweep:points {numberPoints}']
+		else:
+			commands = ['source:voltage:mode list', 'source:list:voltage ' + ','.join(f'{v:g}' for v in voltages)]
+		commands += [f'source:delay {delay:g}', f'trigger:count {numberPoints}', 'trace:clear',
+				f'trace:points {numberPoints}', 'trace:feed sense', 'trace:feed:control next', 'initiate']
+		self.writeLine(';'.join(':' + command for command in commands))
+
+		# *OPC? is only answered once the sweep has finished, so wait for it with a long enough timeout
+		timeoutOld = self.device.timeout
+		try:
+			self.device.timeout = max(timeoutOld, 2 * numberPoints * (delay + 0.05) + 1)
+			self.writeLine('*opc?')
+			self.readResponse()
+			self.writeLine(':trace:data?')
+			readings = self.readReadings(numberPoints)
+		finally:
+			self.device.timeout = timeoutOld
+
+		measuredVoltages[:] = self._column(readings, 'voltage')
+		measuredCurrents[:] = self._column(readings, 'current')
+
 	def applyVoltageMeasureCurrent(self, voltages, delay=0.5):
 		if(delay < 0.25):
-			print("WARNING: COMMUNICATION OVERFLOW WILL BE CAUSED. DELAY CANNOT BE LESS THAN 0.2s. SWITCHING TO 0.2s")
+			print("WARNING: COMMUNICATION OVERFLOW WILL BE CAUSED. DELAY CANNOT BE LESS THAN 0.25s. SWITCHING TO 0.25s")
 			delay = 0.25
 		if self._output == False:
 			self.setVoltage(0)
 			self.outputOn()
-		measured_currents = np.array([])
-		measured_voltages = np.array([])
 		if isinstance(voltages, (np.ndarray, list, tuple)):
-			if len(voltages) > 200:
-				segments = ceil(len(voltages) / 200)
-				voltage_container = np.array_split(voltages, segments)
-			else:
-				voltage_container = np.array([voltages])
-			for voltages in voltage_container:
-				for voltage in voltages:
+			measured_voltages = np.empty(len(voltages))
+			measured_currents = np.empty(len(voltages))
+			start = 0
+			for segment in np.array_split(voltages, ceil(len(voltages) / 200)):
+				for voltage in segment:
 					self.setVoltage(voltage)
 					time.sleep(delay/2) # Wait 500ms for the device [HACK - NEED TO FIX THIS ]
 					self.writeLine('measure:current?')
 					time.sleep(delay/2)
-				data = self.readLine()
-				data = np.array(re.split(',|\r', data), dtype=np.float64)
-				data = data.reshape(len(voltages), 5)
-				measured_voltages = np.append(measured_voltages, data[:,0])
-				measured_currents = np.append(measured_currents, data[:,1])
+				readings = self.readReadings(len(segment), numberReplies=len(segment))
+				measured_voltages[start:start + len(segment)] = self._column(readings, 'voltage')
+				measured_currents[start:start + len(segment)] = self._column(readings, 'current')
+				start += len(segment)
 
 		else:
 			self.setVoltage(voltages)
 			self.writeLine('read?')
-			data = self.readLine().split(',')
-			measured_voltages = float(data[0])
-			measured_currents = float(data[1])
+			readings = self.readReadings(1)
+			measured_voltages = float(self._column(readings, 'voltage')[0])
+			measured_currents = float(self._column(readings, 'current')[0])
 
 		self.setVoltage(0)
 		self.outputOff()
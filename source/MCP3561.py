@@ -1,12 +1,21 @@
-from .SCPIDevice import SCPIDevice
+from .SCPIDevice import SCPIDevice, DataError
+from .AD7766_postprocessing import twosToVoltage, twosToInteger
+from .ContinuousAcquisition import ContinuousAcquisition
+from .framing import parseFrames, frameLengths, frameOverhead
+from .ScanPlan import planScan, wavelengthSteps
+from .BufferPool import BufferPool
+from .lock_in import lockIn
+from .spectral_density import getWindow
+from contextlib import contextmanager
 import serial
 import json
 import os
 import numpy as np
 
 class MCP3561(SCPIDevice):
-    def __init__(self, baudRate=115200, sampling_frequency=9.76*1e3, device_type='usbmodem'):
-        SCPIDevice.__init__(self, baudRate=baudRate, device_type=device_type)
+    def __init__(self, baudRate=115200, sampling_frequency=9.76*1e3, device_type='usbmodem', device=None,
+            deviceID=None, settingsFile='device_settings.txt'):
+        SCPIDevice.__init__(self, baudRate=baudRate, device_type=device_type, device=device, deviceID=deviceID)
 
         self.numberMeasurements = 1
         self.numberBytes = self.numberMeasurements*3 + 1
@@ -14,17 +23,43 @@ class MCP3561(SCPIDevice):
         self.measurementRate = sampling_frequency
         self.microstepsPerNanometer = 30.3716*1.011 # calibrated from 800nm - 1700nm. Optimized for 5nm steps.
         self.microstepsCorrection = -6.17*1e-6
+        self.maxVoltage = 3.3
+        self.voltageOffset = 0.0 # Per-device calibration, applied as gain * voltage + offset
+        self.voltageGain = 1.0
+        self.settingsFile = settingsFile
+        self.bufferPool = None # Created for the configured capture size on first use by measurePooled()
 
-        if(os.path.isfile('device_settings.txt')):
-            with open('device_settings.txt', 'r') as settingsFile:
+        if(os.path.isfile(self.settingsFile)):
+            with open(self.settingsFile, 'r') as settingsFile:
                 data = json.load(settingsFile)
                 self._wavelength = data['wavelength']
+                self.voltageOffset = data.get('voltageOffset', self.voltageOffset)
+                self.voltageGain = data.get('voltageGain', self.voltageGain)
+
+    def saveSettings(self):
+        """
+        Writes the current wavelength and voltage calibration to the settings file. The file is replaced in one
+        step, so an interrupted save cannot leave it empty or half-written.
+        """
+        temporaryFile = self.settingsFile + '.tmp'
+        with open(temporaryFile, 'w') as settingsFile:
+            json.dump({'wavelength': float(self._wavelength), 'voltageOffset': float(self.voltageOffset),
+                'voltageGain': float(self.voltageGain)}, settingsFile)
+        os.replace(temporaryFile, self.settingsFile)
 
     def setWavelength(self, wavelength):
-        self.increaseWavelength(wavelength - self.wavelength)
+        self.setWavelengthAsync(wavelength).wait()
+
+    def setWavelengthAsync(self, wavelength):
+        """
+        Starts moving the monochromator to a wavelength without waiting for the motor to stop.
 
-        with open('device_settings.txt', 'w') as settingsFile:
-            json.dump({'wavelength': float(self._wavelength)}, settingsFile)
+        :param wavelength: The wavelength to move to, in nm
+        :returns: MotorMove handle to wait on
+        """
+        motorMove = self.increaseWavelengthAsync(wavelength - self.wavelength)
+        self.saveSettings()
+        return motorMove
 
     def getWavelength(self):
         return self._wavelength
@@ -32,9 +67,54 @@ class MCP3561(SCPIDevice):
     wavelength = property(getWavelength, setWavelength)
 
     def increaseWavelength(self, nm):
-        integerSteps = int(np.round((self.microstepsPerNanometer * nm)*(1 + self.microstepsCorrection * nm)))
-        self.rotateMotor(integerSteps)
+        self.increaseWavelengthAsync(nm).wait()
+
+    def increaseWavelengthAsync(self, nm):
+        """
+        Starts moving the monochromator by a number of nm without waiting for the motor to stop.
+
+        :param nm: The change in wavelength, in nm
+        :returns: MotorMove handle to wait on
+        """
+        integerSteps = int(wavelengthSteps(nm, self.microstepsPerNanometer, self.microstepsCorrection))
+        motorMove = self.rotateMotorAsync(integerSteps)
         self._wavelength += integerSteps / self.microstepsPerNanometer
+        return motorMove
+
+    def planScan(self, wavelengths, repeats=1, serpentine=True):
+        """
+        Plans a scan over a set of wavelengths starting from the current wavelength, ordered to minimize motor
+        travel. See ScanPlan.planScan().
+
+        :param wavelengths: The wavelengths to measure at, in any order
+        :param repeats: The number of times to sweep over the wavelengths
+        :param serpentine: Reverse direction on alternate sweeps
+        :returns: ScanPlan to pass to scan()
+        """
+        return planScan(wavelengths, self.wavelength, self.microstepsPerNanometer, self.microstepsCorrection,
+                repeats=repeats, serpentine=serpentine)
+
+    def scan(self, plan, checkpointInterval=10):
+        """
+        Moves through the points of a scan plan, stopping at each one for the caller to measure. The wavelength is
+        only written to the settings file every checkpointInterval points and at the end, rather than on every move.
+
+        :param plan: ScanPlan from planScan(). It must have been planned from the current wavelength.
+        :param checkpointInterval: The number of points between saves of the settings file
+        :returns: Generator of (index of the point in the plan, target wavelength) once the motor has stopped there
+        """
+        if not np.isclose(plan.startWavelength, self.wavelength):
+            raise ValueError(f"Plan starts at {plan.startWavelength} nm but the monochromator is at {self.wavelength} nm")
+        try:
+            for i, steps in enumerate(plan.steps):
+                motorMove = self.rotateMotorAsync(int(steps))
+                self._wavelength = plan.achievedWavelengths[i]
+                motorMove.wait()
+                if (i + 1) % checkpointInterval == 0:
+                    self.saveSettings()
+                yield i, plan.wavelengths[i]
+        finally:
+            self.saveSettings()
 
     def getSyncPoints(self):
         """
@@ -61,10 +141,31 @@ class MCP3561(SCPIDevice):
         measuredData = np.frombuffer(measuredData[1:], dtype=np.uint8) # Discard the leading # and the newline at the end
         return measuredData
 
+    def getSyncIndices(self):
+        """
+        Get the decoded measurement numbers that each synchronization pulse corresponds to.
+
+        :returns: int32 array of the measurement indices of the synchronization point events
+        """
+        return twosToInteger(self.getSyncData())
+
+    syncIndices = property(getSyncIndices)
+
     def closeDevice(self):
         self.device.close()
-        with open('device_settings.txt', 'w') as settingsFile:
-            json.dump({'wavelength': float(self._wavelength)}, settingsFile)
+        self.saveSettings()
+
+    def toVoltage(self, data, dtype=np.float64, out=None):
+        """
+        Converts raw data from Measure() into calibrated voltages using this device's offset and gain.
+
+        :param data: Array of 8-bit integers returned by Measure()
+        :param dtype: Output data type, either np.float32 or np.float64
+        :param out: Optional preallocated output array with one entry per sample
+        :returns: Array of calibrated voltages
+        """
+        return twosToVoltage(data, maxVoltage=self.maxVoltage, dtype=dtype, out=out,
+                offset=self.voltageOffset, gain=self.voltageGain)
 
     def Configure(self, numberMeasurements):
         """ Configures the number of measuremets for the device to send back
@@ -79,28 +180,245 @@ class MCP3561(SCPIDevice):
         self.numberBytes = int(numberMeasurements)*3 + 1
         self.writeLine('CONFIGURE ' + str(self.numberMeasurements))
 
+    def startContinuous(self, captureSize=125000, bufferSize=5000000, dtype=np.float64):
+        """
+        Starts continuous acquisition in the background. Captures are issued back-to-back and their calibrated
+        voltages are appended to a ring buffer, which can be read as one long stream.
+
+        :param captureSize: The number of samples in each capture (at most 500,000)
+        :param bufferSize: The number of samples the ring buffer holds before the oldest are overwritten
+        :param dtype: Data type of the stored voltages, either np.float32 or np.float64
+        :returns: The running ContinuousAcquisition. Call stop() on it when finished.
+        """
+        acquisition = ContinuousAcquisition(self, captureSize=captureSize, bufferSize=bufferSize, dtype=dtype)
+        acquisition.start()
+        return acquisition
+
     def Measure(self):
         """
         Measures data from the ADC based on the number of measurements configured.
 
         :returns: Array of 8-bit integers starting with the most significant byte of the first measurement.
         """
+        bytesWritten = self.writeLine('MEASURE?')
+        return self.readMeasurement(bytesWritten)
+
+    def readMeasurement(self, bytesWritten=None, buffer=None):
+        """
+        Reads back the data for a MEASURE? command that has already been sent to the device. Splitting this out of
+        Measure() lets callers do other work while the ADC is sampling.
+
+        :param bytesWritten: The number of bytes written when sending the command, used for error reporting.
+        :param buffer: Optional uint8 array of at least numberBytes bytes to read the data into, instead of
+            allocating a new array. pyserial's readinto() still reads through read(), so the bytes arrive in a
+            temporary bytes object and are copied into the buffer.
+        :returns: Array of 8-bit integers starting with the most significant byte of the first measurement. If a
+            buffer was given, this is a view of it past the '#' header.
+        """
         timeoutOld = self.device.timeout
         if(self.numberMeasurements / self.measurementRate > self.device.timeout - 0.1):
             self.device.timeout = self.numberMeasurements / self.measurementRate * 1.2 # Give some wiggle room.
 
-        bytesWritten = self.writeLine('MEASURE?')
-        measuredData = self.device.read(self.numberBytes)
+        try:
+            if buffer is None:
+                measuredData = np.frombuffer(self.device.read(self.numberBytes), dtype=np.uint8)
+                bytesRead = len(measuredData)
+            else:
+                measuredData = buffer[:self.numberBytes]
+                # pyserial's readinto() slice-assigns bytes, which numpy arrays do not accept but memoryviews do
+                bytesRead = self.device.readinto(memoryview(measuredData))
+        finally:
+            self.device.timeout = timeoutOld
 
-        if len(measuredData) == 0:
+        if bytesRead == 0:
             raise Exception(f"No data measured from device. Attempted to read {self.numberBytes} bytes. " + \
                     f"{bytesWritten} bytes successfully written")
+        if measuredData[0] != ord('#'):
+            raise DataError(f"Data corrupted. Did not get # as first character, got {bytes(measuredData[0:1])}")
+        if bytesRead != self.numberBytes:
+            raise DataError(f"Data truncated. Got {bytesRead} of {self.numberBytes} bytes.")
 
-        measuredData = np.frombuffer(measuredData[1:], dtype=np.uint8)
-        #else:
-        #    raise Exception("Data corrupted. Did not get # as first character.")
+        return measuredData[1:] # View past the header, no copy
 
-        if(self.numberMeasurements / self.measurementRate > self.device.timeout - 0.1):
+    @contextmanager
+    def measurePooled(self):
+        """
+        Measures data from the ADC into a buffer from this device's buffer pool, and returns the buffer to the pool
+        when the block ends. Repeated captures of the same size then reuse the same array instead of each allocating
+        a new one (the serial port still reads each capture into a temporary bytes object first, see
+        readMeasurement()):
+
+            voltages = np.empty(numberMeasurements)
+            for i in range(5000):
+                with device.measurePooled() as data:
+                    device.toVoltage(data, out=voltages)
+
+        The data must not be used after the block ends. Copy it if it needs to be kept.
+
+        :returns: Context manager giving the array of 8-bit integers, as returned by Measure()
+        """
+        if self.bufferPool is None or self.bufferPool.bufferSize != self.numberBytes:
+            self.bufferPool = BufferPool(self.numberBytes)
+        buffer = self.bufferPool.acquire()
+        try:
+            bytesWritten = self.writeLine('MEASURE?')
+            yield self.readMeasurement(bytesWritten, buffer=buffer)
+        finally:
+            self.bufferPool.release(buffer)
+
+    def measureUntil(self, frequency, targetSNR=None, targetUncertainty=None, blockTime=0.05, minTime=0.1,
+            maxTime=2.0, window='boxcar'):
+        """
+        Measures the amplitude of a signal at a known frequency, integrating only for as long as it takes to reach a
+        target signal-to-noise ratio or relative uncertainty. The ADC captures in short blocks, and after each block
+        the running mean of the blocks' lock-in amplitudes and its standard error are updated. Strong signals finish
+        after minTime, and weak ones keep integrating up to maxTime. If neither target is given, it integrates for
+        maxTime.
+
+        The standard error is the larger of the scatter between blocks, and the error the white noise within the
+        blocks (their variance, less that of the signal) would give. The second keeps a chance agreement between the
+        first few blocks from ending the integration early.
+
+        Each block should be long enough for the signal to stand out from the noise within one block, since the
+        amplitude of a block dominated by noise is biased upwards.
+
+        The configured number of measurements is restored afterwards.
+
+        :param frequency: The signal frequency, in Hz
+        :param targetSNR: Stop once the amplitude is at least this many times its standard error
+        :param targetUncertainty: Stop once the standard error is at most this fraction of the amplitude
+        :param blockTime: The length of each capture in seconds, rounded to a whole number of signal periods
+        :param minTime: The shortest time in seconds to integrate for. At least two blocks are always measured.
+        :param maxTime: The longest time in seconds to integrate for
+        :param window: The lock-in window, 'boxcar' or 'hann'
+        :returns: Tuple of (amplitude, standard error of the amplitude, integration time in seconds)
+        """
+        numberPeriods = max(1, round(blockTime * frequency))
+        blockSamples = max(1, int(round(numberPeriods * self.measurementRate / frequency)))
+        blockTime = blockSamples / self.measurementRate
+        minBlocks = max(2, int(np.ceil(minTime / blockTime - 1e-9)))
+        maxBlocks = max(minBlocks, int(maxTime / blockTime + 1e-9))
+
+        # Variance of a block's lock-in amplitude per unit of white noise variance, 2 * sum(w^2) / sum(w)^2
+        windowData, windowPower = getWindow(window, blockSamples) # Raises ValueError for unsupported windows
+        noiseFactor = 2 * windowPower / np.sum(windowData)**2
+
+        previousMeasurements = self.numberMeasurements
+        self.Configure(blockSamples)
+        voltages = np.empty(blockSamples)
+        meanAmplitude = 0.0
+        sumSquares = 0.0 # Sum of squared deviations from the mean, updated with Welford's method
+        sumNoiseVariance = 0.0
+        standardError = np.inf
+        try:
+            for numberBlocks in range(1, maxBlocks + 1):
+                with self.measurePooled() as data:
+                    self.toVoltage(data, out=voltages)
+                amplitude = lockIn(voltages, frequency, self.measurementRate, window=window)[0][0]
+                sumNoiseVariance += noiseFactor * max(0.0, np.var(voltages) - amplitude**2 / 2)
+
+                deviation = amplitude - meanAmplitude
+                meanAmplitude += deviation / numberBlocks
+                sumSquares += deviation * (amplitude - meanAmplitude)
+                if numberBlocks < minBlocks:
+                    continue
+
+                standardError = np.sqrt(max(sumSquares / (numberBlocks - 1), sumNoiseVariance / numberBlocks) /
+                        numberBlocks)
+                if targetSNR is not None and meanAmplitude >= targetSNR * standardError:
+                    break
+                if targetUncertainty is not None and standardError <= targetUncertainty * meanAmplitude:
+                    break
+        finally:
+            if previousMeasurements != blockSamples:
+                self.Configure(previousMeasurements)
+
+        return meanAmplitude, standardError, numberBlocks * blockTime
+
+    def measureFramed(self, samplesPerFrame=4096, retries=3):
+        """
+        Measures data from the ADC like Measure(), but has the device send it in checksummed frames. Frames
+        damaged by dropped or corrupted bytes are detected and requested again individually, so a bad byte does not
+        force the whole capture to be re-acquired. Requires firmware support for MEASURE:FRAMED? and FETCH:FRAME?.
+
+        :param samplesPerFrame: The number of samples in each frame
+        :param retries: The number of times to re-request frames that arrived damaged
+        :returns: Array of 8-bit integers starting with the most significant byte of the first measurement.
+        """
+        frameBytes = samplesPerFrame * 3
+        lengths = frameLengths(self.numberMeasurements * 3, frameBytes)
+        payload = np.empty(self.numberMeasurements * 3, dtype=np.uint8)
+        timeoutOld = self.device.timeout
+
+        try:
+            # Read frame-by-frame with a short timeout once the data starts arriving, so that a transfer that is
+            # missing bytes is noticed after one frame's worth of waiting rather than the whole capture's.
+            frameTimeout = max(0.1, (frameBytes + frameOverhead) * 10 / self.device.baudrate * 2)
+            self.device.timeout = max(timeoutOld, self.numberMeasurements / self.measurementRate * 1.2)
+            self.writeLine(f'MEASURE:FRAMED? {samplesPerFrame}')
+            received = bytearray(self.device.read(1))
+            if len(received) == 0:
+                raise DataError("No data measured from device.")
+
+            self.device.timeout = frameTimeout
+            for length in lengths:
+                frame = self.device.read(length + frameOverhead - (1 if len(received) == 1 else 0))
+                received += frame
+                if len(frame) == 0:
+                    break
+
+            badFrames = set(range(len(lengths))) - parseFrames(received, payload, frameBytes)
+            for attempt in range(retries):
+                if len(badFrames) == 0:
+                    break
+                self.device.reset_input_buffer() # Discard any stray bytes left over from a byte slip
+                for frameIndex in sorted(badFrames):
+                    self.writeLine(f'FETCH:FRAME? {frameIndex}')
+                    frame = self.device.read(lengths[frameIndex] + frameOverhead)
+                    badFrames -= parseFrames(frame, payload, frameBytes) & {frameIndex}
+        finally:
             self.device.timeout = timeoutOld
 
-        return measuredData
+        if len(badFrames) > 0:
+            raise DataError(f"Frames {sorted(badFrames)} were still corrupted after {retries} retries")
+        return payload
+
+    def measureStream(self, blockSize=10000, dtype=np.float64):
+        """
+        Measures data from the ADC based on the number of measurements configured, yielding calibrated voltages in
+        blocks as they come off the serial port instead of waiting for the whole transfer to finish.
+
+        :param blockSize: The number of samples in each yielded block. The final block may be shorter.
+        :param dtype: Output data type, either np.float32 or np.float64
+        :returns: Generator of voltage arrays, in the order they were measured
+        """
+        timeoutOld = self.device.timeout
+        captureTime = self.numberMeasurements / self.measurementRate
+        blockTime = blockSize * 3 * 10 / self.device.baudrate # 10 bits per byte on the wire
+        remainingSamples = self.numberMeasurements
+
+        bytesWritten = self.writeLine('MEASURE?')
+        try:
+            if(captureTime > timeoutOld - 0.1):
+                self.device.timeout = captureTime * 1.2 # Give some wiggle room.
+            header = self.device.read(1)
+            if len(header) == 0:
+                raise DataError(f"No data measured from device. {bytesWritten} bytes successfully written")
+            if header != b'#':
+                raise DataError(f"Data corrupted. Expected # as first character, got {header}")
+
+            self.device.timeout = max(timeoutOld, blockTime * 1.2)
+            while remainingSamples > 0:
+                numberSamples = min(blockSize, remainingSamples)
+                measuredData = self.device.read(numberSamples * 3)
+                if len(measuredData) != numberSamples * 3:
+                    raise DataError(f"Transfer stalled after {self.numberMeasurements - remainingSamples} of " + \
+                            f"{self.numberMeasurements} samples")
+                remainingSamples -= numberSamples
+                yield self.toVoltage(measuredData, dtype=dtype)
+        except GeneratorExit:
+            # The consumer stopped early, so discard the rest of the transfer to keep the link in sync.
+            self.device.read(remainingSamples * 3)
+            raise
+        finally:
+            self.device.timeout = timeoutOld
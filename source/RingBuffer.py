@@ -0,0 +1,101 @@
+import numpy as np
+import threading
+
+class RingBuffer:
+    """
+    Fixed-size, thread-safe first-in first-out buffer backed by a single numpy array. Writing to a full buffer
+    overwrites the oldest entries instead of blocking the writer, and the number of overwritten entries is counted.
+
+    :param capacity: The maximum number of entries held at once
+    :param dtype: The numpy data type of each entry. Structured types can be used to store timestamps alongside values.
+    """
+    def __init__(self, capacity, dtype=np.float64):
+        self.capacity = int(capacity)
+        self.data = np.zeros(self.capacity, dtype=dtype)
+        self.totalWritten = 0 # Total number of entries ever written
+        self.totalRead = 0 # Stream index of the oldest entry still in the buffer
+        self.droppedEntries = 0
+        self.closed = False # Set by the writer when no more entries are coming
+        self.condition = threading.Condition()
+
+    def __len__(self):
+        with self.condition:
+            return self.totalWritten - self.totalRead
+
+    def _copyOut(self, startIndex, numberEntries):
+        """
+        Copies entries out of the buffer by stream index, handling wraparound. Must be called with the lock held.
+        """
+        startPosition = startIndex % self.capacity
+        firstPart = min(numberEntries, self.capacity - startPosition)
+        entries = np.empty(numberEntries, dtype=self.data.dtype)
+        entries[:firstPart] = self.data[startPosition:startPosition + firstPart]
+        entries[firstPart:] = self.data[:numberEntries - firstPart]
+        return entries
+
+    def write(self, entries):
+        """
+        Appends entries to the buffer, overwriting the oldest entries if there is not enough room.
+
+        :param entries: Array of entries to append
+        """
+        entries = np.asarray(entries, dtype=self.data.dtype)
+        with self.condition:
+            if len(entries) > self.capacity:
+                # Only the newest entries can fit, the rest are dropped as if they were overwritten
+                self.totalWritten += len(entries) - self.capacity
+                entries = entries[-self.capacity:]
+            startPosition = self.totalWritten % self.capacity
+            firstPart = min(len(entries), self.capacity - startPosition)
+            self.data[startPosition:startPosition + firstPart] = entries[:firstPart]
+            self.data[:len(entries) - firstPart] = entries[firstPart:]
+            self.totalWritten += len(entries)
+
+            if self.totalWritten - self.totalRead > self.capacity:
+                self.droppedEntries += self.totalWritten - self.totalRead - self.capacity
+                self.totalRead = self.totalWritten - self.capacity
+            self.condition.notify_all()
+
+    def close(self):
+        """
+        Marks the buffer as finished so that readers stop waiting for more entries.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def open(self):
+        """
+        Marks the buffer as active again after close(), so readers wait for new entries.
+        """
+        with self.condition:
+            self.closed = False
+
+    def read(self, numberEntries, timeout=None):
+        """
+        Removes and returns the oldest entries from the buffer, waiting for them to be written if necessary.
+
+        :param numberEntries: The number of entries to read
+        :param timeout: Maximum time to wait in seconds. If it expires or the buffer is closed, fewer entries are
+            returned.
+        :returns: Tuple of the stream index of the first entry and the array of entries
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.closed or self.totalWritten - self.totalRead >= numberEntries,
+                    timeout=timeout)
+            numberEntries = min(numberEntries, self.totalWritten - self.totalRead)
+            startIndex = self.totalRead
+            entries = self._copyOut(startIndex, numberEntries)
+            self.totalRead += numberEntries
+            return startIndex, entries
+
+    def latest(self, numberEntries=1):
+        """
+        Returns the most recently written entries without removing them from the buffer. Never blocks.
+
+        :param numberEntries: The maximum number of entries to return
+        :returns: Array of up to numberEntries entries, oldest first
+        """
+        with self.condition:
+            numberEntries = min(numberEntries, self.totalWritten - self.totalRead)
+            return self._copyOut(self.totalWritten - numberEntries, numberEntries)
@@ -8,6 +8,7 @@ import serial.tools.list_ports as list_ports
 import sys
 import io
 import json
+from contextlib import contextmanager
 from DataAquisition.AD7766.python.source.AD7766_postprocessing import *
 
 class DataError(Exception):
@@ -16,30 +17,133 @@ class DataError(Exception):
 class DeviceNotFoundError(Exception):
 	pass
 
-class SCPIDevice:
-	"""SCPI Device base class which serves as a wrapper for the pyserial or pyvisa interface and implemets
-	basic SCPI functions, such as Identify, Reset, Measure, Fetch, and others."""
+class MotorMove:
+	"""
+	Handle for a motor move that has been started but not waited on, returned by SCPIDevice.rotateMotorAsync().
+
+	The duration of the move is predicted from the motor period and the device's fixed overhead per move (see
+	SCPIDevice.predictMoveTime()). Waiting sleeps until just before the predicted finish and only then starts checking
+	MOTOR:ROTATE?, first every motorFirstPollInterval and backing off to every motorPollInterval, so the motor is
+	left alone while it moves and little time is lost after it stops.
+
+	:param device: The SCPIDevice moving the motor
+	:param steps: The number of steps being taken
+	:param predictedTime: The expected duration of the move in seconds, or None if not yet known
+	"""
+	def __init__(self, device, steps, predictedTime=None):
+		self.device = device
+		self.steps = steps
+		self.startTime = time.perf_counter()
+		self.predictedTime = predictedTime
+		self.finishTime = None
+		self._seenRotating = False # Whether a check found the motor still moving, so the finish time is exact
+
+	@property
+	def deadline(self):
+		"""
+		The time (from time.perf_counter()) at which the move is expected to finish, or None if not known
+		"""
+		if self.predictedTime is None:
+			return None
+		return self.startTime + self.predictedTime
 
-	def __init__(self, baudRate=9600, device_type='usbserial'):
-		serialPortsList = [port.device for port in list_ports.comports()]
-		containsUSBModem = ['usbmodem' in x for x in serialPortsList]
-		containsUSBSerial = ['usbserial' in x for x in serialPortsList]
-		usbModemIndices = [i for i in range(len(serialPortsList)) if containsUSBModem[i] == True]
-		usbSerialIndices = [i for i in range(len(serialPortsList)) if containsUSBSerial[i] == True]
+	def _pollStart(self):
+		if self.predictedTime is None:
+			return self.startTime
+		return self.startTime + self.predictedTime * self.device.motorDeadlineFraction
 
-		if len(usbModemIndices) == 0 and len(usbSerialIndices) == 0:
-			raise Exception("No USB devices found. Check device is plugged in and try again.")
+	def done(self):
+		"""
+		Checks whether the move has finished without blocking. Does not talk to the device before the predicted
+		deadline.
 
-		if device_type == 'usbserial':
-			self.device = serial.Serial(serialPortsList[usbSerialIndices[0]])
-		elif device_type == 'usbmodem':
-			self.device = serial.Serial(serialPortsList[usbModemIndices[0]])
+		:returns: True if the motor has stopped
+		"""
+		if self.finishTime is None and time.perf_counter() >= self._pollStart():
+			if self.device.motorRotating:
+				self._seenRotating = True
+			else:
+				self._finish()
+		return self.finishTime is not None
+
+	def _pollIntervals(self):
+		"""
+		Generates the times to sleep between checks, starting short and doubling up to the device's poll interval.
+		"""
+		interval = self.device.motorFirstPollInterval
+		while True:
+			yield interval
+			interval = min(2 * interval, self.device.motorPollInterval)
+
+	def wait(self, timeout=None):
+		"""
+		Blocks until the move has finished.
+
+		:param timeout: Maximum time in seconds to wait, or None to wait as long as it takes
+		"""
+		endTime = None if timeout is None else time.perf_counter() + timeout
+		sleepTime = self._pollStart() - time.perf_counter()
+		if endTime is not None:
+			sleepTime = min(sleepTime, endTime - time.perf_counter())
+		if sleepTime > 0:
+			time.sleep(sleepTime)
+
+		pollIntervals = self._pollIntervals()
+		while not self.done():
+			if endTime is not None and time.perf_counter() >= endTime:
+				raise TimeoutError(f"Motor still rotating {timeout} s after starting a move of {self.steps} steps")
+			time.sleep(next(pollIntervals))
+
+	def _finish(self):
+		self.finishTime = time.perf_counter()
+		self.device._learnMoveOverhead(self.steps, self.finishTime - self.startTime, exact=self._seenRotating)
 
+class SCPIDevice:
+	"""SCPI Device base class which serves as a wrapper for the pyserial or pyvisa interface and implemets
+	basic SCPI functions, such as Identify, Reset, Measure, Fetch, and others."""
+
+	def __init__(self, baudRate=9600, device_type='usbserial', device=None, deviceID=None):
+		"""
+		:param baudRate: Baud rate of the serial connection
+		:param device_type: Which kind of USB serial port to look for, 'usbserial' or 'usbmodem'
+		:param device: An already-open serial.Serial (or anything with the same interface, such as a TeensyEmulator)
+			to use instead of searching for a port.
+		:param deviceID: The device's identifier string, if it is already known (for example from a DeviceRegistry).
+			Skips querying it again.
+		"""
+		if device is None:
+			serialPortsList = [port.device for port in list_ports.comports()]
+			containsUSBModem = ['usbmodem' in x for x in serialPortsList]
+			containsUSBSerial = ['usbserial' in x for x in serialPortsList]
+			usbModemIndices = [i for i in range(len(serialPortsList)) if containsUSBModem[i] == True]
+			usbSerialIndices = [i for i in range(len(serialPortsList)) if containsUSBSerial[i] == True]
+
+			if len(usbModemIndices) == 0 and len(usbSerialIndices) == 0:
+				raise Exception("No USB devices found. Check device is plugged in and try again.")
+
+			if device_type == 'usbserial':
+				self.device = serial.Serial(serialPortsList[usbSerialIndices[0]])
+			elif device_type == 'usbmodem':
+				self.device = serial.Serial(serialPortsList[usbModemIndices[0]])
+		else:
+			self.device = device
+
+		self.motorStepTime = None # Seconds per motor step. If None, the motor period (in ms per step) is used.
+		self.motorOverhead = 0.0 # Seconds added to every move on top of its steps, learned from completed moves
+		self.motorFirstPollInterval = 0.005
+		self.motorPollInterval = 0.05
+		self.motorDeadlineFraction = 0.95 # Start checking MOTOR:ROTATE? once this fraction of a move should be done
+		self.motorEnableSettleTime = 0.01 # Time for the motor driver to power up after being enabled
+		self.motorMove = None
+		self._motorState = {} # Last known motor enable, direction, period and position. Cleared by Reset().
+		self._pendingCommands = []
+		self._batchDepth = 0
 		self.device.timeout = 3 # MAY NEED TO CHANGE FOR LARGER DATA STREAMS
 		self.device.baudrate = baudRate
 		self.Reset()
-		time.sleep(1) # Wait for arduino/Teensy initialization
-		self.deviceID = self.Identify()
+		if device is None:
+			time.sleep(1) # Wait for arduino/Teensy initialization, which happens when the port is opened
+		self.deviceID = deviceID if deviceID is not None else self.Identify()
 		print(f'Found Device with name: {self.deviceID}')
 
 	def inWaiting(self):
@@ -55,8 +159,37 @@ class SCPIDevice:
 		:param stringToWrite: The variable arguments are used for
 		:returns: Number of bytes written
 		"""
+		if self._pendingCommands:
+			stringToWrite = ';'.join(self._pendingCommands + [stringToWrite])
+			self._pendingCommands = []
 		return self.device.write(bytes(stringToWrite + '\n', 'ascii'))
 
+	def _setCommand(self, command):
+		"""
+		Sends a command that does not return anything. Inside a batch() block it is held back and sent along with
+		the others in one write.
+		"""
+		if self._batchDepth > 0:
+			self._pendingCommands.append(command)
+		else:
+			self.writeLine(command)
+
+	@contextmanager
+	def batch(self):
+		"""
+		Context manager that joins the set commands sent inside it into a single ';'-separated write, sent when the
+		block ends (or earlier, along with any query made inside the block).
+		"""
+		self._batchDepth += 1
+		try:
+			yield self
+		finally:
+			self._batchDepth -= 1
+			if self._batchDepth == 0 and self._pendingCommands:
+				command = ';'.join(self._pendingCommands)
+				self._pendingCommands = []
+				self.writeLine(command)
+
 	def readLine(self):
 		"""
 		Wrapper function that writes a set of bytes ending in a newline character.
@@ -79,6 +212,8 @@ class SCPIDevice:
 		"""
 		self.numberMeasurements = 1
 		self.numberBytes = self.numberMeasurements * 3 + 1
+		self._motorState = {}
+		self._pendingCommands = []
 		self.writeLine('*RST')
 		# For some reason, there may be extra bytes held by the OS that we only have access to after we
 		# read the entirety of the current buffer, so for a real reset we need to read all of these.
@@ -102,7 +237,8 @@ class SCPIDevice:
 
 		:param motorPosition: Integer value of number of steps motor has taken
 		"""
-		self.writeLine('MOTOR:POSITION ' + str(motorPosition))
+		self._setCommand('MOTOR:POSITION ' + str(motorPosition))
+		self._motorState['position'] = int(motorPosition)
 
 	def getMotorPosition(self):
 		"""
@@ -110,8 +246,13 @@ class SCPIDevice:
 
 		:returns motorPosition: Integer value of number of steps motor has taken
 		"""
+		motorMoving = self.motorMove is not None and self.motorMove.finishTime is None
+		if 'position' in self._motorState and not motorMoving:
+			return self._motorState['position']
 		self.writeLine('MOTOR:POSITION?')
 		position = int(self.readLine())
+		if not motorMoving:
+			self._motorState['position'] = position
 		return position
 
 	motorPosition = property(getMotorPosition, setMotorPosition)
@@ -122,7 +263,10 @@ class SCPIDevice:
 
 		:param motorDirection: A boolean or 0/1 valued integer with the direction of the motor
 		"""
-		self.writeLine('MOTOR:DIRECTION ' + str(int(bool(motorDirection))))
+		motorDirection = int(bool(motorDirection))
+		if self._motorState.get('direction') != motorDirection:
+			self._setCommand('MOTOR:DIRECTION ' + str(motorDirection))
+			self._motorState['direction'] = motorDirection
 
 	def getMotorDirection(self):
 		"""
@@ -130,9 +274,10 @@ class SCPIDevice:
 
 		:returns motorDirection: The direction of the motor, either 0 (clockwise) or 1 (counterclockwise)
 		"""
-		self.writeLine('MOTOR:DIRECTION?')
-		direction = int(self.readLine())
-		return direction
+		if 'direction' not in self._motorState:
+			self.writeLine('MOTOR:DIRECTION?')
+			self._motorState['direction'] = int(self.readLine())
+		return self._motorState['direction']
 
 	def getMotorRotating(self):
 		"""
@@ -147,48 +292,107 @@ class SCPIDevice:
 	motorRotating = property(getMotorRotating)
 	motorDirection = property(getMotorDirection, setMotorDirection)
 
-	def waitForMotor(self):
-		time.sleep(0.05)
-		while(self.motorRotating == True):
-			time.sleep(0.05)
+	def waitForMotor(self, timeout=None):
+		"""
+		Blocks until the motor has stopped rotating.
 
-	def rotateMotor(self, rotationSteps):
+		:param timeout: Maximum time in seconds to wait, or None to wait as long as it takes
 		"""
-		Rotates the stepper motor by some integer number of steps.
+		if self.motorMove is not None:
+			self.motorMove.wait(timeout=timeout)
+		else:
+			MotorMove(self, 0).wait(timeout=timeout)
+
+	def predictMoveTime(self, steps):
+		"""
+		Predicts how long a move will take: the fixed overhead of a move (communication and starting the motor)
+		plus the time per step, which is motorStepTime if set and the motor period otherwise.
+
+		:param steps: The number of steps in the move
+		:returns: The predicted duration in seconds
+		"""
+		stepTime = self.motorStepTime if self.motorStepTime is not None else self.motorPeriod * 1e-3
+		return self.motorOverhead + abs(steps) * stepTime
+
+	def _learnMoveOverhead(self, steps, elapsedTime, exact=True):
+		"""
+		Updates the estimate of the fixed overhead of a move from a completed one. The time per step is known, so
+		what is left over after the steps is overhead. If the motor had already stopped at the first check, the
+		elapsed time is only an upper bound, so it can only lower the estimate.
+		"""
+		if self.motorStepTime is None and 'period' not in self._motorState:
+			return
+		stepTime = self.motorStepTime if self.motorStepTime is not None else self.motorPeriod * 1e-3
+		overhead = max(0.0, elapsedTime - abs(steps) * stepTime)
+		if exact:
+			self.motorOverhead = 0.5 * (self.motorOverhead + overhead)
+		else:
+			self.motorOverhead = min(self.motorOverhead, overhead)
+
+	def rotateMotorAsync(self, rotationSteps):
+		"""
+		Starts rotating the stepper motor by some integer number of steps and returns without waiting for it to
+		finish, so that other work can overlap the move.
 
 		:param rotationSteps: The number of stepper motor steps to take. Positive = clockwise, negative = counterclockwise.
+		:returns: MotorMove handle to wait on
 		"""
-		if self.motorEnable == False:
+		predictedTime = self.predictMoveTime(rotationSteps) # Reads the motor period the first time
+		startPosition = self._motorState.get('position')
+		if self._motorState.get('enable') != True:
+			# Give the driver time to power up before the first step. Once it is known to be on, the direction and
+			# the move go out in a single write.
 			self.motorEnable = True
-			time.sleep(0.01)
-		if(rotationSteps < 0):
-			self.motorDirection = 1
-		else:
-			self.motorDirection = 0
+			time.sleep(self.motorEnableSettleTime)
+		with self.batch():
+			if(rotationSteps < 0):
+				self.motorDirection = 1
+			else:
+				self.motorDirection = 0
+			self._setCommand('MOTOR:ROTATE ' + str(rotationSteps))
+
+		self._motorState.pop('position', None)
+		if startPosition is not None and (self.motorMove is None or self.motorMove.finishTime is not None):
+			self._motorState['position'] = startPosition + rotationSteps
+		self.motorMove = MotorMove(self, rotationSteps, predictedTime)
+		return self.motorMove
 
-		self.writeLine('MOTOR:ROTATE ' + str(rotationSteps))
-		self.waitForMotor() # Not having this here was causing endless headaches. Better to just make this a blocking event.
+	def rotateMotor(self, rotationSteps):
+		"""
+		Rotates the stepper motor by some integer number of steps.
+
+		:param rotationSteps: The number of stepper motor steps to take. Positive = clockwise, negative = counterclockwise.
+		"""
+		# Not waiting here was causing endless headaches. Better to just make this a blocking event.
+		self.rotateMotorAsync(rotationSteps).wait()
 
 	def setMotorEnable(self, motorEnable):
+		if self._motorState.get('enable') == bool(motorEnable):
+			return
 		if motorEnable == True:
-			self.writeLine('MOTOR:ENABLE')
+			self._setCommand('MOTOR:ENABLE')
 		elif motorEnable == False:
-			self.writeLine('MOTOR:DISABLE')
+			self._setCommand('MOTOR:DISABLE')
+		self._motorState['enable'] = bool(motorEnable)
 
 	def getMotorEnable(self):
-		self.writeLine('MOTOR:ENABLED?')
-		enabled = bool(int(self.readLine()))
-		return enabled
+		if 'enable' not in self._motorState:
+			self.writeLine('MOTOR:ENABLED?')
+			self._motorState['enable'] = bool(int(self.readLine()))
+		return self._motorState['enable']
 
 	motorEnable = property(getMotorEnable, setMotorEnable)
 
 	def setMotorPeriod(self, motorPeriod):
-		self.writeLine('MOTOR:PERIOD ' + str(int(motorPeriod)))
+		if self._motorState.get('period') != int(motorPeriod):
+			self._setCommand('MOTOR:PERIOD ' + str(int(motorPeriod)))
+			self._motorState['period'] = int(motorPeriod)
 
 	def getMotorPeriod(self):
-		self.writeLine('MOTOR:PERIOD?')
-		motorPeriod = int(self.readLine())
-		return motorPeriod
+		if 'period' not in self._motorState:
+			self.writeLine('MOTOR:PERIOD?')
+			self._motorState['period'] = int(self.readLine())
+		return self._motorState['period']
 
 	motorPeriod = property(getMotorPeriod, setMotorPeriod)
 
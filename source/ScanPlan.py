@@ -0,0 +1,137 @@
+import numpy as np
+
+class ScanPlan:
+    """
+    Precomputed motor moves for a wavelength scan, in the order they will be made. Create one with planScan() or
+    MCP3561.planScan().
+
+    :param startWavelength: The wavelength the scan starts from
+    :param wavelengths: The target wavelength of each point, in the order visited
+    :param order: For each point, the index of its wavelength in the list the plan was made from
+    :param sweepNumbers: For each point, which repeat of the sweep it belongs to
+    :param steps: The number of motor steps taken to reach each point from the one before
+    :param achievedWavelengths: The wavelength the monochromator actually ends up at for each point, which differs
+        from the target by the rounding to whole steps
+    """
+    def __init__(self, startWavelength, wavelengths, order, sweepNumbers, steps, achievedWavelengths):
+        self.startWavelength = startWavelength
+        self.wavelengths = wavelengths
+        self.order = order
+        self.sweepNumbers = sweepNumbers
+        self.steps = steps
+        self.achievedWavelengths = achievedWavelengths
+
+    def __len__(self):
+        return len(self.wavelengths)
+
+    def __iter__(self):
+        return iter(self.wavelengths)
+
+    @property
+    def totalSteps(self):
+        """
+        The total motor travel of the scan, in steps
+        """
+        return int(np.sum(np.abs(self.steps)))
+
+    def inOriginalOrder(self, results):
+        """
+        Rearranges one result per point, in the order measured, back into the order of the original wavelengths.
+
+        :param results: Sequence of results, one for each point of the plan in order
+        :returns: Array of shape (number of sweeps, number of wavelengths)
+        """
+        results = np.asarray(results)
+        numberSweeps = int(self.sweepNumbers[-1]) + 1 if len(self) > 0 else 0
+        rearranged = np.empty((numberSweeps, len(self) // max(numberSweeps, 1)) + results.shape[1:],
+                dtype=results.dtype)
+        rearranged[self.sweepNumbers, self.order] = results
+        return rearranged
+
+"""
+Gets the number of motor steps needed to change the wavelength by some amount, including the nonlinear correction
+to the monochromator calibration.
+
+:param nm: The change in wavelength, in nm. Can be an array.
+:param microstepsPerNanometer: The linear calibration of the monochromator
+:param microstepsCorrection: The quadratic correction to the calibration
+:returns: The number of steps, rounded to whole steps
+"""
+def wavelengthSteps(nm, microstepsPerNanometer, microstepsCorrection):
+    return np.round((microstepsPerNanometer * nm) * (1 + microstepsCorrection * nm)).astype(np.int64)
+
+"""
+Plans a wavelength scan that visits each wavelength in as little motor travel as possible.
+
+Within each sweep the wavelengths are visited in sorted order, starting from whichever end is nearer the
+current wavelength. Repeated sweeps run back and forth (serpentine) rather than returning to the start each time.
+Each move is computed from the wavelength actually reached by the previous one, so the rounding of each move to
+whole steps does not accumulate over the scan.
+
+:param wavelengths: The wavelengths to measure at, in any order
+:param startWavelength: The current wavelength of the monochromator
+:param microstepsPerNanometer: The linear calibration of the monochromator
+:param microstepsCorrection: The quadratic correction to the calibration
+:param repeats: The number of times to sweep over the wavelengths
+:param serpentine: Reverse direction on alternate sweeps. If False, every sweep goes in the same direction.
+:returns: ScanPlan
+"""
+def planScan(wavelengths, startWavelength, microstepsPerNanometer, microstepsCorrection, repeats=1,
+        serpentine=True):
+    wavelengths = np.asarray(wavelengths, dtype=np.float64)
+    sortedOrder = np.argsort(wavelengths, kind='stable')
+    if len(wavelengths) > 0 and \
+            abs(wavelengths[sortedOrder[-1]] - startWavelength) < abs(wavelengths[sortedOrder[0]] - startWavelength):
+        sortedOrder = sortedOrder[::-1]
+
+    sweeps = [sortedOrder[::-1] if serpentine and sweep % 2 == 1 else sortedOrder for sweep in range(repeats)]
+    order = np.concatenate(sweeps) if repeats > 0 else np.zeros(0, dtype=np.int64)
+    sweepNumbers = np.repeat(np.arange(repeats), len(wavelengths))
+    targets = wavelengths[order]
+
+    steps = np.zeros(len(targets), dtype=np.int64)
+    achievedWavelengths = np.zeros(len(targets))
+    currentWavelength = startWavelength
+    for i, target in enumerate(targets):
+        steps[i] = wavelengthSteps(target - currentWavelength, microstepsPerNanometer, microstepsCorrection)
+        currentWavelength += steps[i] / microstepsPerNanometer
+        achievedWavelengths[i] = currentWavelength
+
+    return ScanPlan(startWavelength, targets, order, sweepNumbers, steps, achievedWavelengths)
+
+"""
+Chooses where to add points to a sampled spectrum so that linear interpolation between its points follows the
+spectrum to within a tolerance.
+
+The error of linear interpolation over an interval of width h is about |f''| h^2 / 8. The second derivative f'' is
+estimated from the second divided differences of the groups of three points on either side of each interval, and the
+larger of the two is used, so a feature is refined from both sides. Each interval whose estimated error is more than
+the tolerance gets a new point in the middle, unless that would make it narrower than minStep. Features narrower than
+the spacing of the points cannot be seen, so the initial points should be close enough to resolve every feature.
+
+:param wavelengths: The wavelengths measured so far, in any order
+:param values: The measured value at each wavelength
+:param tolerance: The largest acceptable interpolation error, in the units of values
+:param minStep: The narrowest interval that can be made by adding a point, in nm
+:param maxPoints: The most points to add. The intervals with the largest errors are refined first.
+:returns: Array of the wavelengths to add, sorted
+"""
+def refinementPoints(wavelengths, values, tolerance, minStep=0.0, maxPoints=None):
+    wavelengths = np.asarray(wavelengths, dtype=np.float64)
+    sortedOrder = np.argsort(wavelengths, kind='stable')
+    wavelengths = wavelengths[sortedOrder]
+    values = np.asarray(values, dtype=np.float64)[sortedOrder]
+    if len(wavelengths) < 3:
+        return np.zeros(0)
+
+    intervals = np.diff(wavelengths)
+    secondDerivatives = np.abs(2 * np.diff(np.diff(values) / intervals) / (intervals[:-1] + intervals[1:]))
+    curvatures = np.zeros(len(intervals))
+    curvatures[:-1] = secondDerivatives
+    curvatures[1:] = np.maximum(curvatures[1:], secondDerivatives)
+    errors = curvatures * np.square(intervals) / 8
+
+    refined = np.nonzero((errors > tolerance) & (intervals / 2 >= minStep))[0]
+    if maxPoints is not None:
+        refined = refined[np.argsort(errors[refined], kind='stable')[::-1][:max(0, maxPoints)]]
+    return np.sort(wavelengths[refined] + intervals[refined] / 2)
@@ -0,0 +1,158 @@
+from .AD7766_postprocessing import twosToVoltage
+from .lock_in import lockIn, squareWaveAmplitude
+from .ScanPlan import ScanPlan, refinementPoints
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from collections import deque
+import numpy as np
+import time
+
+def fourierAmplitude(measuredData, signalBin, gain=1.0):
+    """
+    Finds the amplitude of one frequency bin of a raw capture, the same way the sweep scripts do.
+
+    :param measuredData: Array of 8-bit integers returned by Measure()
+    :param signalBin: The index of the frequency bin containing the signal
+    :param gain: Calibration gain to apply to the voltages
+    :returns: The sinusoidal amplitude (in volts) of the signal bin
+    """
+    voltages = twosToVoltage(measuredData, gain=gain)
+    voltagePowerSpectrum = np.square(np.abs(np.fft.rfft(voltages/len(voltages))))
+    # Multiply by 2 to convert to single-sided spectrum, and by 2 again to convert from RMS power into amplitude
+    return np.sqrt(voltagePowerSpectrum[signalBin] * 4)
+
+def lockInAmplitude(measuredData, frequency, samplingFrequency, gain=1.0):
+    """
+    Finds the amplitude of a sinusoidal signal in a raw capture with a single-frequency lock-in.
+
+    :param measuredData: Array of 8-bit integers returned by Measure()
+    :param frequency: The signal frequency, in the same units as samplingFrequency
+    :param samplingFrequency: The sampling frequency of the measurement
+    :param gain: Calibration gain to apply to the voltages
+    :returns: The sinusoidal amplitude (in volts) of the signal
+    """
+    amplitudes, phases = lockIn(twosToVoltage(measuredData, gain=gain), frequency, samplingFrequency)
+    return amplitudes[0]
+
+def squareWaveLockIn(measuredData, frequency, samplingFrequency, numberHarmonics=3, gain=1.0):
+    """
+    Finds the pk-pk amplitude of a square wave signal, such as chopped light, in a raw capture.
+
+    :param measuredData: Array of 8-bit integers returned by Measure()
+    :param frequency: The square wave frequency, in the same units as samplingFrequency
+    :param samplingFrequency: The sampling frequency of the measurement
+    :param numberHarmonics: The number of odd harmonics to fit
+    :param gain: Calibration gain to apply to the voltages
+    :returns: The pk-pk amplitude (in volts) of the square wave
+    """
+    return squareWaveAmplitude(twosToVoltage(measuredData, gain=gain), frequency, samplingFrequency,
+            numberHarmonics=numberHarmonics)
+
+class SweepPipeline:
+    """
+    Runs a wavelength sweep on an MCP3561, handing each finished capture to a worker for decoding and analysis
+    while the motor moves on to the next wavelength. Analysis time is then hidden behind motor motion instead of
+    adding to it at every point.
+
+    :param device: The MCP3561 to sweep with. It should already be configured for the number of samples to measure.
+    :param analysis: Function taking the raw data from Measure() and returning the result for that wavelength.
+        It must be picklable (a module-level function or functools.partial of one) if useProcesses is True.
+    :param useProcesses: Run the analysis in a separate process instead of a thread. Only worth it for analyses
+        that spend most of their time in Python rather than numpy.
+    :param maxPending: The number of captures allowed to wait for analysis at once. The default of 2 double-buffers
+        the sweep, and the sweep pauses if the analysis falls further behind than this.
+    :param settleTime: Time in seconds to wait after the motor stops before measuring
+    """
+    def __init__(self, device, analysis, useProcesses=False, maxPending=2, settleTime=0.0):
+        self.device = device
+        self.analysis = analysis
+        self.useProcesses = useProcesses
+        self.maxPending = maxPending
+        self.settleTime = settleTime
+
+    def _positions(self, wavelengths):
+        """
+        Moves to each wavelength in turn, yielding once the motor has stopped there.
+        """
+        if isinstance(wavelengths, ScanPlan):
+            for index, wavelength in self.device.scan(wavelengths):
+                yield wavelength
+        else:
+            for wavelength in wavelengths:
+                self.device.wavelength = wavelength
+                yield wavelength
+
+    def sweep(self, wavelengths):
+        """
+        Measures at each wavelength in turn, yielding results in wavelength order as they become available.
+
+        :param wavelengths: The wavelengths to measure at, in the order to visit them, or a ScanPlan from
+            MCP3561.planScan()
+        :returns: Generator of (wavelength, result) tuples
+        """
+        executorType = ProcessPoolExecutor if self.useProcesses else ThreadPoolExecutor
+        pending = deque()
+        with executorType(max_workers=1) as executor:
+            for wavelength in self._positions(wavelengths):
+                self.device.motorEnable = False # Turn off the motor while measuring to reduce noise
+                if self.settleTime > 0:
+                    time.sleep(self.settleTime)
+                measuredData = self.device.Measure()
+
+                pending.append((wavelength, executor.submit(self.analysis, measuredData)))
+                while len(pending) > self.maxPending or (pending and pending[0][1].done()):
+                    finishedWavelength, future = pending.popleft()
+                    yield finishedWavelength, future.result()
+
+            while pending:
+                finishedWavelength, future = pending.popleft()
+                yield finishedWavelength, future.result()
+
+    def run(self, wavelengths):
+        """
+        Measures at each wavelength and waits for all of the analysis to finish.
+
+        :param wavelengths: The wavelengths to measure at, in the order to visit them, or a ScanPlan
+        :returns: List of the results for each wavelength, in the same order as wavelengths
+        """
+        return [result for wavelength, result in self.sweep(wavelengths)]
+
+    def runAdaptive(self, startWavelength, stopWavelength, coarseStep, tolerance, minStep=None, maxPoints=None,
+            maxRounds=8):
+        """
+        Measures a spectrum on a coarse grid, then adds points only where it curves too sharply for linear
+        interpolation between the points measured so far to follow it to within a tolerance (see
+        refinementPoints()). Flat parts of the spectrum are left at the coarse spacing.
+
+        The points added in each round are measured in a single planned scan in wavelength order, starting from the
+        end nearer the monochromator, so the motor crosses the range at most once per round.
+
+        The analysis must return a single number for each wavelength.
+
+        :param startWavelength: The first wavelength of the coarse grid, in nm
+        :param stopWavelength: The last wavelength of the coarse grid, in nm
+        :param coarseStep: The spacing of the coarse grid, in nm. It must be fine enough to see every feature.
+        :param tolerance: The largest acceptable interpolation error, in the units of the analysis results
+        :param minStep: The closest spacing of points, in nm. Defaults to a sixteenth of coarseStep.
+        :param maxPoints: The most points to measure in total, including the coarse grid
+        :param maxRounds: The most rounds of refinement
+        :returns: Tuple of (wavelengths, results), sorted by wavelength
+        """
+        if minStep is None:
+            minStep = coarseStep / 16
+        newWavelengths = np.arange(startWavelength, stopWavelength + coarseStep / 2, coarseStep)
+        if maxPoints is not None:
+            newWavelengths = newWavelengths[:maxPoints]
+        wavelengths = np.zeros(0)
+        results = np.zeros(0)
+
+        for refinement in range(maxRounds + 1):
+            if len(newWavelengths) == 0:
+                break
+            plan = self.device.planScan(newWavelengths)
+            wavelengths = np.concatenate((wavelengths, newWavelengths))
+            results = np.concatenate((results, plan.inOriginalOrder(self.run(plan))[0]))
+            newWavelengths = refinementPoints(wavelengths, results, tolerance, minStep=minStep,
+                    maxPoints=None if maxPoints is None else maxPoints - len(wavelengths))
+
+        sortedOrder = np.argsort(wavelengths, kind='stable')
+        return wavelengths[sortedOrder], results[sortedOrder]
@@ -4,8 +4,8 @@ import json
 import numpy as np
 
 class TEController(SCPIDevice):
-	def __init__(self, baudRate=115200, sampling_frequency=9.76*1e3):
-		SCPIDevice.__init__(self, baudRate=baudRate, device_type='usbserial')
+	def __init__(self, baudRate=115200, sampling_frequency=9.76*1e3, device=None, deviceID=None):
+		SCPIDevice.__init__(self, baudRate=baudRate, device_type='usbserial', device=device, deviceID=deviceID)
 		self.remote_enabled = False
 
 	def remoteEnable(self):
@@ -22,7 +22,7 @@ class TEController(SCPIDevice):
 		self.writeLine("FETCH?")
 		data = self.readLine()
 		temp = None
-		if data[0] == '#' and data[-1] == '$':
+		if len(data) > 1 and data[0] == '#' and data[-1] == '$':
 			temp = float(data[1:-1])
 		return temp
 
@@ -0,0 +1,174 @@
+from .RingBuffer import RingBuffer
+import numpy as np
+import threading
+import time
+
+class TemperatureLogger:
+    """
+    Polls a TEController from a background thread at a fixed rate and keeps the readings, with their timestamps,
+    in a ring buffer. The acquisition loop can then look up the temperature without a serial round trip, and wait
+    for the temperature to settle for exactly as long as it takes.
+
+    While the logger is running it owns the controller's serial port, so send any other commands through it
+    (setTemperature()) or while holding its lock.
+
+        with TemperatureLogger(controller, sampleRate=5) as logger:
+            logger.setTemperature(30)
+            logger.waitUntilStable(30, tolerance=0.05, holdTime=10)
+            timestamp, temperature = logger.latest()
+
+    :param controller: The TEController to poll
+    :param sampleRate: Readings per second
+    :param capacity: The number of readings kept before the oldest are overwritten
+    """
+    dtype = np.dtype([('time', np.float64), ('temperature', np.float64)])
+
+    def __init__(self, controller, sampleRate=10, capacity=36000):
+        self.controller = controller
+        self.sampleRate = sampleRate
+        self.buffer = RingBuffer(capacity, dtype=self.dtype)
+        self.lock = threading.Lock()
+        self.malformedReadings = 0 # Replies that Fetch() could not parse
+        self.error = None
+        self._stopEvent = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """
+        Starts polling in the background.
+        """
+        if self.running:
+            return
+        self._stopEvent.clear()
+        self.buffer.open()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops polling. Readings already taken are kept.
+        """
+        self._stopEvent.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        period = 1 / self.sampleRate
+        nextTime = time.perf_counter()
+        try:
+            while not self._stopEvent.is_set():
+                with self.lock:
+                    temperature = self.controller.Fetch()
+                if temperature is None:
+                    self.malformedReadings += 1
+                else:
+                    self.buffer.write(np.array([(time.time(), temperature)], dtype=self.dtype))
+
+                # Schedule from the previous deadline rather than from now, so the rate does not drift
+                nextTime = max(nextTime + period, time.perf_counter())
+                self._stopEvent.wait(nextTime - time.perf_counter())
+        except Exception as error:
+            self.error = error
+        finally:
+            self.buffer.close()
+
+    def setTemperature(self, temperature):
+        """
+        Changes the controller's setpoint without interrupting the logging.
+
+        :param temperature: The new setpoint, in C
+        """
+        with self.lock:
+            self.controller.setTemperature(temperature)
+
+    def latest(self):
+        """
+        Gets the most recent reading. Never blocks.
+
+        :returns: Tuple of (time.time() timestamp, temperature), or None if there are no readings yet
+        """
+        entries = self.buffer.latest(1)
+        if len(entries) == 0:
+            return None
+        return float(entries['time'][0]), float(entries['temperature'][0])
+
+    def window(self, duration):
+        """
+        Gets the readings taken in the last few seconds.
+
+        :param duration: The length of the window, in seconds
+        :returns: Structured array with 'time' and 'temperature' fields, oldest first
+        """
+        numberEntries = min(self.buffer.capacity, int(np.ceil(duration * self.sampleRate)) + 2)
+        entries = self.buffer.latest(numberEntries)
+        return entries[entries['time'] >= time.time() - duration]
+
+    def statistics(self, duration):
+        """
+        Summarizes the readings taken in the last few seconds.
+
+        :param duration: The length of the window, in seconds
+        :returns: Dictionary of the number of readings and the mean, standard deviation, minimum and maximum
+            temperature, and the drift (from a straight-line fit) in C/s
+        """
+        entries = self.window(duration)
+        temperatures = entries['temperature']
+        if len(entries) == 0:
+            return {'count': 0, 'mean': np.nan, 'std': np.nan, 'min': np.nan, 'max': np.nan, 'drift': np.nan}
+        drift = np.polyfit(entries['time'] - entries['time'][0], temperatures, 1)[0] if len(entries) > 1 else 0.0
+        return {'count': len(entries), 'mean': np.mean(temperatures), 'std': np.std(temperatures),
+                'min': np.min(temperatures), 'max': np.max(temperatures), 'drift': drift}
+
+    def waitUntilStable(self, setpoint, tolerance, holdTime, timeout=None):
+        """
+        Waits until the temperature has stayed within a tolerance of the setpoint for a hold time, checking each
+        reading as it arrives.
+
+        :param setpoint: The target temperature, in C
+        :param tolerance: The largest allowed difference from the setpoint, in C
+        :param holdTime: How long (in seconds) every reading must have been in tolerance
+        :param timeout: Maximum time in seconds to wait, or None to wait as long as it takes
+        :returns: The time.time() timestamp of the reading at which the temperature was judged stable
+        """
+        if not self.running:
+            raise RuntimeError("The logger must be running to wait for the temperature to settle")
+        endTime = None if timeout is None else time.perf_counter() + timeout
+        stableSince = None
+        lastSeen = self.buffer.totalWritten
+
+        while True:
+            with self.buffer.condition:
+                remaining = None if endTime is None else max(0.0, endTime - time.perf_counter())
+                self.buffer.condition.wait_for(lambda: self.buffer.totalWritten > lastSeen or self.buffer.closed,
+                        timeout=remaining)
+                newEntries = min(self.buffer.totalWritten - lastSeen, self.buffer.capacity)
+                lastSeen = self.buffer.totalWritten
+                entries = self.buffer.latest(newEntries)
+
+            for timestamp, temperature in entries:
+                if abs(temperature - setpoint) > tolerance:
+                    stableSince = None
+                elif stableSince is None:
+                    stableSince = timestamp
+                if stableSince is not None and timestamp - stableSince >= holdTime:
+                    return float(timestamp)
+
+            if self.error is not None:
+                raise self.error
+            if not self.running:
+                raise RuntimeError("The logger stopped before the temperature settled")
+            if endTime is not None and time.perf_counter() >= endTime:
+                raise TimeoutError(f"Temperature did not settle within {tolerance} C of {setpoint} C " + \
+                        f"for {holdTime} s within {timeout} s")
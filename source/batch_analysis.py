@@ -0,0 +1,104 @@
+from .AD7766_postprocessing import twosToVoltage
+from .lock_in import lockIn
+from .spectral_density import noiseDensity
+import numpy as np
+
+"""
+Analysis of many captures at once. Captures of the same size are stacked into a 2-D array (captures x bytes), decoded
+into a (captures x samples) array of voltages, and transformed along the sample axis, so the per-capture work is done
+by numpy rather than by a Python loop. Large stacks (such as a memory-mapped recording) are processed a chunk of
+captures at a time, so memory use does not grow with the number of captures.
+"""
+
+"""
+Finds the amplitude of one or more frequency bins of every capture in a stack, the same way fourierAmplitude() does
+for a single capture.
+
+:param voltages: Array of measured voltages. A 2-D array is treated as a stack of captures, one per row.
+:param bins: The index, or list of indices, of the frequency bins to extract
+:returns: The sinusoidal amplitudes of the bins, with one row per capture for 2-D input
+"""
+def binAmplitudes(voltages, bins):
+    voltages = np.asarray(voltages)
+    spectrum = np.fft.rfft(voltages, axis=-1)[..., bins]
+    # Multiply by 2 to convert to single-sided spectrum, and by 2 again to convert from RMS power into amplitude
+    return 2 * np.abs(spectrum) / voltages.shape[-1]
+
+"""
+Gets the names of the columns analyzeCaptures() fills in for a set of analysis options.
+
+:returns: List of column names, in order
+"""
+def analysisColumns(frequency=None, signalBins=(), noiseBand=None):
+    columns = ['mean']
+    if frequency is not None:
+        columns += ['amplitude', 'phase']
+    columns += [f'bin{signalBin}' for signalBin in signalBins]
+    if noiseBand is not None:
+        columns += ['noiseRMS', 'noiseDensity']
+    return columns
+
+"""
+Decodes and analyzes a stack of raw captures, writing one value per capture into each of a set of columns.
+
+The columns are always 'mean' (the DC voltage), plus 'amplitude' and 'phase' of the lock-in at frequency if one is
+given, 'bin<k>' for the amplitude of each bin k in signalBins, and 'noiseRMS' and 'noiseDensity' over noiseBand if
+one is given.
+
+    recording = CaptureReader('lamp_fluctuations')
+    results = analyzeCaptures(recording.stack(), 125e3, signalBins=[1000], noiseBand=(200, 62.5e3))
+    pd.DataFrame(results).to_csv('lamp_fluctuations.csv', index=False)
+
+:param captures: 2-D array of raw 8-bit values, with one capture (as returned by Measure()) per row
+:param samplingFrequency: The sampling frequency of the captures, in Hz
+:param frequency: The frequency of the lock-in, in Hz
+:param signalBins: Indices of the FFT bins to extract amplitudes of
+:param noiseBand: Tuple of the (lower, upper) edges of the band to integrate the noise over, in Hz
+:param window: The window of the lock-in, 'boxcar' or 'hann'
+:param noiseWindow: The window of the noise spectrum, 'hann' or 'boxcar'
+:param chunkSize: The number of captures decoded and analyzed at a time
+:param gain: Calibration gain applied to the voltages
+:param offset: Calibration offset (in volts) added to the voltages
+:param maxVoltage: The full-scale voltage of the ADC
+:param dtype: The data type the voltages are decoded to, either np.float32 or np.float64
+:param out: Optional dictionary of preallocated columns to write into, with one entry per capture in each
+:returns: Dictionary of columns, each an array with one entry per capture
+"""
+def analyzeCaptures(captures, samplingFrequency, frequency=None, signalBins=(), noiseBand=None, window='boxcar',
+        noiseWindow='hann', chunkSize=16, gain=1.0, offset=0.0, maxVoltage=3.3, dtype=np.float64, out=None):
+    captures = np.asarray(captures)
+    if captures.ndim != 2:
+        raise ValueError(f"captures must be a 2-D array with one capture per row, not {captures.ndim}-D")
+    numberCaptures, numberBytes = captures.shape
+    if numberBytes % 3 != 0:
+        raise ValueError(f"Capture length {numberBytes} is not a whole number of 3-byte samples")
+    signalBins = list(signalBins)
+
+    columns = analysisColumns(frequency, signalBins, noiseBand)
+    if out is None:
+        out = {column: np.empty(numberCaptures) for column in columns}
+    for column in columns:
+        if out[column].shape != (numberCaptures,):
+            raise ValueError(f"Column {column} must have shape ({numberCaptures},), not {out[column].shape}")
+
+    voltageBuffer = np.empty((min(chunkSize, numberCaptures), numberBytes // 3), dtype=dtype)
+    for startIndex in range(0, numberCaptures, chunkSize):
+        stopIndex = min(startIndex + chunkSize, numberCaptures)
+        rows = slice(startIndex, stopIndex)
+        voltages = twosToVoltage(captures[rows], maxVoltage=maxVoltage, out=voltageBuffer[:stopIndex - startIndex],
+                offset=offset, gain=gain)
+
+        out['mean'][rows] = np.mean(voltages, axis=1)
+        if frequency is not None:
+            amplitudes, phases = lockIn(voltages, frequency, samplingFrequency, window=window)
+            out['amplitude'][rows] = amplitudes[:, 0]
+            out['phase'][rows] = phases[:, 0]
+        if signalBins:
+            amplitudes = binAmplitudes(voltages, signalBins)
+            for i, signalBin in enumerate(signalBins):
+                out[f'bin{signalBin}'][rows] = amplitudes[:, i]
+        if noiseBand is not None:
+            out['noiseRMS'][rows], out['noiseDensity'][rows] = noiseDensity(voltages, samplingFrequency, *noiseBand,
+                    window=noiseWindow)
+
+    return out
@@ -0,0 +1,82 @@
+import numpy as np
+import struct
+import zlib
+
+"""
+Framing for capture transfers. A framed capture is split into frames of a fixed number of samples, each sent as
+
+    '#' | frame index (uint32, big-endian) | payload length (uint32, big-endian) | payload | CRC-32 (uint32, big-endian)
+
+where the CRC covers the index, length and payload. A dropped, inserted or corrupted byte only invalidates the
+frame it falls in. The parser finds the start of the next good frame and carries on, so only the bad frames need
+to be sent again.
+
+This requires firmware support for the MEASURE:FRAMED? and FETCH:FRAME? commands (see MCP3561.measureFramed()).
+"""
+
+frameMarker = b'#'
+frameHeaderFormat = '>II'
+frameHeaderSize = 1 + struct.calcsize(frameHeaderFormat)
+frameTrailerSize = 4
+frameOverhead = frameHeaderSize + frameTrailerSize
+
+"""
+Builds one frame around a block of payload bytes.
+
+:param frameIndex: The position of this frame in the capture, starting at 0
+:param payload: The raw bytes of the frame's samples
+:returns: The frame as bytes
+"""
+def encodeFrame(frameIndex, payload):
+    body = struct.pack(frameHeaderFormat, frameIndex, len(payload)) + bytes(payload)
+    return frameMarker + body + struct.pack('>I', zlib.crc32(body))
+
+"""
+Gets the number of payload bytes in each frame of a capture. All frames are full except possibly the last.
+
+:param totalBytes: The number of payload bytes in the whole capture
+:param frameBytes: The number of payload bytes in a full frame
+:returns: List of payload lengths, one per frame
+"""
+def frameLengths(totalBytes, frameBytes):
+    numberFrames = -(-totalBytes // frameBytes)
+    return [min(frameBytes, totalBytes - i * frameBytes) for i in range(numberFrames)]
+
+"""
+Parses a stream of frames in a single pass, copying the payload of every valid frame into place. When a frame
+fails its checks (a byte slip or corruption), the parser scans forward for the next marker that starts a valid
+frame and resynchronizes there.
+
+:param buffer: The received bytes
+:param payload: Writable buffer (such as a bytearray or uint8 array) of the whole capture's payload size, which
+    valid frames are copied into
+:param frameBytes: The number of payload bytes in a full frame
+:returns: Set of the indices of frames that were received intact
+"""
+def parseFrames(buffer, payload, frameBytes):
+    buffer = bytes(buffer)
+    view = memoryview(buffer)
+    payload = memoryview(payload).cast('B')
+    lengths = frameLengths(len(payload), frameBytes)
+    goodFrames = set()
+    offset = 0
+
+    while offset + frameOverhead <= len(buffer):
+        if buffer[offset:offset + 1] == frameMarker:
+            frameIndex, length = struct.unpack_from(frameHeaderFormat, buffer, offset + 1)
+            end = offset + frameHeaderSize + length
+            if frameIndex < len(lengths) and length == lengths[frameIndex] and end + frameTrailerSize <= len(buffer):
+                crc, = struct.unpack_from('>I', buffer, end)
+                if crc == zlib.crc32(view[offset + 1:end]):
+                    start = frameIndex * frameBytes
+                    payload[start:start + length] = view[offset + frameHeaderSize:end]
+                    goodFrames.add(frameIndex)
+                    offset = end + frameTrailerSize
+                    continue
+
+        # Not a valid frame here, so skip ahead to the next possible marker
+        offset = buffer.find(frameMarker, offset + 1)
+        if offset < 0:
+            break
+
+    return goodFrames
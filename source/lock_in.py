@@ -0,0 +1,89 @@
+import numpy as np
+import threading
+try:
+    from .spectral_density import getWindow
+except ImportError: # Imported as a top-level module from the source directory, as the tests do
+    from spectral_density import getWindow
+
+"""
+Lock-in extraction of the amplitude and phase of a signal at one or more known frequencies. Each harmonic is found
+with a single dot product against a reference phasor, which is O(N) and much cheaper than a full FFT when only a
+few frequencies are needed. The frequency does not need to fall exactly on an FFT bin.
+"""
+
+# Reference phasors and windows, keyed on everything that determines them. Sweeps measure at the same frequencies
+# and number of samples over and over, so these only need to be computed once. Each entry holds 2 rows of float64 per
+# harmonic, so long captures make large entries: the cache is bounded by its size in bytes, dropping the least
+# recently used entries first, and is locked as several threads (such as SweepPipeline's) can use it at once.
+_referenceCache = {}
+_referenceCacheLock = threading.Lock()
+_maxCacheBytes = 64 * 2**20
+
+def _references(frequencies, samplingFrequency, numberSamples, window):
+    key = (tuple(frequencies), samplingFrequency, numberSamples, window)
+    with _referenceCacheLock:
+        if key in _referenceCache:
+            _referenceCache[key] = _referenceCache.pop(key) # Move to the most recently used end
+            return _referenceCache[key]
+
+    # The same windows as the noise estimates, so that noise factors worked out from them apply here
+    windowData, windowPower = getWindow(window, numberSamples)
+    coherentGain = np.sum(windowData)
+
+    # Cosine rows followed by sine rows, scaled so that a dot product with the data gives the in-phase and
+    # quadrature amplitudes directly. Keeping these real avoids converting the data to complex.
+    phases = 2 * np.pi * np.outer(frequencies, np.arange(numberSamples) / samplingFrequency)
+    references = np.concatenate((np.cos(phases), -np.sin(phases))) * (2 * windowData / coherentGain)
+    entry = (references, np.sum(references, axis=1))
+
+    if references.nbytes <= _maxCacheBytes:
+        with _referenceCacheLock:
+            _referenceCache[key] = entry
+            while sum(cached[0].nbytes for cached in _referenceCache.values()) > _maxCacheBytes:
+                _referenceCache.pop(next(iter(_referenceCache)))
+    return entry
+
+"""
+Finds the amplitude and phase of a signal at a frequency and, optionally, its harmonics.
+
+:param voltages: Array of measured voltages. A 2-D array is treated as a stack of captures, one per row.
+:param frequency: The fundamental frequency, in the same units as samplingFrequency
+:param samplingFrequency: The sampling frequency of the measurement
+:param harmonics: Either the number of harmonics to find (1 for just the fundamental) or a list of harmonic numbers
+:param window: 'boxcar' for captures containing a whole number of periods, or 'hann' to reduce leakage when they
+    do not
+:returns: Tuple of (amplitudes, phases). These have one entry per harmonic (and one row per capture for 2-D input),
+    with amplitudes in the units of the voltages and phases in radians relative to a cosine.
+"""
+def lockIn(voltages, frequency, samplingFrequency, harmonics=1, window='boxcar'):
+    voltages = np.asarray(voltages)
+    if np.isscalar(harmonics):
+        harmonics = np.arange(1, harmonics + 1)
+    frequencies = frequency * np.asarray(harmonics, dtype=np.float64)
+    references, referenceSums = _references(frequencies, samplingFrequency, voltages.shape[-1], window)
+
+    # Remove the DC offset so that it does not leak into low harmonics. Subtracting its projection afterwards is
+    # equivalent to subtracting it from the data, without making a copy.
+    offset = np.mean(voltages, axis=-1, keepdims=True)
+    projections = voltages @ references.T - offset * referenceSums
+    inPhase, quadrature = np.split(projections, 2, axis=-1)
+    return np.hypot(inPhase, quadrature), np.arctan2(quadrature, inPhase)
+
+"""
+Finds the pk-pk amplitude of a square wave (such as a chopped optical signal) from its odd harmonics.
+
+A square wave with pk-pk amplitude A has odd harmonics of amplitude 2A / (pi k), so each harmonic gives an
+estimate of A. These are combined with a least-squares fit, which weights the stronger low harmonics most.
+
+:param voltages: Array of measured voltages. A 2-D array is treated as a stack of captures, one per row.
+:param frequency: The square wave frequency, in the same units as samplingFrequency
+:param samplingFrequency: The sampling frequency of the measurement
+:param numberHarmonics: The number of odd harmonics to use (1 uses only the fundamental)
+:param window: 'boxcar' or 'hann', as for lockIn()
+:returns: The pk-pk amplitude of the square wave (one per capture for 2-D input)
+"""
+def squareWaveAmplitude(voltages, frequency, samplingFrequency, numberHarmonics=3, window='boxcar'):
+    harmonics = np.arange(1, 2 * numberHarmonics, 2)
+    amplitudes, phases = lockIn(voltages, frequency, samplingFrequency, harmonics=harmonics, window=window)
+    weights = 2 / (np.pi * harmonics)
+    return amplitudes @ weights / np.sum(np.square(weights))
@@ -0,0 +1,159 @@
+from .CaptureStorage import CaptureReader
+from .batch_analysis import analyzeCaptures, analysisColumns
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import glob
+import os
+
+"""
+Reanalysis of archived captures across a pool of processes. The captures are split into chunks (work units) of
+consecutive captures of the same size, and each worker process decodes and analyzes its chunks with
+analyzeCaptures().
+
+The raw captures are never sent between processes. Each worker memory-maps the files itself, so all of the processes
+share the one copy of the data in the operating system's page cache, and only a unit's few numbers per capture are
+sent back. These are written into preallocated result columns at the rows belonging to the unit, so the results come
+out in the same order however the units are scheduled.
+
+Captures can come from recordings made by CaptureRecorder, or from .npy files holding a 2-D (captures x bytes) array
+of raw data.
+"""
+
+# Open recordings, kept by each worker process so that the index of a recording is only read once
+_sources = {}
+
+def _openSource(path):
+    if path not in _sources:
+        if path.endswith('.npy'):
+            _sources[path] = np.load(path, mmap_mode='r')
+        else:
+            _sources[path] = CaptureReader(path)
+    return _sources[path]
+
+def _rawCaptures(path, start, stop):
+    source = _openSource(path)
+    if isinstance(source, CaptureReader):
+        return source.stack(start, stop) # Raises rather than reading across a gap in the raw file
+    return source[start:stop]
+
+def _follows(entries, start, index):
+    """
+    Checks that a capture lies directly after the captures from start in the raw file, as it does unless an
+    interrupted append left unindexed bytes between them.
+    """
+    if 'offset' not in entries[index]:
+        return True
+    return entries[index]['offset'] == entries[start]['offset'] + 3 * entries[start]['numberSamples'] * (index - start)
+
+"""
+Finds the recordings and .npy files in a list of paths.
+
+:param paths: Recordings (with or without the .raw or .index extension), .npy files, or directories containing them
+:returns: List of recording paths (without extension) and .npy file paths, with the contents of each directory sorted
+    by name
+"""
+def findSources(paths):
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = [indexFile[:-len('.index')] for indexFile in glob.glob(os.path.join(path, '*.index'))]
+            found += glob.glob(os.path.join(path, '*.npy'))
+            sources += sorted(found)
+        elif path.endswith('.npy'):
+            sources.append(path)
+        else:
+            sources.append(os.path.splitext(path)[0] if path.endswith(('.raw', '.index')) else path)
+    return sources
+
+"""
+Splits the captures in a set of sources into work units of consecutive captures that can be analyzed together. A unit
+ends wherever the size or sampling frequency of the captures changes, or the next capture does not directly follow
+the unit's captures in the raw file.
+
+:param sources: Recording paths and .npy file paths, from findSources()
+:param chunkSize: The largest number of captures in a unit
+:param samplingFrequency: The sampling frequency to use for captures that do not record their own, in Hz
+:returns: Tuple of (list of units, metadata columns). Each unit is a tuple of (source path, first capture, one past
+    the last capture, first row of the results, sampling frequency). The metadata columns have one entry per capture.
+"""
+def planUnits(sources, chunkSize=64, samplingFrequency=None):
+    units = []
+    metadata = {'source': [], 'capture': [], 'timestamp': [], 'wavelength': []}
+    row = 0
+    for path in sources:
+        if path.endswith('.npy'):
+            numberCaptures = len(np.load(path, mmap_mode='r'))
+            entries = [{} for i in range(numberCaptures)]
+        else:
+            entries = CaptureReader(path).metadata
+
+        start = 0
+        while start < len(entries):
+            captureFrequency = entries[start].get('samplingFrequency', samplingFrequency)
+            if captureFrequency is None:
+                raise ValueError(f"Capture {start} of {path} has no sampling frequency. Give one to use by default.")
+            stop = start + 1
+            while stop < len(entries) and stop - start < chunkSize and \
+                    entries[stop].get('numberSamples') == entries[start].get('numberSamples') and \
+                    entries[stop].get('samplingFrequency', samplingFrequency) == captureFrequency and \
+                    _follows(entries, start, stop):
+                stop += 1
+            units.append((path, start, stop, row + start, captureFrequency))
+            start = stop
+
+        metadata['source'] += [path] * len(entries)
+        metadata['capture'] += list(range(len(entries)))
+        metadata['timestamp'] += [entry.get('timestamp', np.nan) for entry in entries]
+        metadata['wavelength'] += [entry.get('wavelength', np.nan) for entry in entries]
+        row += len(entries)
+
+    metadata = {column: np.array(values) for column, values in metadata.items()}
+    return units, metadata
+
+def _analyzeUnit(unit, options):
+    """
+    Analyzes the captures of one work unit.
+    """
+    path, start, stop, row, samplingFrequency = unit
+    return analyzeCaptures(_rawCaptures(path, start, stop), samplingFrequency, **options)
+
+"""
+Decodes and analyzes every capture in a set of recordings, spreading the work over several processes.
+
+    results = reprocessRecordings(['data/2024-05-01'], frequency=1000, noiseBand=(200, 5000), numberWorkers=8)
+    pd.DataFrame(results).to_csv('reprocessed.csv', index=False)
+
+:param paths: Recordings, .npy files of raw captures, or directories containing them
+:param numberWorkers: The number of worker processes. Defaults to the number of CPUs. 1 runs everything in this
+    process.
+:param chunkSize: The number of captures in each work unit
+:param samplingFrequency: The sampling frequency to use for captures that do not record their own, in Hz
+:param analysisOptions: Options for analyzeCaptures(), such as frequency, signalBins, noiseBand, window or gain
+:returns: Dictionary of columns with one entry per capture, in the order of the sources and of the captures within
+    them. The 'source', 'capture', 'timestamp' and 'wavelength' columns identify each capture, and are followed by the
+    columns from analyzeCaptures().
+"""
+def reprocessRecordings(paths, numberWorkers=None, chunkSize=64, samplingFrequency=None, **analysisOptions):
+    units, results = planUnits(findSources(paths), chunkSize=chunkSize, samplingFrequency=samplingFrequency)
+    columns = analysisColumns(analysisOptions.get('frequency'), analysisOptions.get('signalBins', ()),
+            analysisOptions.get('noiseBand'))
+    for column in columns:
+        results[column] = np.empty(len(results['capture']))
+
+    if numberWorkers == 1:
+        unitResults = (_analyzeUnit(unit, analysisOptions) for unit in units)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=numberWorkers)
+        unitResults = executor.map(_analyzeUnit, units, [analysisOptions] * len(units))
+    try:
+        # map() gives the results in the order of the units, whatever order they finish in
+        for (path, start, stop, row, samplingFrequency), unitResult in zip(units, unitResults):
+            for column in columns:
+                results[column][row:row + stop - start] = unitResult[column]
+    finally:
+        if executor is None:
+            _sources.clear() # Recordings may have grown by the next call
+        else:
+            executor.shutdown(cancel_futures=True)
+    return results
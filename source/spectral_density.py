@@ -0,0 +1,161 @@
+import numpy as np
+
+"""
+Power spectral density and noise density estimation using Welch's method: the data is split into overlapping
+windowed segments whose one-sided spectra are averaged. Segments can be fed in as they are measured, so long
+captures are characterised in bounded memory.
+"""
+
+# Windows and their power normalization, keyed on (window type, number of samples)
+_windowCache = {}
+
+"""
+Gets a window function and the sum of its squares, which normalizes spectra to a power spectral density.
+Both are cached, so repeated calls with the same type and length are free.
+
+:param windowType: 'hann' or 'boxcar'
+:param numberSamples: The length of the window
+:returns: Tuple of (window array, sum of the squared window)
+"""
+def getWindow(windowType, numberSamples):
+    key = (windowType, numberSamples)
+    if key not in _windowCache:
+        if windowType == 'hann':
+            window = np.hanning(numberSamples)
+        elif windowType == 'boxcar':
+            window = np.ones(numberSamples)
+        else:
+            raise ValueError(f"windowType must be 'hann' or 'boxcar', not {windowType}")
+        window.flags.writeable = False
+        _windowCache[key] = (window, np.sum(np.square(window)))
+    return _windowCache[key]
+
+class NoiseDensityEstimator:
+    """
+    Streaming Welch estimator of the one-sided power spectral density of a signal. Data can be added in blocks of
+    any size with update(), and only the samples belonging to an unfinished segment are kept between calls.
+
+    :param samplingFrequency: The sampling frequency of the data, in Hz
+    :param segmentSize: The number of samples in each segment. This sets the frequency resolution.
+    :param window: 'hann' or 'boxcar'
+    :param overlap: The fraction of each segment shared with the next one
+    """
+    def __init__(self, samplingFrequency, segmentSize=4096, window='hann', overlap=0.5):
+        self.samplingFrequency = samplingFrequency
+        self.segmentSize = int(segmentSize)
+        self.window = window
+        self.stepSize = max(1, int(round(self.segmentSize * (1 - overlap))))
+        self.frequencies = np.fft.rfftfreq(self.segmentSize, d=1/samplingFrequency)
+        self.reset()
+
+    def reset(self):
+        """
+        Discards all data added so far.
+        """
+        self.powerSum = np.zeros(len(self.frequencies))
+        self.numberSegments = 0
+        self._remainder = np.zeros(0)
+
+    def update(self, voltages):
+        """
+        Adds a block of data, averaging every segment that it completes into the spectrum.
+
+        :param voltages: Array of voltages, continuing on from the previous block
+        """
+        data = np.concatenate((self._remainder, voltages))
+        if len(data) < self.segmentSize:
+            self._remainder = data
+            return
+
+        segments = np.lib.stride_tricks.sliding_window_view(data, self.segmentSize)[::self.stepSize]
+        window, windowPower = getWindow(self.window, self.segmentSize)
+        segments = (segments - np.mean(segments, axis=1, keepdims=True)) * window
+        self.powerSum += np.sum(np.square(np.abs(np.fft.rfft(segments, axis=1))), axis=0)
+        self.numberSegments += len(segments)
+        self._remainder = data[len(segments) * self.stepSize:]
+
+    @property
+    def psd(self):
+        """
+        The averaged one-sided power spectral density, in V^2/Hz
+        """
+        if self.numberSegments == 0:
+            raise ValueError(f"Need at least {self.segmentSize} samples to estimate the spectrum")
+        window, windowPower = getWindow(self.window, self.segmentSize)
+        psd = self.powerSum / (self.numberSegments * self.samplingFrequency * windowPower)
+        # Fold the negative frequencies into the positive ones. DC and the Nyquist frequency have no mirror image.
+        psd[1:] *= 2
+        if self.segmentSize % 2 == 0:
+            psd[-1] /= 2
+        return psd
+
+    def bandRMS(self, startFrequency, stopFrequency):
+        """
+        Integrates the noise over a frequency band.
+
+        :param startFrequency: The lower edge of the band, in Hz
+        :param stopFrequency: The upper edge of the band, in Hz
+        :returns: The RMS voltage in the band
+        """
+        band = (self.frequencies >= startFrequency) & (self.frequencies <= stopFrequency)
+        binWidth = self.samplingFrequency / self.segmentSize
+        return np.sqrt(np.sum(self.psd[band]) * binWidth)
+
+    def bandDensity(self, startFrequency, stopFrequency):
+        """
+        Finds the average noise density over a frequency band.
+
+        :param startFrequency: The lower edge of the band, in Hz
+        :param stopFrequency: The upper edge of the band, in Hz
+        :returns: The noise density in V/rtHz
+        """
+        return self.bandRMS(startFrequency, stopFrequency) / np.sqrt(stopFrequency - startFrequency)
+
+"""
+Finds the one-sided power spectral density of every capture in a stack at once, with Welch's method along the
+last axis. This gives the same spectrum as feeding each capture to its own NoiseDensityEstimator.
+
+:param voltages: Array of measured voltages. A 2-D array is treated as a stack of captures, one per row.
+:param samplingFrequency: The sampling frequency, in Hz
+:param segmentSize: The number of samples in each averaged segment. Defaults to the whole capture.
+:param window: 'hann' or 'boxcar'
+:param overlap: The fraction of each segment shared with the next one
+:returns: Tuple of (frequencies, power spectral densities in V^2/Hz), with one spectrum per capture
+"""
+def welchPSD(voltages, samplingFrequency, segmentSize=None, window='hann', overlap=0.5):
+    voltages = np.asarray(voltages)
+    numberSamples = voltages.shape[-1]
+    segmentSize = numberSamples if segmentSize is None else int(segmentSize)
+    if numberSamples < segmentSize:
+        raise ValueError(f"Need at least {segmentSize} samples to estimate the spectrum")
+    stepSize = max(1, int(round(segmentSize * (1 - overlap))))
+
+    windowData, windowPower = getWindow(window, segmentSize)
+    segments = np.lib.stride_tricks.sliding_window_view(voltages, segmentSize, axis=-1)[..., ::stepSize, :]
+    segments = (segments - np.mean(segments, axis=-1, keepdims=True)) * windowData
+    psd = np.mean(np.square(np.abs(np.fft.rfft(segments, axis=-1))), axis=-2) / (samplingFrequency * windowPower)
+    # Fold the negative frequencies into the positive ones. DC and the Nyquist frequency have no mirror image.
+    psd[..., 1:] *= 2
+    if segmentSize % 2 == 0:
+        psd[..., -1] /= 2
+    return np.fft.rfftfreq(segmentSize, d=1/samplingFrequency), psd
+
+"""
+Finds the RMS noise and noise density of a capture over a frequency band.
+
+:param voltages: Array of measured voltages. A 2-D array is treated as a stack of captures, one per row.
+:param samplingFrequency: The sampling frequency, in Hz
+:param startFrequency: The lower edge of the band, in Hz
+:param stopFrequency: The upper edge of the band, in Hz
+:param segmentSize: The number of samples in each averaged segment. Defaults to the whole capture.
+:param window: 'hann' or 'boxcar'
+:returns: Tuple of (RMS voltage in the band, noise density in V/rtHz), one of each per capture for 2-D input
+"""
+def noiseDensity(voltages, samplingFrequency, startFrequency, stopFrequency, segmentSize=None, window='hann'):
+    if segmentSize is None:
+        segmentSize = np.shape(voltages)[-1]
+    frequencies, psd = welchPSD(voltages, samplingFrequency, segmentSize=segmentSize, window=window)
+    band = (frequencies >= startFrequency) & (frequencies <= stopFrequency)
+    binWidth = samplingFrequency / segmentSize
+    bandRMS = np.sqrt(np.sum(psd[..., band], axis=-1) * binWidth)
+    return bandRMS, bandRMS / np.sqrt(stopFrequency - startFrequency)
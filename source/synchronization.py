@@ -0,0 +1,87 @@
+import numpy as np
+
+"""
+Coherent (synchronous) averaging of captures against the synchronization pulses recorded by the ADC. Every
+period between two consecutive pulses is folded onto the same phase axis, so anything not locked to the reference
+averages away while the signal waveform builds up.
+"""
+
+"""
+Folds a capture into period-averaged bins using the synchronization pulses as the phase reference.
+
+Each period is normalized by its own length, so periods that are slightly longer or shorter than average (from
+jitter, or a reference frequency that is not a whole number of samples) still line up. Each sample is shared
+between the two nearest phase bins in proportion to its distance from them.
+
+:param voltages: Array of measured voltages
+:param syncIndices: Sample indices of the synchronization pulses, as returned by MCP3561.getSyncIndices()
+:param numberBins: The number of phase bins per period
+:returns: Tuple of (sum of the voltages in each bin, total weight in each bin, number of whole periods folded)
+"""
+def foldPeriods(voltages, syncIndices, numberBins=100):
+    syncIndices = np.asarray(syncIndices, dtype=np.int64)
+    syncIndices = syncIndices[(syncIndices >= 0) & (syncIndices <= len(voltages))]
+    if len(syncIndices) < 2:
+        return np.zeros(numberBins), np.zeros(numberBins), 0
+
+    periodLengths = np.diff(syncIndices)
+    sampleIndices = np.arange(syncIndices[0], syncIndices[-1])
+    periodStarts = np.repeat(syncIndices[:-1], periodLengths)
+    positions = (sampleIndices - periodStarts) / np.repeat(periodLengths, periodLengths) * numberBins
+
+    lowerBins = np.floor(positions).astype(np.int64)
+    upperWeights = positions - lowerBins
+    lowerWeights = 1 - upperWeights
+    upperBins = (lowerBins + 1) % numberBins
+    samples = voltages[syncIndices[0]:syncIndices[-1]]
+
+    sums = np.bincount(lowerBins, weights=samples * lowerWeights, minlength=numberBins) + \
+            np.bincount(upperBins, weights=samples * upperWeights, minlength=numberBins)
+    weights = np.bincount(lowerBins, weights=lowerWeights, minlength=numberBins) + \
+            np.bincount(upperBins, weights=upperWeights, minlength=numberBins)
+    return sums, weights, len(periodLengths)
+
+class CoherentAverager:
+    """
+    Accumulates the period-averaged waveform over any number of captures.
+
+    :param numberBins: The number of phase bins per period
+    """
+    def __init__(self, numberBins=100):
+        self.numberBins = numberBins
+        self.reset()
+
+    def reset(self):
+        """
+        Discards all captures accumulated so far.
+        """
+        self.sums = np.zeros(self.numberBins)
+        self.weights = np.zeros(self.numberBins)
+        self.numberPeriods = 0
+
+    def accumulate(self, voltages, syncIndices):
+        """
+        Folds a capture into the running average.
+
+        :param voltages: Array of measured voltages
+        :param syncIndices: Sample indices of the synchronization pulses in this capture
+        """
+        sums, weights, numberPeriods = foldPeriods(voltages, syncIndices, numberBins=self.numberBins)
+        self.sums += sums
+        self.weights += weights
+        self.numberPeriods += numberPeriods
+
+    @property
+    def waveform(self):
+        """
+        The average voltage in each phase bin, starting at the synchronization pulse
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.sums / self.weights
+
+    @property
+    def phases(self):
+        """
+        The phase (as a fraction of a period) that each bin is centred on
+        """
+        return np.arange(self.numberBins) / self.numberBins
@@ -30,6 +30,33 @@ class TestADCProcessing(unittest.TestCase):
         actualIntegers = twosToInteger(testBytes)
         assertAlmostEqual(desiredIntegers, actualIntegers)
 
+    def testTwosToIntegerLSB(self):
+        """
+        Check that least-significant-byte-first data is decoded for more than one sample
+        """
+        testBytes = np.array([255, 255, 100, 0, 0, 128, 255, 255, 255])
+        desiredIntegers = np.array([6619135, -8388608, -1])
+        actualIntegers = twosToInteger(testBytes, firstByte='lsb')
+        assertAlmostEqual(desiredIntegers, actualIntegers)
+
+    def testTwosToIntegerOutput(self):
+        """
+        Check that we can decode into a preallocated output array, and that it is the array returned
+        """
+        testBytes = np.array([255, 255, 255, 100, 255, 255], dtype=np.uint8)
+        outputArray = np.zeros(2, dtype=np.int32)
+        actualIntegers = twosToInteger(testBytes, out=outputArray)
+        self.assertIs(actualIntegers, outputArray)
+        assertAlmostEqual(np.array([-1, 6619135]), outputArray)
+
+    def testTwosToIntegerBadLength(self):
+        """
+        Check that a buffer that is not a whole number of samples is rejected
+        """
+        testBytes = np.array([255, 255, 255, 100])
+        with self.assertRaises(ValueError):
+            twosToInteger(testBytes)
+
 
     def testCountToVoltage(self):
         """
@@ -46,5 +73,37 @@ class TestADCProcessing(unittest.TestCase):
         actualVoltage = twosToVoltage(testBytes, maxVoltage=5, differential=True)
         assertAlmostEqual(desiredVoltage, actualVoltage, absoluteTolerance = 1e-5)
 
+    def testTwosToVoltageFloat32Output(self):
+        """
+        Check that we can write single-precision voltages into a preallocated output array
+        """
+        testBytes = np.array([127, 255, 255, 128, 0, 0], dtype=np.uint8)
+        outputArray = np.zeros(2, dtype=np.float32)
+        actualVoltage = twosToVoltage(testBytes, maxVoltage=5, out=outputArray)
+        self.assertIs(actualVoltage, outputArray)
+        self.assertEqual(actualVoltage.dtype, np.float32)
+        assertAlmostEqual(np.array([5.0, -5.0]), actualVoltage, absoluteTolerance = 1e-5)
+
+    def testTwosToVoltageCalibration(self):
+        """
+        Check that the calibration gain and offset are applied as gain * voltage + offset
+        """
+        testBytes = np.array([64, 0, 0, 192, 0, 0])
+        desiredVoltage = np.array([2*2.5 + 0.1, 2*-2.5 + 0.1])
+        actualVoltage = twosToVoltage(testBytes, maxVoltage=5, gain=2, offset=0.1)
+        assertAlmostEqual(desiredVoltage, actualVoltage)
+
+    def testTwosToVoltageStack(self):
+        """
+        Check that a stack of captures decodes to one row of voltages per capture
+        """
+        testBytes = np.random.default_rng(0).integers(0, 256, (4, 30), dtype=np.uint8)
+        actualVoltage = twosToVoltage(testBytes, maxVoltage=5, gain=2, offset=0.1)
+        self.assertEqual(actualVoltage.shape, (4, 10))
+        for row, voltages in zip(testBytes, actualVoltage):
+            np.testing.assert_array_equal(voltages, twosToVoltage(row, maxVoltage=5, gain=2, offset=0.1))
+        with self.assertRaises(ValueError):
+            twosToVoltage(testBytes, out=np.zeros((10, 4)).T)
+
 if __name__ == '__main__':
     unittest.main()
@@ -5,7 +5,7 @@ sys.path.append('source')
 from UnitTesting.shorthand import *
 from AD7766_postprocessing import *
 from DataAquisition import MCP3561
-import matplotlib.pyplot as plt
+from spectral_density import noiseDensity
 
 class TestArduinoADCProperties(unittest.TestCase):
 
@@ -25,28 +25,20 @@ class TestArduinoADCProperties(unittest.TestCase):
         self.device.motorEnable = False
 
         desiredMeasurements = 10000
-        halfMeasurements = int(desiredMeasurements/2)
         samplingFrequency = 4.68 # kHz
-        frequencies = np.arange(0, samplingFrequency/2, samplingFrequency/desiredMeasurements)
 
         signalFrequency = 1 # kHz
         startNoiseFrequency = signalFrequency * 2
         stopNoiseFrequency = samplingFrequency/2
-        noiseBandwidth = (stopNoiseFrequency - startNoiseFrequency)
-        startNoiseBin = int(startNoiseFrequency / samplingFrequency * desiredMeasurements)
 
         self.device.Configure(desiredMeasurements)
         data = self.device.Measure()
-        times = np.arange(0, desiredMeasurements / samplingFrequency, 1/samplingFrequency)
         voltages = twosToVoltage(data)
-        dcOffset = np.mean(voltages)
-        voltages -= dcOffset
 
-        # The single-sided voltage spectral power (rms, by definition)
-        voltageSpectralPower = np.square(np.abs(np.fft.fft(voltages/len(voltages))))[0:halfMeasurements]*2
-
-        voltageNoiseRMS = np.sqrt(np.sum(voltageSpectralPower[startNoiseBin:]) )
-        voltageNoisePSD = 1e9 * voltageNoiseRMS / np.sqrt(noiseBandwidth * 1e3) # in nV / rtHz
+        # No window, as the noise is measured far from the signal
+        voltageNoiseRMS, voltageNoisePSD = noiseDensity(voltages, samplingFrequency*1e3, startNoiseFrequency*1e3,
+                stopNoiseFrequency*1e3, window='boxcar')
+        voltageNoisePSD *= 1e9 # in nV / rtHz
 
         noiseUpperBound = 400 # Differential converter: 120-150, TIA: 250, total ~300. 
         print(f'Noise PSD: {voltageNoisePSD}')
@@ -0,0 +1,101 @@
+import sys
+import os
+import json
+import time
+import tempfile
+import asyncio
+import unittest
+import numpy as np
+sys.path.append('source')
+from UnitTesting.shorthand import *
+from DeviceEmulator import TeensyEmulator
+from DataAquisition import MCP3561, Keithley, TEController
+from DataAquisition.AD7766.python.source.AsyncSCPIDevice import AsyncMCP3561, AsyncKeithley, AsyncTEController
+
+class TestAsyncDevices(unittest.TestCase):
+    """
+    Drives emulated instruments from one event loop
+    """
+
+    def setUp(self):
+        # closeDevice() saves the settings, so keep them out of the working directory
+        self.settingsFile = os.path.join(tempfile.mkdtemp(), 'device_settings.txt')
+        with open(self.settingsFile, 'w') as settingsFile:
+            json.dump({'wavelength': 1000}, settingsFile)
+
+    def testMeasure(self):
+        """
+        Check that an asynchronous measurement returns the same amount of data as a synchronous one
+        """
+        async def measure():
+            async with AsyncMCP3561(MCP3561(device=TeensyEmulator(), settingsFile=self.settingsFile)) as device:
+                await device.Configure(1000)
+                return await device.Measure()
+        self.assertEqual(len(asyncio.run(measure())), 3000)
+
+    def testConcurrentMeasurements(self):
+        """
+        Check that captures on two devices overlap instead of running one after the other
+        """
+        async def measureBoth():
+            emulators = [TeensyEmulator(measurementRate=1e4, realTime=True) for i in range(2)]
+            devices = [AsyncMCP3561(MCP3561(baudRate=12e6, sampling_frequency=1e4, device=emulator,
+                    settingsFile=self.settingsFile))
+                    for emulator in emulators]
+            for device in devices:
+                await device.Configure(2000)
+            startTime = time.perf_counter()
+            results = await asyncio.gather(*[device.Measure() for device in devices])
+            elapsedTime = time.perf_counter() - startTime
+            for device in devices:
+                await device.closeDevice()
+            return results, elapsedTime
+
+        results, elapsedTime = asyncio.run(measureBoth())
+        self.assertEqual([len(data) for data in results], [6000, 6000])
+        self.assertLess(elapsedTime, 0.35) # Each capture takes 0.2s
+
+    def testMotorAndTemperature(self):
+        """
+        Check that a motor move and a temperature readout can run together
+        """
+        async def run():
+            adc = AsyncMCP3561(MCP3561(device=TeensyEmulator(motorStepTime=1e-3), settingsFile=self.settingsFile))
+            adc.device.motorStepTime = 1e-3
+            controller = AsyncTEController(TEController(device=TeensyEmulator()))
+            await controller.setTemperature(30)
+            moved, temperature = await asyncio.gather(adc.rotateMotor(100, timeout=5), controller.Fetch())
+            return adc.device.motorPosition, temperature
+
+        position, temperature = asyncio.run(run())
+        self.assertEqual(position, 100)
+        assertAlmostEqual(temperature, 30)
+
+    def testVoltageSweep(self):
+        """
+        Check that a Keithley voltage sweep measures the current through the emulated 1MOhm load
+        """
+        async def sweep():
+            keithley = AsyncKeithley(Keithley(device=TeensyEmulator()))
+            keithley.device.device.timeout = 0.1
+            return await keithley.applyVoltageMeasureCurrent([0.5, 1.0], delay=0.25)
+
+        voltages, currents = asyncio.run(sweep())
+        np.testing.assert_allclose(voltages, [0.5, 1.0])
+        np.testing.assert_allclose(currents, [0.5e-6, 1e-6])
+
+    def testHardwareSweep(self):
+        """
+        Check that a sweep run on the Keithley itself can go alongside an ADC capture
+        """
+        async def sweep():
+            keithley = AsyncKeithley(Keithley(device=TeensyEmulator(deviceID='KEITHLEY INSTRUMENTS INC.,MODEL 2400')))
+            adc = AsyncMCP3561(MCP3561(device=TeensyEmulator(), settingsFile=self.settingsFile))
+            return await asyncio.gather(keithley.sweepVoltageMeasureCurrent(np.linspace(0, 1, 5)), adc.Measure())
+
+        (voltages, currents), data = asyncio.run(sweep())
+        np.testing.assert_allclose(voltages, np.linspace(0, 1, 5))
+        np.testing.assert_allclose(currents, np.linspace(0, 1e-6, 5))
+
+if __name__ == '__main__':
+    unittest.main()
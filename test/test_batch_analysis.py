@@ -0,0 +1,61 @@
+import sys
+import unittest
+import numpy as np
+sys.path.append('source')
+from UnitTesting.shorthand import *
+from AD7766_postprocessing import *
+from lock_in import lockIn
+from spectral_density import noiseDensity
+from DataAquisition import analyzeCaptures, binAmplitudes, fourierAmplitude
+
+class TestBatchAnalysis(unittest.TestCase):
+    """
+    Checks that analyzing a stack of captures at once gives the same results as analyzing them one at a time.
+    """
+
+    def setUp(self):
+        self.samplingFrequency = 10000
+        self.frequency = 100
+        times = np.arange(2000) / self.samplingFrequency
+        random = np.random.default_rng(0)
+        voltages = np.array([amplitude * np.sin(2*np.pi * self.frequency * times) +
+                random.normal(scale=1e-3, size=len(times)) for amplitude in np.linspace(0.01, 0.2, 7)])
+        counts = np.round(voltages / 3.3 * pow(2, 23)).astype(np.int64)
+        self.captures = np.stack([(counts >> 16) & 0xff, (counts >> 8) & 0xff, counts & 0xff], axis=-1).astype(np.uint8)
+        self.captures = self.captures.reshape(len(voltages), -1)
+
+    def testBinAmplitudes(self):
+        signalBin = 20
+        amplitudes = binAmplitudes(twosToVoltage(self.captures), [signalBin, 3])
+        self.assertEqual(amplitudes.shape, (7, 2))
+        for capture, amplitude in zip(self.captures, amplitudes[:, 0]):
+            assertAlmostEqual(fourierAmplitude(capture, signalBin), amplitude)
+
+    def testMatchesSingleCaptures(self):
+        """
+        Check every column against the single-capture functions, with chunks that do not divide the stack evenly
+        """
+        results = analyzeCaptures(self.captures, self.samplingFrequency, frequency=self.frequency, signalBins=[20],
+                noiseBand=(200, 5000), chunkSize=3)
+        self.assertEqual(set(results), {'mean', 'amplitude', 'phase', 'bin20', 'noiseRMS', 'noiseDensity'})
+        for i, capture in enumerate(self.captures):
+            voltages = twosToVoltage(capture)
+            amplitudes, phases = lockIn(voltages, self.frequency, self.samplingFrequency)
+            rms, density = noiseDensity(voltages, self.samplingFrequency, 200, 5000)
+            assertAlmostEqual(np.mean(voltages), results['mean'][i])
+            assertAlmostEqual(amplitudes[0], results['amplitude'][i])
+            assertAlmostEqual(phases[0], results['phase'][i])
+            assertAlmostEqual(fourierAmplitude(capture, 20), results['bin20'][i])
+            assertAlmostEqual(rms, results['noiseRMS'][i])
+            assertAlmostEqual(density, results['noiseDensity'][i])
+        assertAlmostEqual(np.linspace(0.01, 0.2, 7), results['amplitude'], absoluteTolerance=1e-3)
+
+    def testPreallocatedOutput(self):
+        out = {'mean': np.zeros(7)}
+        results = analyzeCaptures(self.captures, self.samplingFrequency, out=out)
+        self.assertIs(results['mean'], out['mean'])
+        with self.assertRaises(ValueError):
+            analyzeCaptures(self.captures, self.samplingFrequency, out={'mean': np.zeros(6)})
+
+if __name__ == '__main__':
+    unittest.main()
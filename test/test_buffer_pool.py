@@ -0,0 +1,44 @@
+import sys
+import unittest
+import numpy as np
+sys.path.append('source')
+from BufferPool import BufferPool
+
+class TestBufferPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = BufferPool(16, numberBuffers=2)
+
+    def testReuse(self):
+        """
+        Check that released buffers are handed out again rather than new ones being allocated
+        """
+        for i in range(10):
+            buffer = self.pool.acquire()
+            self.assertEqual(buffer.shape, (16,))
+            self.assertEqual(buffer.dtype, np.uint8)
+            self.pool.release(buffer)
+        self.assertEqual(self.pool.numberAllocated, 2)
+
+    def testGrowsWhenExhausted(self):
+        buffers = [self.pool.acquire() for i in range(3)]
+        self.assertEqual(self.pool.numberAllocated, 3)
+        for buffer in buffers:
+            self.pool.release(buffer)
+        self.assertEqual(self.pool.numberFree, 3)
+
+    def testReleaseView(self):
+        """
+        Check that a view of a buffer returns the whole buffer to the pool
+        """
+        buffer = self.pool.acquire()
+        self.pool.release(buffer[1:])
+        self.assertIs(self.pool.acquire(), buffer)
+
+    def testReleaseErrors(self):
+        buffer = self.pool.acquire()
+        self.pool.release(buffer)
+        with self.assertRaises(ValueError):
+            self.pool.release(buffer)
+        with self.assertRaises(ValueError):
+            self.pool.release(np.empty(8, dtype=np.uint8))
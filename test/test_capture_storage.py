@@ -0,0 +1,96 @@
+import sys
+import os
+import tempfile
+import unittest
+import numpy as np
+sys.path.append('source')
+from AD7766_postprocessing import *
+from DataAquisition.AD7766.python.source.CaptureStorage import CaptureRecorder, CaptureReader
+
+class TestCaptureStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'recording')
+        random = np.random.default_rng(0)
+        self.captures = [random.integers(0, 256, 3 * n, dtype=np.uint8) for n in [100, 2500, 1]]
+
+    def record(self):
+        with CaptureRecorder(self.path) as recorder:
+            for i, capture in enumerate(self.captures):
+                recorder.append(capture, wavelength=1000 + i, samplingFrequency=125e3, syncIndices=[3, 128])
+
+    def testRoundTrip(self):
+        """
+        Check that each capture decodes to the same voltages as the original data, and its metadata is kept
+        """
+        self.record()
+        recording = CaptureReader(self.path)
+        self.assertEqual(len(recording), 3)
+        for capture, voltages in zip(self.captures, recording):
+            np.testing.assert_array_equal(voltages, twosToVoltage(capture))
+        self.assertEqual(recording.metadata[1]['wavelength'], 1001)
+        self.assertEqual(recording.metadata[1]['syncIndices'], [3, 128])
+        self.assertEqual(os.path.getsize(self.path + '.raw'), sum(len(capture) for capture in self.captures))
+
+    def testSlice(self):
+        """
+        Check that part of a capture can be decoded on its own
+        """
+        self.record()
+        recording = CaptureReader(self.path)
+        np.testing.assert_array_equal(recording.voltages(1, start=1000, stop=1010),
+                twosToVoltage(self.captures[1])[1000:1010])
+        np.testing.assert_array_equal(recording.voltages(1, start=-5), twosToVoltage(self.captures[1])[-5:])
+        self.assertEqual(len(recording.voltages(0, start=50, stop=50)), 0)
+
+    def testAppendToExisting(self):
+        """
+        Check that reopening a recording adds captures after the ones already in it
+        """
+        self.record()
+        with CaptureRecorder(self.path) as recorder:
+            self.assertEqual(recorder.append(self.captures[0]), 3)
+        recording = CaptureReader(self.path)
+        self.assertEqual(len(recording), 4)
+        np.testing.assert_array_equal(recording.raw(3), self.captures[0])
+
+    def testPartialSample(self):
+        """
+        Check that data that is not a whole number of samples is refused
+        """
+        with CaptureRecorder(self.path) as recorder:
+            with self.assertRaises(ValueError):
+                recorder.append(np.zeros(4, dtype=np.uint8))
+
+    def testStack(self):
+        """
+        Check that consecutive captures of the same size stack into rows of the raw data without a copy
+        """
+        self.captures = [self.captures[1]] * 3 + [self.captures[0]]
+        self.record()
+        recording = CaptureReader(self.path)
+        stack = recording.stack(0, 3)
+        self.assertEqual(stack.shape, (3, len(self.captures[0])))
+        self.assertTrue(np.shares_memory(stack, recording._raw))
+        np.testing.assert_array_equal(twosToVoltage(stack)[2], recording[2])
+        with self.assertRaises(ValueError):
+            recording.stack()
+
+    def testStackAfterInterruptedAppend(self):
+        """
+        Check that captures separated by the unindexed bytes of an interrupted append are not stacked together
+        """
+        self.captures = [self.captures[0]] * 2
+        self.record()
+        with open(self.path + '.raw', 'ab') as rawFile:
+            rawFile.write(bytes([153, 10]))
+        with CaptureRecorder(self.path) as recorder:
+            recorder.append(self.captures[0])
+        recording = CaptureReader(self.path)
+        np.testing.assert_array_equal(recording.raw(2), self.captures[0])
+        self.assertEqual(recording.stack(0, 2).shape, (2, len(self.captures[0])))
+        with self.assertRaises(ValueError):
+            recording.stack(1, 3)
+
+if __name__ == '__main__':
+    unittest.main()
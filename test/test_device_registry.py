@@ -0,0 +1,139 @@
+import sys
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+sys.path.append('source')
+from DeviceEmulator import TeensyEmulator
+from DataAquisition import MCP3561, Keithley
+from DataAquisition.AD7766.python.source.DeviceRegistry import DeviceRegistry
+from DataAquisition.AD7766.python.source.SCPIDevice import DeviceNotFoundError
+
+class TestDeviceRegistry(unittest.TestCase):
+    """
+    Runs the registry against made-up ports, with TeensyEmulators standing in for the devices on them
+    """
+
+    def setUp(self):
+        self.ports = [
+            SimpleNamespace(device='/dev/cu.usbmodem1', vid=0x16c0, pid=0x0483, serial_number='A1'),
+            SimpleNamespace(device='/dev/cu.usbmodem2', vid=0x16c0, pid=0x0483, serial_number='B2'),
+            SimpleNamespace(device='/dev/cu.usbserial1', vid=0x067b, pid=0x2303, serial_number=None)]
+        self.deviceIDs = {'/dev/cu.usbmodem1': 'Temperature Controller', '/dev/cu.usbmodem2': 'MCP3561',
+                '/dev/cu.usbserial1': 'KEITHLEY 2400'}
+        self.openedPorts = []
+        self.cacheFile = os.path.join(tempfile.mkdtemp(), 'device_registry.txt')
+        self.patcher = mock.patch('serial.tools.list_ports.comports', return_value=self.ports)
+        self.comports = self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def opener(self, port, baudRate):
+        self.openedPorts.append(port)
+        emulator = TeensyEmulator(deviceID=self.deviceIDs[port], baudrate=baudRate)
+        emulator.port = port
+        return emulator
+
+    def newRegistry(self):
+        registry = DeviceRegistry(cacheFile=self.cacheFile, opener=self.opener, startupTime=0)
+        registry.register('adc', portName='usbmodem', idn='MCP3561', baudRate=115200)
+        registry.register('keithley', vid=0x067b, pid=0x2303)
+        return registry
+
+    def testMatchByIDN(self):
+        """
+        Check that the instrument is found by its IDN when two identical boards are plugged in
+        """
+        registry = self.newRegistry()
+        connection, deviceID = registry.connect('adc')
+        self.assertEqual(connection.port, '/dev/cu.usbmodem2')
+        self.assertEqual(deviceID, 'MCP3561')
+        self.assertFalse(registry.connections.get('adc') is None)
+
+    def testMatchByUSBID(self):
+        """
+        Check that the instrument is found by vendor and product ID without opening any other port
+        """
+        registry = self.newRegistry()
+        connection, deviceID = registry.connect('keithley')
+        self.assertEqual(self.openedPorts, ['/dev/cu.usbserial1'])
+
+    def testAmbiguousMatch(self):
+        """
+        Check that we refuse to guess when more than one port matches and there is nothing to choose between them
+        """
+        registry = self.newRegistry()
+        registry.register('teensy', portName='usbmodem')
+        with self.assertRaises(DeviceNotFoundError):
+            registry.connect('teensy')
+
+    def testDriverKeepsBaudRate(self):
+        """
+        Check that creating the driver leaves the port at the registered baud rate rather than the driver's default
+        """
+        registry = self.newRegistry()
+        registry.register('keithley', vid=0x067b, pid=0x2303, baudRate=57600)
+        keithley = registry.getDevice('keithley', Keithley)
+        self.assertEqual(keithley.device.baudrate, 57600)
+
+    def testConnectionPool(self):
+        """
+        Check that asking for the same device twice reuses the open connection and device object, and ports are
+        only listed once
+        """
+        registry = self.newRegistry()
+        device = registry.getDevice('adc', MCP3561)
+        self.assertIs(registry.getDevice('adc', MCP3561), device)
+        registry.connect('keithley')
+        self.assertEqual(self.openedPorts.count('/dev/cu.usbmodem2'), 1)
+        self.assertEqual(self.comports.call_count, 1)
+        self.assertEqual(device.deviceID, 'MCP3561')
+
+    def testCachedPort(self):
+        """
+        Check that a new registry goes straight to the port found by a previous one
+        """
+        registry = self.newRegistry()
+        registry.connect('adc')
+        registry.closeAll()
+
+        self.openedPorts.clear()
+        registry = self.newRegistry()
+        registry.connect('adc')
+        self.assertEqual(self.openedPorts, ['/dev/cu.usbmodem2'])
+
+    def testCachedPortSwapped(self):
+        """
+        Check that if another instrument is now on the cached port, the other ports are searched and the cache updated
+        """
+        registry = self.newRegistry()
+        registry.connect('adc')
+        registry.closeAll()
+
+        self.deviceIDs['/dev/cu.usbmodem1'], self.deviceIDs['/dev/cu.usbmodem2'] = 'MCP3561', 'Temperature Controller'
+        self.openedPorts.clear()
+        registry = self.newRegistry()
+        connection, deviceID = registry.connect('adc')
+        self.assertEqual(connection.port, '/dev/cu.usbmodem1')
+        self.assertEqual(self.openedPorts, ['/dev/cu.usbmodem2', '/dev/cu.usbmodem1'])
+        registry.closeAll()
+
+        self.openedPorts.clear()
+        self.newRegistry().connect('adc')
+        self.assertEqual(self.openedPorts, ['/dev/cu.usbmodem1'])
+
+    def testClosedConnectionReopened(self):
+        """
+        Check that a connection closed outside the registry is opened again rather than handed out closed
+        """
+        registry = self.newRegistry()
+        connection, deviceID = registry.connect('keithley')
+        connection.close()
+        newConnection, deviceID = registry.connect('keithley')
+        self.assertIsNot(newConnection, connection)
+        self.assertTrue(newConnection.is_open)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,331 @@
+import sys
+import unittest
+import os
+import json
+import time
+import tempfile
+from functools import partial
+from unittest import mock
+import numpy as np
+import serial
+sys.path.append('source')
+from UnitTesting.shorthand import *
+from AD7766_postprocessing import *
+from DeviceEmulator import TeensyEmulator
+from DataAquisition import MCP3561, TEController, SweepPipeline
+from DataAquisition.AD7766.python.source.SweepPipeline import lockInAmplitude
+from DataAquisition.AD7766.python.source.SCPIDevice import DataError
+
+class TestEmulatedADC(unittest.TestCase):
+    """
+    Runs the MCP3561 driver against the in-process Teensy emulator, so these tests need no hardware.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.emulator = TeensyEmulator(measurementRate=9.76*1e3, syncFrequency=1000, motorStepTime=1e-4, seed=0)
+        cls.device = MCP3561(sampling_frequency=9.76*1e3, device=cls.emulator)
+        cls.device.motorStepTime = cls.emulator.motorStepTime
+
+    def setUp(self):
+        self.device.Reset()
+
+    def testIdentify(self):
+        """
+        Check that the device identifies itself with the emulator's ID and leaves no bytes unread
+        """
+        self.assertEqual(self.device.Identify(), self.emulator.deviceID)
+        self.assertEqual(self.device.inWaiting(), 0)
+
+    def testMeasureByteCount(self):
+        """
+        Check that we get exactly 3 bytes per measurement for a range of measurement sizes
+        """
+        for desiredMeasurements in [1, 10, 100, 1000, 10000]:
+            self.device.Configure(desiredMeasurements)
+            data = self.device.Measure()
+            self.assertEqual(len(data), desiredMeasurements * 3)
+            self.assertEqual(self.device.inWaiting(), 0)
+
+    def testMeasureVoltages(self):
+        """
+        Check that the emulated 0.1V sine wave comes back with the right amplitude
+        """
+        self.device.Configure(1000)
+        voltages = twosToVoltage(self.device.Measure())
+        assertAlmostEqual(np.max(np.abs(voltages)), 0.1, absoluteTolerance=1e-3)
+
+    def testMeasureStream(self):
+        """
+        Check that streaming a measurement in blocks gives the right number of samples in each block
+        """
+        self.device.Configure(2500)
+        blockSizes = [len(block) for block in self.device.measureStream(blockSize=1000)]
+        self.assertEqual(blockSizes, [1000, 1000, 500])
+        self.assertEqual(self.device.inWaiting(), 0)
+
+    def testMeasurePooled(self):
+        """
+        Check that pooled captures decode like Measure() and keep reusing the same buffer
+        """
+        self.device.Configure(1000)
+        for i in range(5):
+            with self.device.measurePooled() as data:
+                self.assertEqual(len(data), 3000)
+                assertAlmostEqual(np.max(np.abs(twosToVoltage(data))), 0.1, absoluteTolerance=1e-3)
+        self.assertEqual(self.device.bufferPool.numberAllocated, 2)
+        self.assertEqual(self.device.bufferPool.numberFree, 2)
+        self.assertEqual(self.device.inWaiting(), 0)
+
+    def testReadIntoSerialPort(self):
+        """
+        Check that a capture can be read into a pooled buffer from a real pyserial port, here a loopback
+        """
+        port = serial.serial_for_url('loop://', timeout=1)
+        device = MCP3561(device=port, deviceID='Loopback', settingsFile=os.path.join(tempfile.mkdtemp(), 'settings'))
+        device.numberMeasurements = 2
+        device.numberBytes = 7
+        port.write(b'#\x00\x00\x01\xff\xff\xff')
+        buffer = np.empty(7, dtype=np.uint8)
+        data = device.readMeasurement(buffer=buffer)
+        self.assertEqual(list(data), [0, 0, 1, 255, 255, 255])
+        self.assertEqual(list(twosToInteger(data)), [1, -1])
+        port.close()
+
+    def testSynchronizationData(self):
+        """
+        Check that the synchronization pulses are spaced by one period of the 1kHz reference
+        """
+        self.device.Configure(int(self.device.measurementRate / 1000 * 8))
+        self.device.Measure()
+        self.assertIn(self.device.syncPoints, [7, 8]) # Depends on where in the period the capture starts
+        measurementPoints = twosToInteger(self.device.getSyncData())
+        measurementDeltas = np.diff(measurementPoints)
+        self.assertTrue(np.all(np.abs(measurementDeltas - self.device.measurementRate / 1000) <= 1))
+
+    def testMotorRotation(self):
+        """
+        Check that rotating the motor forwards and then backwards returns it to where it started
+        """
+        self.device.rotateMotor(100)
+        self.assertEqual(self.device.motorPosition, 100)
+        self.device.rotateMotor(-100)
+        self.assertEqual(self.device.motorPosition, 0)
+        self.assertEqual(self.device.motorRotating, False)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.device.device.close()
+
+class TestEmulatedAdaptiveIntegration(unittest.TestCase):
+    """
+    Checks that measureUntil() integrates for longer the noisier the signal is.
+    """
+
+    def measure(self, noise, **kwargs):
+        device = MCP3561(device=TeensyEmulator(noise=noise, seed=0))
+        device.Configure(1000)
+        result = device.measureUntil(1000, blockTime=0.05, minTime=0.1, maxTime=2.0, **kwargs)
+        self.assertEqual(device.numberMeasurements, 1000)
+        return result
+
+    def testCleanSignalStopsAtFloor(self):
+        amplitude, standardError, integrationTime = self.measure(0.0, targetSNR=100)
+        assertAlmostEqual(0.1, amplitude, absoluteTolerance=1e-3)
+        assertAlmostEqual(0.1, integrationTime, relativeTolerance=0.05)
+
+    def testNoisySignalIntegratesLonger(self):
+        amplitude, standardError, integrationTime = self.measure(0.05, targetSNR=50)
+        assertAlmostEqual(0.1, amplitude, relativeTolerance=0.05)
+        self.assertGreater(integrationTime, 0.1)
+        self.assertLess(integrationTime, 2.0)
+        self.assertGreaterEqual(amplitude / standardError, 50)
+
+    def testCeiling(self):
+        amplitude, standardError, integrationTime = self.measure(0.05, targetUncertainty=1e-6)
+        assertAlmostEqual(2.0, integrationTime, relativeTolerance=0.05)
+        self.assertGreater(standardError, 1e-6 * amplitude)
+
+    def testHannWindow(self):
+        amplitude, standardError, integrationTime = self.measure(0.05, targetSNR=50, window='hann')
+        assertAlmostEqual(0.1, amplitude, relativeTolerance=0.05)
+        self.assertGreaterEqual(amplitude / standardError, 50)
+
+    def testUnsupportedWindow(self):
+        with self.assertRaises(ValueError):
+            self.measure(0.0, targetSNR=100, window='flattop')
+
+class TestEmulatedMotorMoves(unittest.TestCase):
+
+    def setUp(self):
+        self.device = MCP3561(device=TeensyEmulator())
+        self.device.motorPeriod = 1 # ms per step
+
+    def testAsyncMove(self):
+        """
+        Check that an asynchronous move returns straight away and finishes at the right position when waited on
+        """
+        motorMove = self.device.rotateMotorAsync(200)
+        self.assertFalse(motorMove.done())
+        motorMove.wait(timeout=5)
+        self.assertTrue(motorMove.done())
+        self.assertEqual(self.device.motorPosition, 200)
+
+    def testPredictedTime(self):
+        """
+        Check that the first move is predicted from the motor period and checked on only a few times, and that the
+        overhead learned from a short move does not inflate the prediction for a long one
+        """
+        with mock.patch.object(self.device.device, 'write', wraps=self.device.device.write) as write:
+            motorMove = self.device.rotateMotorAsync(100)
+            assertAlmostEqual(motorMove.predictedTime, 0.1, absoluteTolerance=1e-9)
+            motorMove.wait()
+            rotateQueries = [call for call in write.call_args_list if call[0][0] == b'MOTOR:ROTATE?\n']
+            self.assertLessEqual(len(rotateQueries), 4)
+
+        self.device.rotateMotor(-10)
+        self.assertLess(self.device.motorOverhead, 0.01)
+        motorMove = self.device.rotateMotorAsync(300)
+        assertAlmostEqual(motorMove.predictedTime, 0.3, absoluteTolerance=0.01)
+        motorMove.wait()
+        self.assertEqual(self.device.motorPosition, 390)
+
+    def testSingleWritePerMove(self):
+        """
+        Check that once the motor state is known, each move takes one write and position reads need no round trip
+        """
+        self.device.rotateMotor(-20)
+        self.assertEqual(self.device.motorPosition, -20)
+        with mock.patch.object(self.device.device, 'write', wraps=self.device.device.write) as write:
+            motorMove = self.device.rotateMotorAsync(50)
+            self.assertEqual(write.call_count, 1)
+            self.assertEqual(write.call_args[0][0], b'MOTOR:DIRECTION 0;MOTOR:ROTATE 50\n')
+            motorMove.wait()
+            write.reset_mock()
+            self.device.motorEnable = True
+            self.assertEqual(self.device.motorPosition, 30)
+            self.assertEqual(write.call_count, 0)
+
+    def testEnableSettles(self):
+        """
+        Check that the motor is given time to power up when a move enables it, and only then
+        """
+        self.device.motorEnableSettleTime = 0.0123 # Unlike any poll interval
+        with mock.patch('time.sleep', wraps=time.sleep) as sleep:
+            self.device.rotateMotorAsync(10).wait()
+            sleep.assert_any_call(self.device.motorEnableSettleTime)
+            sleep.reset_mock()
+            self.device.rotateMotorAsync(10).wait()
+            self.assertNotIn(mock.call(self.device.motorEnableSettleTime), sleep.call_args_list)
+
+    def testResetClearsMotorState(self):
+        """
+        Check that the cached motor state is dropped on Reset() and read back from the device
+        """
+        self.device.motorEnable = True
+        self.assertTrue(self.device.motorEnable)
+        self.device.Reset()
+        with mock.patch.object(self.device.device, 'write', wraps=self.device.device.write) as write:
+            self.assertFalse(self.device.motorEnable)
+            self.assertEqual(write.call_args[0][0], b'MOTOR:ENABLED?\n')
+
+    def testScanPlan(self):
+        """
+        Check that a planned scan stops at each wavelength and only saves the wavelength at checkpoints
+        """
+        settingsFile = os.path.join(tempfile.mkdtemp(), 'device_settings.txt')
+        device = MCP3561(device=TeensyEmulator(motorStepTime=1e-5), settingsFile=settingsFile)
+        device.motorStepTime = 1e-5
+        device._wavelength = 1000
+        plan = device.planScan([1010, 1020, 1030], repeats=2)
+        with mock.patch.object(device, 'saveSettings', wraps=device.saveSettings) as saveSettings:
+            visited = [wavelength for i, wavelength in device.scan(plan, checkpointInterval=4)]
+            self.assertEqual(saveSettings.call_count, 2)
+        self.assertEqual(visited, [1010, 1020, 1030, 1030, 1020, 1010])
+        self.assertEqual(device.motorPosition, np.sum(plan.steps))
+        with open(settingsFile) as settings:
+            assertAlmostEqual(json.load(settings)['wavelength'], 1010, absoluteTolerance=0.1)
+
+    def testAdaptiveSweep(self):
+        """
+        Check that an adaptive sweep adds points around an absorption line, but not in the flat parts of the spectrum
+        """
+        def transmission(wavelength):
+            return 1 - 0.8 * np.exp(-np.square((wavelength - 1200) / 15))
+        emulator = TeensyEmulator(motorStepTime=1e-6)
+        device = MCP3561(device=emulator, settingsFile=os.path.join(tempfile.mkdtemp(), 'device_settings.txt'))
+        device._wavelength = 1000
+        device.motorStepTime = emulator.motorStepTime
+        emulator.signal = lambda t: np.sin(2 * np.pi * 1000 * t) * \
+                0.1 * transmission(1000 + emulator.motorPosition / device.microstepsPerNanometer)
+        device.Configure(488)
+        pipeline = SweepPipeline(device, partial(lockInAmplitude, frequency=1000, samplingFrequency=9.76e3))
+
+        wavelengths, results = pipeline.runAdaptive(1000, 1400, 20, tolerance=1e-3)
+        self.assertTrue(np.all(np.diff(wavelengths) > 0))
+        self.assertLess(len(wavelengths), 60)
+        denseWavelengths = np.arange(1000, 1400.5, 0.5)
+        assertAlmostEqual(0.1 * transmission(denseWavelengths), np.interp(denseWavelengths, wavelengths, results),
+                absoluteTolerance=3e-3)
+        self.assertEqual(np.sum(wavelengths < 1100), 5) # The flat part keeps the coarse spacing
+
+    def testWaitTimeout(self):
+        """
+        Check that waiting gives up with an error if the motor has not stopped in time
+        """
+        motorMove = self.device.rotateMotorAsync(300)
+        with self.assertRaises(TimeoutError):
+            motorMove.wait(timeout=0.05)
+        self.device.waitForMotor()
+
+    def tearDown(self):
+        self.device.device.close()
+
+class TestEmulatedTransferFaults(unittest.TestCase):
+    """
+    Checks that damaged transfers are caught rather than returned as data
+    """
+
+    def testMeasureDetectsDroppedByte(self):
+        """
+        Check that a plain Measure() raises an error when a byte goes missing
+        """
+        device = MCP3561(device=TeensyEmulator(dropRate=1.0, seed=0))
+        device.Configure(1000)
+        device.device.timeout = 0.2
+        with self.assertRaises(DataError):
+            device.Measure()
+
+    def testMeasureFramedRecovers(self):
+        """
+        Check that a framed measurement re-requests damaged frames and returns the full, correct capture
+        """
+        emulator = TeensyEmulator(dropRate=0.5, corruptRate=0.5, seed=1)
+        device = MCP3561(device=emulator)
+        device.Configure(10000)
+        data = device.measureFramed(samplesPerFrame=1000, retries=5)
+        self.assertEqual(data.tobytes(), emulator._lastCapture)
+        self.assertEqual(device.inWaiting(), 0)
+
+    def testMeasureFramedGivesUp(self):
+        """
+        Check that a framed measurement raises an error if frames are still damaged after all the retries
+        """
+        device = MCP3561(device=TeensyEmulator(dropRate=1.0, seed=0))
+        device.Configure(10000)
+        with self.assertRaises(DataError):
+            device.measureFramed(samplesPerFrame=1000, retries=1)
+
+class TestEmulatedTEController(unittest.TestCase):
+
+    def testFetchTemperature(self):
+        """
+        Check that the temperature controller reaches the temperature we set
+        """
+        device = TEController(device=TeensyEmulator())
+        device.setTemperature(30)
+        assertAlmostEqual(device.Fetch(), 30)
+        device.closeDevice()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import sys
+import unittest
+import numpy as np
+sys.path.append('source')
+from framing import *
+
+class TestFraming(unittest.TestCase):
+
+    def setUp(self):
+        self.frameBytes = 30
+        self.payload = np.random.default_rng(0).integers(0, 256, 100, dtype=np.uint8).tobytes()
+        self.lengths = frameLengths(len(self.payload), self.frameBytes)
+        self.frames = [encodeFrame(i, self.payload[i*self.frameBytes:(i+1)*self.frameBytes])
+                for i in range(len(self.lengths))]
+
+    def parse(self, stream):
+        received = bytearray(len(self.payload))
+        return parseFrames(stream, received, self.frameBytes), received
+
+    def testFrameLengths(self):
+        """
+        Check that all frames are full except the last one
+        """
+        self.assertEqual(self.lengths, [30, 30, 30, 10])
+        self.assertEqual(frameLengths(90, 30), [30, 30, 30])
+
+    def testParseIntact(self):
+        """
+        Check that an undamaged stream is reassembled exactly
+        """
+        goodFrames, received = self.parse(b''.join(self.frames))
+        self.assertEqual(goodFrames, {0, 1, 2, 3})
+        self.assertEqual(bytes(received), self.payload)
+
+    def testDroppedByte(self):
+        """
+        Check that a dropped byte only loses the frame it was in, and the parser picks up again at the next frame
+        """
+        frames = list(self.frames)
+        frames[1] = frames[1][:20] + frames[1][21:]
+        goodFrames, received = self.parse(b''.join(frames))
+        self.assertEqual(goodFrames, {0, 2, 3})
+        self.assertEqual(bytes(received[60:]), self.payload[60:])
+
+    def testCorruptedByte(self):
+        """
+        Check that a corrupted byte fails the CRC of its frame only
+        """
+        frames = list(self.frames)
+        frames[2] = frames[2][:15] + bytes([frames[2][15] ^ 0xFF]) + frames[2][16:]
+        goodFrames, received = self.parse(b''.join(frames))
+        self.assertEqual(goodFrames, {0, 1, 3})
+
+    def testInsertedBytes(self):
+        """
+        Check that stray bytes between and inside frames, including stray markers, are skipped
+        """
+        frames = list(self.frames)
+        frames[0] = frames[0][:5] + b'#' + frames[0][5:]
+        stream = b'##\x00' + frames[0] + b'#' + b''.join(frames[1:])
+        goodFrames, received = self.parse(stream)
+        self.assertEqual(goodFrames, {1, 2, 3})
+        self.assertEqual(bytes(received[30:]), self.payload[30:])
+
+if __name__ == '__main__':
+    unittest.main()
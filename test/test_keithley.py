@@ -0,0 +1,125 @@
+import sys
+import time
+import unittest
+from unittest import mock
+import numpy as np
+sys.path.append('source')
+from DeviceEmulator import TeensyEmulator
+from DataAquisition import Keithley
+
+class TestEmulatedKeithley(unittest.TestCase):
+    """
+    Runs the Keithley driver against the emulator, which has a 1MOhm load on its output
+    """
+
+    def setUp(self):
+        self.device = Keithley(device=TeensyEmulator(deviceID='KEITHLEY INSTRUMENTS INC.,MODEL 2400',
+                lineTerminator='\r'))
+
+    def testLinearSweep(self):
+        """
+        Check that a linear sweep returns one reading per point in a single readout
+        """
+        voltages, currents = self.device.sweepLinear(-1, 1, 1000)
+        np.testing.assert_allclose(voltages, np.linspace(-1, 1, 1000), atol=1e-6)
+        np.testing.assert_allclose(currents, voltages / 1e6, rtol=1e-5)
+
+    def testListSweep(self):
+        """
+        Check that unevenly spaced voltages are sent as source lists, split into parts the Keithley accepts
+        """
+        desiredVoltages = np.square(np.linspace(0, 1, 250))
+        voltages, currents = self.device.sweepVoltageMeasureCurrent(desiredVoltages)
+        np.testing.assert_allclose(voltages, desiredVoltages, atol=1e-6)
+
+    def testPreallocatedOutput(self):
+        """
+        Check that readings are written into arrays passed in by the caller
+        """
+        measuredVoltages = np.zeros(10)
+        measuredCurrents = np.zeros(10)
+        voltages, currents = self.device.sweepVoltageMeasureCurrent(np.linspace(0, 1, 10),
+                measuredVoltages=measuredVoltages, measuredCurrents=measuredCurrents)
+        self.assertIs(voltages, measuredVoltages)
+        self.assertIs(currents, measuredCurrents)
+        self.assertAlmostEqual(measuredCurrents[-1], 1e-6)
+
+    def testSweepReturnsToZero(self):
+        """
+        Check that the output is left at 0V and turned off after a sweep
+        """
+        self.device.sweepLinear(0, 1, 5)
+        self.assertEqual(self.device.device.sourceVoltage, 0)
+        self.assertEqual(self.device.device.sourceMode, 'FIXED')
+        self.assertFalse(self.device._output)
+
+    def testBinaryReadings(self):
+        """
+        Check that binary readings of just voltage and current parse to the same values as ASCII ones
+        """
+        asciiVoltages, asciiCurrents = self.device.sweepLinear(0, 1, 50)
+        self.device.setElements(['current', 'voltage'])
+        self.device.setBinary(True)
+        voltages, currents = self.device.sweepLinear(0, 1, 50)
+        np.testing.assert_allclose(voltages, asciiVoltages, rtol=1e-6)
+        np.testing.assert_allclose(currents, asciiCurrents, rtol=1e-6)
+
+    def testBinaryIsSmaller(self):
+        """
+        Check that a binary two-element reading is much shorter than the default ASCII one
+        """
+        self.device.writeLine('read?')
+        asciiLength = len(self.device.device.read_until(b'\r'))
+        self.device.setElements(['voltage', 'current'])
+        self.device.setBinary(True)
+        self.device.writeLine('read?')
+        binaryLength = len(self.device.device.read(11))
+        self.assertEqual(binaryLength, 11)
+        self.assertEqual(self.device.inWaiting(), 0)
+        self.assertGreater(asciiLength / binaryLength, 5)
+
+    def testPerPointReadings(self):
+        """
+        Check that point-by-point measurement parses separate binary replies
+        """
+        self.device.setElements(['voltage', 'current'])
+        self.device.setBinary(True)
+        self.device.device.timeout = 0.1
+        with mock.patch('time.sleep'):
+            voltages, currents = self.device.applyVoltageMeasureCurrent([0.25, 0.5, 0.75])
+        np.testing.assert_allclose(currents, [0.25e-6, 0.5e-6, 0.75e-6], rtol=1e-6)
+
+    def testMissingElement(self):
+        """
+        Check that sweeping without the current element selected is an error rather than returning the wrong data
+        """
+        self.device.setElements(['voltage', 'time'])
+        with self.assertRaises(ValueError):
+            self.device.sweepLinear(0, 1, 5)
+
+    def testResetFormat(self):
+        """
+        Check that Reset() goes back to ASCII readings with every element
+        """
+        self.device.setElements(['voltage'])
+        self.device.setBinary(True)
+        self.device.Reset()
+        voltages, currents = self.device.sweepLinear(0, 1, 5)
+        self.assertEqual(self.device.device.formatElements, ['VOL', 'CUR', 'RES', 'TIM', 'STA'])
+
+    def testBaudRate(self):
+        """
+        Check that changing the baud rate changes both ends of the link, and the link is checked without waiting
+        out the timeout
+        """
+        startTime = time.perf_counter()
+        self.device.setBaudRate(57600)
+        self.assertLess(time.perf_counter() - startTime, 1)
+        self.assertEqual(self.device.device.serialBaudrate, 57600)
+        self.assertEqual(self.device.device.baudrate, 57600)
+        self.assertEqual(self.device.Identify(), 'KEITHLEY INSTRUMENTS INC.,MODEL 2400')
+        with self.assertRaises(ValueError):
+            self.device.setBaudRate(115200)
+
+if __name__ == '__main__':
+    unittest.main()
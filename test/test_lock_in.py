@@ -0,0 +1,78 @@
+import sys
+import unittest
+import numpy as np
+sys.path.append('source')
+import lock_in
+from lock_in import *
+from unittest import mock
+from UnitTesting.shorthand import *
+
+class TestLockIn(unittest.TestCase):
+    """
+    Tests lock-in extraction of amplitudes and phases at known frequencies.
+    """
+
+    def setUp(self):
+        self.samplingFrequency = 125 # kHz
+        self.times = np.arange(31250) / self.samplingFrequency
+
+    def testSingleFrequency(self):
+        """
+        Check that we recover the amplitude and phase of a sine wave on top of a DC offset
+        """
+        voltages = 1.5 + 0.3 * np.cos(2*np.pi * 1 * self.times + 0.4)
+        amplitudes, phases = lockIn(voltages, 1, self.samplingFrequency)
+        assertAlmostEqual(np.array([0.3]), amplitudes)
+        assertAlmostEqual(np.array([0.4]), phases)
+
+    def testHarmonics(self):
+        """
+        Check that each harmonic is found independently of the others
+        """
+        voltages = 0.3 * np.cos(2*np.pi * 1 * self.times) + 0.1 * np.cos(2*np.pi * 3 * self.times)
+        amplitudes, phases = lockIn(voltages, 1, self.samplingFrequency, harmonics=3)
+        assertAlmostEqual(np.array([0.3, 0.0, 0.1]), amplitudes, absoluteTolerance=1e-12)
+
+    def testOffBinFrequency(self):
+        """
+        Check that a frequency that does not fit a whole number of periods into the capture is found accurately
+        with a Hann window
+        """
+        voltages = 0.3 * np.cos(2*np.pi * 1.0037 * self.times)
+        amplitudes, phases = lockIn(voltages, 1.0037, self.samplingFrequency, window='hann')
+        assertAlmostEqual(np.array([0.3]), amplitudes, absoluteTolerance=1e-5)
+
+    def testStack(self):
+        """
+        Check that a 2-D stack of captures gives one row of results per capture
+        """
+        voltages = 0.3 * np.cos(2*np.pi * 1 * self.times)
+        amplitudes, phases = lockIn(np.stack([voltages, 2*voltages]), 1, self.samplingFrequency)
+        assertAlmostEqual(np.array([[0.3], [0.6]]), amplitudes)
+
+    def testSquareWaveAmplitude(self):
+        """
+        Check that the pk-pk amplitude of a 0-1V square wave is found from its odd harmonics
+        """
+        voltages = 0.5 * (np.sign(np.sin(2*np.pi * 1 * self.times + 0.01)) + 1)
+        amplitude = squareWaveAmplitude(voltages, 1, self.samplingFrequency)
+        assertAlmostEqual(1.0, amplitude, absoluteTolerance=1e-3)
+
+    def testCacheBoundedByBytes(self):
+        """
+        Check that cached references are dropped, least recently used first, once they take up more than the limit
+        """
+        voltages = np.cos(2*np.pi * 1 * self.times)
+        referenceBytes = 2 * 8 * len(self.times)
+        with mock.patch.object(lock_in, '_maxCacheBytes', 3 * referenceBytes), \
+                mock.patch.object(lock_in, '_referenceCache', {}):
+            for frequency in (1, 2, 3, 1, 4):
+                lockIn(voltages, frequency, self.samplingFrequency)
+            self.assertEqual([key[0] for key in lock_in._referenceCache], [(3.0,), (1.0,), (4.0,)])
+            lockIn(voltages, 1, self.samplingFrequency, harmonics=3)
+            self.assertEqual([key[0] for key in lock_in._referenceCache], [(1.0, 2.0, 3.0)])
+            lockIn(voltages, 1, self.samplingFrequency, harmonics=5)
+            self.assertEqual([key[0] for key in lock_in._referenceCache], [(1.0, 2.0, 3.0)])
+
+if __name__ == '__main__':
+    unittest.main()
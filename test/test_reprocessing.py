@@ -0,0 +1,65 @@
+import sys
+import os
+import tempfile
+import unittest
+import numpy as np
+sys.path.append('source')
+from UnitTesting.shorthand import *
+from DataAquisition import CaptureRecorder, analyzeCaptures, reprocessRecordings
+
+class TestReprocessing(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        random = np.random.default_rng(0)
+        self.captures = random.integers(0, 256, (10, 300), dtype=np.uint8)
+        with CaptureRecorder(os.path.join(self.directory, 'a')) as recorder:
+            for i, capture in enumerate(self.captures[:7]):
+                recorder.append(capture, wavelength=1000 + i, samplingFrequency=1000)
+            recorder.append(self.captures[7][:150], wavelength=1007, samplingFrequency=1000)
+        np.save(os.path.join(self.directory, 'b.npy'), self.captures[8:])
+        self.options = {'frequency': 50, 'signalBins': [5], 'noiseBand': (100, 500)}
+
+    def testMatchesSerialAnalysis(self):
+        """
+        Check that the results come back in order and match analyzing each source in one go, however they are split
+        """
+        parallel = reprocessRecordings([self.directory], numberWorkers=2, chunkSize=3, samplingFrequency=1000,
+                **self.options)
+        serial = reprocessRecordings([self.directory], numberWorkers=1, chunkSize=100, samplingFrequency=1000,
+                **self.options)
+        desired = [analyzeCaptures(self.captures[:7], 1000, **self.options),
+                analyzeCaptures(self.captures[7:8, :150], 1000, **self.options),
+                analyzeCaptures(self.captures[8:], 1000, **self.options)]
+
+        self.assertEqual(list(parallel['capture']), [0, 1, 2, 3, 4, 5, 6, 7, 0, 1])
+        self.assertEqual(list(parallel['wavelength'][:8]), list(range(1000, 1008)))
+        self.assertTrue(parallel['source'][-1].endswith('b.npy'))
+        for column in desired[0]:
+            desiredColumn = np.concatenate([results[column] for results in desired])
+            assertAlmostEqual(desiredColumn, parallel[column])
+            assertAlmostEqual(desiredColumn, serial[column])
+
+    def testInterruptedAppend(self):
+        """
+        Check that captures after the unindexed bytes of an interrupted append are analyzed from where they really are
+        """
+        path = os.path.join(tempfile.mkdtemp(), 'interrupted')
+        with CaptureRecorder(path) as recorder:
+            for capture in self.captures[:2]:
+                recorder.append(capture, samplingFrequency=1000)
+        with open(path + '.raw', 'ab') as rawFile:
+            rawFile.write(bytes([153, 10]))
+        with CaptureRecorder(path) as recorder:
+            recorder.append(self.captures[2], samplingFrequency=1000)
+        results = reprocessRecordings([path], numberWorkers=1, chunkSize=100, **self.options)
+        desired = analyzeCaptures(self.captures[:3], 1000, **self.options)
+        for column in desired:
+            assertAlmostEqual(desired[column], results[column])
+
+    def testMissingSamplingFrequency(self):
+        with self.assertRaises(ValueError):
+            reprocessRecordings([os.path.join(self.directory, 'b.npy')], numberWorkers=1)
+
+if __name__ == '__main__':
+    unittest.main()
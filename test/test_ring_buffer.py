@@ -0,0 +1,59 @@
+import sys
+import unittest
+import numpy as np
+sys.path.append('source')
+from RingBuffer import RingBuffer
+from UnitTesting.shorthand import *
+
+class TestRingBuffer(unittest.TestCase):
+    """
+    Tests the fixed-size ring buffer used to hold continuously-acquired data.
+    """
+
+    def testReadWrite(self):
+        """
+        Check that entries come back out in the order they were written, including across the wraparound point
+        """
+        buffer = RingBuffer(5)
+        buffer.write(np.array([1, 2, 3]))
+        startIndex, entries = buffer.read(2)
+        self.assertEqual(startIndex, 0)
+        assertAlmostEqual(np.array([1, 2]), entries)
+
+        buffer.write(np.array([4, 5, 6, 7]))
+        startIndex, entries = buffer.read(5)
+        self.assertEqual(startIndex, 2)
+        assertAlmostEqual(np.array([3, 4, 5, 6, 7]), entries)
+        self.assertEqual(len(buffer), 0)
+
+    def testOverwrite(self):
+        """
+        Check that writing to a full buffer drops the oldest entries and counts them
+        """
+        buffer = RingBuffer(4)
+        buffer.write(np.arange(6))
+        self.assertEqual(buffer.droppedEntries, 2)
+        startIndex, entries = buffer.read(4)
+        self.assertEqual(startIndex, 2)
+        assertAlmostEqual(np.array([2, 3, 4, 5]), entries)
+
+    def testReadTimeout(self):
+        """
+        Check that a read returns whatever is available once the timeout expires
+        """
+        buffer = RingBuffer(4)
+        buffer.write(np.array([1.0]))
+        startIndex, entries = buffer.read(3, timeout=0.01)
+        assertAlmostEqual(np.array([1.0]), entries)
+
+    def testLatest(self):
+        """
+        Check that we can peek at the newest entries without removing them
+        """
+        buffer = RingBuffer(4)
+        buffer.write(np.array([1, 2, 3]))
+        assertAlmostEqual(np.array([2, 3]), buffer.latest(2))
+        self.assertEqual(len(buffer), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import sys
+import unittest
+import numpy as np
+sys.path.append('source')
+from UnitTesting.shorthand import *
+from ScanPlan import *
+
+class TestScanPlan(unittest.TestCase):
+
+    def setUp(self):
+        self.microstepsPerNanometer = 30.3716*1.011
+        self.microstepsCorrection = -6.17*1e-6
+        self.wavelengths = [900, 800, 1000, 850, 950]
+
+    def plan(self, startWavelength, **kwargs):
+        return planScan(self.wavelengths, startWavelength, self.microstepsPerNanometer, self.microstepsCorrection,
+                **kwargs)
+
+    def testStartsAtNearerEnd(self):
+        """
+        Check that the wavelengths are visited in sorted order starting from the end nearer the current wavelength
+        """
+        np.testing.assert_array_equal(self.plan(700).wavelengths, [800, 850, 900, 950, 1000])
+        np.testing.assert_array_equal(self.plan(1200).wavelengths, [1000, 950, 900, 850, 800])
+
+    def testSerpentine(self):
+        """
+        Check that repeated sweeps alternate direction and travel less than returning to the start each time
+        """
+        serpentinePlan = self.plan(800, repeats=3)
+        np.testing.assert_array_equal(serpentinePlan.wavelengths[4:6], [1000, 1000])
+        np.testing.assert_array_equal(serpentinePlan.sweepNumbers, np.repeat([0, 1, 2], 5))
+        self.assertLess(serpentinePlan.totalSteps, self.plan(800, repeats=3, serpentine=False).totalSteps)
+
+    def testNoAccumulatedRounding(self):
+        """
+        Check that each point is within half a step of its target, however many moves came before it
+        """
+        wavelengths = 800 + np.arange(200) * 1.01
+        plan = planScan(wavelengths, 800, self.microstepsPerNanometer, self.microstepsCorrection)
+        self.assertTrue(np.all(np.abs(plan.achievedWavelengths - plan.wavelengths) <= 0.5 / self.microstepsPerNanometer + 1e-9))
+        assertAlmostEqual(np.sum(plan.steps) / self.microstepsPerNanometer, plan.achievedWavelengths[-1] - 800)
+
+    def testOriginalOrder(self):
+        """
+        Check that results in scan order are put back in the order of the original wavelengths
+        """
+        plan = self.plan(1200, repeats=2)
+        results = plan.inOriginalOrder(plan.wavelengths)
+        np.testing.assert_array_equal(results, [self.wavelengths, self.wavelengths])
+
+class TestRefinementPoints(unittest.TestCase):
+
+    def setUp(self):
+        self.wavelengths = np.arange(1000, 1401, 20.0)
+        self.values = 1 - 0.8 * np.exp(-np.square((self.wavelengths - 1200) / 15))
+
+    def testStraightLine(self):
+        """
+        Check that no points are added where linear interpolation is already exact
+        """
+        self.assertEqual(len(refinementPoints(self.wavelengths, 2 * self.wavelengths + 1, 1e-6)), 0)
+
+    def testRefinesFeature(self):
+        """
+        Check that points are only added, at interval midpoints, around the absorption line
+        """
+        added = refinementPoints(self.wavelengths[::-1], self.values[::-1], 1e-3)
+        self.assertGreater(len(added), 0)
+        self.assertTrue(np.all(np.abs(added - 1200) < 60))
+        np.testing.assert_array_equal(added % 20, 10)
+
+    def testLimits(self):
+        """
+        Check that intervals narrower than minStep are not split, and at most maxPoints are added
+        """
+        self.assertEqual(len(refinementPoints(self.wavelengths, self.values, 1e-3, minStep=15)), 0)
+        largestErrors = refinementPoints(self.wavelengths, self.values, 1e-3, maxPoints=2)
+        np.testing.assert_array_equal(largestErrors, [1190, 1210])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import sys
+import unittest
+import numpy as np
+sys.path.append('source')
+from spectral_density import *
+from UnitTesting.shorthand import *
+
+class TestSpectralDensity(unittest.TestCase):
+    """
+    Tests the Welch power spectral density and noise density estimators.
+    """
+
+    def setUp(self):
+        self.samplingFrequency = 9760
+        self.noiseRMS = 1e-5
+        self.voltages = np.random.default_rng(0).normal(scale=self.noiseRMS, size=100000)
+
+    def testWindowCache(self):
+        """
+        Check that the same window object is returned for the same type and length
+        """
+        window, windowPower = getWindow('hann', 1000)
+        self.assertIs(getWindow('hann', 1000)[0], window)
+        assertAlmostEqual(np.sum(np.square(window)), windowPower)
+
+    def testWhiteNoiseDensity(self):
+        """
+        Check that the density of white noise is its RMS spread evenly over the Nyquist bandwidth
+        """
+        estimator = NoiseDensityEstimator(self.samplingFrequency, segmentSize=4096)
+        estimator.update(self.voltages)
+        desiredDensity = self.noiseRMS / np.sqrt(self.samplingFrequency / 2)
+        assertAlmostEqual(desiredDensity, estimator.bandDensity(0, self.samplingFrequency/2), relativeTolerance=0.02)
+        assertAlmostEqual(self.noiseRMS, estimator.bandRMS(0, self.samplingFrequency/2), relativeTolerance=0.02)
+
+    def testStreamingMatchesSingleBlock(self):
+        """
+        Check that feeding data in uneven blocks gives the same spectrum as feeding it all at once
+        """
+        singleEstimator = NoiseDensityEstimator(self.samplingFrequency, segmentSize=1024)
+        singleEstimator.update(self.voltages)
+        streamingEstimator = NoiseDensityEstimator(self.samplingFrequency, segmentSize=1024)
+        for block in np.array_split(self.voltages, 37):
+            streamingEstimator.update(block)
+        self.assertEqual(streamingEstimator.numberSegments, singleEstimator.numberSegments)
+        assertAlmostEqual(singleEstimator.psd, streamingEstimator.psd)
+
+    def testNoiseDensitySineRMS(self):
+        """
+        Check that a sine wave in the band is integrated to its RMS value
+        """
+        times = np.arange(4800) / self.samplingFrequency
+        voltages = np.sqrt(2) * 1e-3 * np.sin(2*np.pi * 1000 * times)
+        rms, density = noiseDensity(voltages, self.samplingFrequency, 200, self.samplingFrequency/2)
+        assertAlmostEqual(1e-3, rms, relativeTolerance=1e-3)
+
+    def testWelchMatchesEstimator(self):
+        """
+        Check that the batch Welch spectrum of each row of a stack matches the streaming estimator
+        """
+        stack = self.voltages[:40000].reshape(4, 10000)
+        frequencies, psd = welchPSD(stack, self.samplingFrequency, segmentSize=1024)
+        self.assertEqual(psd.shape, (4, 513))
+        for row, rowPSD in zip(stack, psd):
+            estimator = NoiseDensityEstimator(self.samplingFrequency, segmentSize=1024)
+            estimator.update(row)
+            assertAlmostEqual(estimator.psd, rowPSD)
+        assertAlmostEqual(estimator.frequencies, frequencies)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import sys
+import unittest
+import numpy as np
+sys.path.append('source')
+from synchronization import *
+from UnitTesting.shorthand import *
+
+class TestSynchronization(unittest.TestCase):
+    """
+    Tests folding of captures into period-averaged waveforms using synchronization pulses.
+    """
+
+    def setUp(self):
+        # A 1.003kHz reference sampled at 125kHz, so periods are not a whole number of samples long
+        self.samplingFrequency = 125000
+        self.numberSamples = 25000
+        times = np.arange(self.numberSamples) / self.samplingFrequency
+        self.voltages = np.cos(2*np.pi * 1003 * times)
+        self.syncIndices = np.flatnonzero(np.diff(np.floor(times * 1003)) > 0) + 1
+
+    def testFoldPeriods(self):
+        """
+        Check that folding a cosine locked to the reference recovers one period of it
+        """
+        numberBins = 50
+        sums, weights, numberPeriods = foldPeriods(self.voltages, self.syncIndices, numberBins=numberBins)
+        self.assertEqual(numberPeriods, len(self.syncIndices) - 1)
+        desiredWaveform = np.cos(2*np.pi * np.arange(numberBins) / numberBins)
+        assertAlmostEqual(desiredWaveform, sums / weights, absoluteTolerance=0.04)
+
+    def testCoherentAveragerRejectsNoise(self):
+        """
+        Check that noise not locked to the reference averages away across captures
+        """
+        averager = CoherentAverager(numberBins=50)
+        random = np.random.default_rng(0)
+        for i in range(10):
+            averager.accumulate(self.voltages + random.normal(scale=1, size=self.numberSamples), self.syncIndices)
+        self.assertEqual(averager.numberPeriods, 10 * (len(self.syncIndices) - 1))
+        desiredWaveform = np.cos(2*np.pi * averager.phases)
+        assertAlmostEqual(desiredWaveform, averager.waveform, absoluteTolerance=0.05)
+
+    def testTooFewPulses(self):
+        """
+        Check that a capture with fewer than two pulses contributes nothing
+        """
+        sums, weights, numberPeriods = foldPeriods(self.voltages, self.syncIndices[:1])
+        self.assertEqual(numberPeriods, 0)
+        self.assertEqual(np.sum(weights), 0)
+
+if __name__ == '__main__':
+    unittest.main()
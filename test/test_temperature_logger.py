@@ -0,0 +1,69 @@
+import sys
+import time
+import unittest
+import numpy as np
+sys.path.append('source')
+from UnitTesting.shorthand import *
+from DeviceEmulator import TeensyEmulator
+from DataAquisition import TEController
+from DataAquisition.AD7766.python.source.TemperatureLogger import TemperatureLogger
+
+class TestTemperatureLogger(unittest.TestCase):
+    """
+    Logs the emulated TE controller, whose temperature approaches the setpoint with a 0.1s time constant
+    """
+
+    def setUp(self):
+        self.controller = TEController(device=TeensyEmulator(temperatureTimeConstant=0.1))
+        self.logger = TemperatureLogger(self.controller, sampleRate=200)
+
+    def tearDown(self):
+        self.logger.stop()
+        self.controller.closeDevice()
+
+    def testLatest(self):
+        """
+        Check that the latest reading is available without blocking, and is None before the first reading
+        """
+        self.assertIsNone(self.logger.latest())
+        with self.logger:
+            time.sleep(0.05)
+            timestamp, temperature = self.logger.latest()
+        assertAlmostEqual(temperature, 25)
+        self.assertLess(time.time() - timestamp, 1)
+
+    def testSampleRate(self):
+        """
+        Check that readings are taken at about the requested rate
+        """
+        with self.logger:
+            time.sleep(0.5)
+            statistics = self.logger.statistics(0.25)
+        self.assertTrue(30 <= statistics['count'] <= 55)
+        assertAlmostEqual(statistics['mean'], 25)
+        assertAlmostEqual(statistics['drift'], 0, absoluteTolerance=1e-6)
+
+    def testWaitUntilStable(self):
+        """
+        Check that waiting ends once the temperature has held within tolerance, not before it settled
+        """
+        with self.logger:
+            startTime = time.time()
+            self.logger.setTemperature(30)
+            stableTime = self.logger.waitUntilStable(30, tolerance=0.01, holdTime=0.1, timeout=5)
+            timestamp, temperature = self.logger.latest()
+        # Settling to within 0.01 of a 5 degree step takes ln(500) time constants
+        self.assertGreater(stableTime - startTime, 0.1 * np.log(500) + 0.1 - 0.05)
+        self.assertLess(stableTime - startTime, 2)
+        assertAlmostEqual(temperature, 30, absoluteTolerance=0.01)
+
+    def testWaitTimeout(self):
+        """
+        Check that waiting for a setpoint that is never reached gives up after the timeout
+        """
+        with self.logger:
+            with self.assertRaises(TimeoutError):
+                self.logger.waitUntilStable(40, tolerance=0.1, holdTime=0.1, timeout=0.2)
+
+if __name__ == '__main__':
+    unittest.main()